@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OHS.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings
+
+if settings.CHATBOT_PRELOAD:
+    from home.chatbot_logic import preload
+
+    preload()
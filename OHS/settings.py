@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 
+from OHS.db_profiles import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'home.db_routing.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -75,11 +78,45 @@ WSGI_APPLICATION = 'OHS.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Pragmas, transaction mode and persistent connections come from the profile
+# named by DJANGO_DB_PROFILE ("development" or "production", see OHS/db_profiles.py).
+# DJANGO_DB_PATH and DJANGO_CONN_MAX_AGE override the file and connection lifetime.
 DATABASES = {
+    'default': sqlite_database(os.environ.get('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3')),
+    # A read-only copy of default kept up to date outside Django (e.g. Litestream or
+    # LiteFS), so it is never migrated. Views marked @use_replica read from it
+    # (home/db_routing.py). Without DJANGO_REPLICA_DB_PATH it is the primary file and
+    # routing is off.
+    'replica': sqlite_database(
+        os.environ.get('DJANGO_REPLICA_DB_PATH', os.environ.get('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3'))
+    ),
+}
+DATABASE_ROUTERS = ['home.db_routing.ReplicaRouter']
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# "default" is per process. "shared" is seen by every worker, for state that must
+# agree across them (chatbot conversations, entitlements, completion rates): Redis
+# when DJANGO_REDIS_URL is set (needs the redis package, in requirements.txt),
+# otherwise a table in the database (created by migration 0014, or
+# `manage.py createcachetable`).
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': (
+        {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        }
+        if os.environ.get('DJANGO_REDIS_URL')
+        else {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'ohs_shared_cache',
+        }
+    ),
 }
 
 
@@ -148,4 +185,112 @@ LOGIN_URL = 'login'
 AUTHENTICATION_BACKENDS = [
     'home.backends.EmailOrUsernameModelBackend', 
     'django.contrib.auth.backends.ModelBackend', 
-]
\ No newline at end of file
+]
+
+
+# Chatbot
+# Load the chatbot model when the WSGI/ASGI application is created instead of on
+# the first chat message. With `gunicorn --preload` this happens in the master,
+# so workers share the model pages copy-on-write.
+CHATBOT_PRELOAD = os.environ.get("CHATBOT_PRELOAD", "0") == "1"
+
+# Where pending "did you mean" suggestions live between chat messages.
+# "cache": the shared cache, seen by every worker; "locmem": per-process LRU
+# (only for a single worker).
+CHATBOT_STATE_BACKEND = os.environ.get("CHATBOT_STATE_BACKEND", "cache")
+CHATBOT_STATE_CACHE_ALIAS = "shared"
+CHATBOT_STATE_TTL = 15 * 60  # seconds
+CHATBOT_STATE_MAX_ENTRIES = 10000
+
+# Vector index for FAQ retrieval: "exact" (brute force), "ivf" (NumPy) or "hnsw" (faiss).
+# Approximate indexes are built offline with `manage.py build_semantic_index`.
+CHATBOT_INDEX_BACKEND = os.environ.get("CHATBOT_INDEX_BACKEND", "exact")
+CHATBOT_INDEX_PARAMS = {}  # search-time knobs, e.g. {"nprobe": 8} or {"ef_search": 64}
+
+# Caches for repeated questions, keyed on the normalised message text.
+# "locmem": per-process LRU; "cache": Django cache shared by all workers.
+CHATBOT_QUERY_CACHE_BACKEND = os.environ.get("CHATBOT_QUERY_CACHE_BACKEND", "locmem")
+CHATBOT_QUERY_CACHE_ALIAS = "shared"
+CHATBOT_QUERY_CACHE_TTL = 60 * 60  # seconds, shared cache only
+CHATBOT_EMBEDDING_CACHE_SIZE = 4096
+CHATBOT_ANSWER_CACHE_SIZE = 1024
+
+# Micro-batch concurrent embedding requests into one encode() call: wait at most
+# CHATBOT_BATCH_MAX_WAIT_MS for up to CHATBOT_BATCH_MAX_SIZE messages.
+CHATBOT_BATCH_ENABLED = os.environ.get("CHATBOT_BATCH_ENABLED", "0") == "1"
+CHATBOT_BATCH_MAX_SIZE = 32
+CHATBOT_BATCH_MAX_WAIT_MS = 5
+
+# Sentence encoder: "torch" (sentence-transformers, fp32) or "onnx" (onnxruntime).
+# Export the ONNX model with `manage.py export_onnx_encoder [--quantize]`.
+CHATBOT_ENCODER_BACKEND = os.environ.get("CHATBOT_ENCODER_BACKEND", "torch")
+CHATBOT_ENCODER_OPTIONS = {}  # onnx only, e.g. {"quantized": True, "intra_op_threads": 2}
+
+# Serve /chat/ and /chat/stream/ with the async views (for ASGI). Inference then
+# runs on a bounded thread pool; requests beyond CHATBOT_EXECUTOR_MAX_PENDING get a 503.
+CHATBOT_ASYNC = os.environ.get("CHATBOT_ASYNC", "0") == "1"
+CHATBOT_EXECUTOR_WORKERS = 4
+CHATBOT_EXECUTOR_MAX_PENDING = 64
+CHATBOT_REQUEST_TIMEOUT = 10  # seconds
+
+# Memory-mapped FAQ artifacts written by `manage.py build_chatbot_index`. When the
+# directory has a manifest the chatbot loads it instead of semantic_data.pkl.
+CHATBOT_ARTIFACT_DIR = BASE_DIR / "home" / "faq_index"
+CHATBOT_VERIFY_ARTIFACTS = False  # re-hash files against the manifest on load
+
+# Retrieval: "semantic" embeds every query; "hybrid" answers clear keyword hits
+# from a BM25 index over the FAQ questions + keywords without the encoder and
+# reranks the BM25 shortlist semantically otherwise. Compare the two on the FAQ set
+# with `manage.py bench_chatbot_retrieval` before switching to "hybrid".
+CHATBOT_RETRIEVER = os.environ.get("CHATBOT_RETRIEVER", "semantic")
+CHATBOT_LEXICAL_PARAMS = {"k1": 1.5, "b": 0.75}
+CHATBOT_HYBRID_PARAMS = {
+    "min_coverage": 1.0,  # lexical-only answer needs every query term matched...
+    "min_margin": 0.25,  # ...and a BM25 score 25% above the runner-up
+    "shortlist": 20,  # BM25 candidates handed to the semantic rerank
+    "fusion": "linear",  # "linear" (alpha * cosine + (1 - alpha) * bm25) or "rrf"
+    "alpha": 0.7,
+    "rrf_k": 60,
+    "fallback_score": 0.5,  # best shortlist cosine below this -> full vector search
+}
+
+# Watch-time heartbeats (update_watch_time) are counted in memory per worker and
+# written in bulk every WATCH_TIME_FLUSH_INTERVAL seconds, or sooner once
+# WATCH_TIME_MAX_PENDING (user, day) pairs are waiting. Set
+# WATCH_TIME_BUFFERED=0 to write every ping straight to the database.
+WATCH_TIME_BUFFERED = os.environ.get("WATCH_TIME_BUFFERED", "1") == "1"
+WATCH_TIME_FLUSH_INTERVAL = 30  # seconds
+WATCH_TIME_MAX_PENDING = 10000
+
+# Active training tracks per user (home/entitlements.py) are cached for this long;
+# subscription and membership changes invalidate them immediately.
+ENTITLEMENT_CACHE_ALIAS = "shared"
+ENTITLEMENT_CACHE_TTL = 60  # seconds
+
+# Bulk employee upload (home/employee_import.py): rows per existence check + insert transaction
+EMPLOYEE_IMPORT_BATCH_SIZE = 500
+
+# Bulk uploads run as background jobs (home/import_jobs.py). "thread" runs them on a
+# daemon thread in the web process; "command" leaves them to `manage.py run_import_jobs`.
+# Password hashing uses a process pool of EMPLOYEE_IMPORT_HASH_WORKERS (default: all
+# cores; 0 or 1 hashes in-process). A RUNNING job without progress for
+# EMPLOYEE_IMPORT_STALE_AFTER seconds is treated as crashed and resumed.
+EMPLOYEE_IMPORT_WORKER = os.environ.get("EMPLOYEE_IMPORT_WORKER", "thread")
+EMPLOYEE_IMPORT_HASH_WORKERS = None
+EMPLOYEE_IMPORT_STALE_AFTER = 300  # seconds
+EMPLOYEE_IMPORT_DIR = BASE_DIR / "private" / "employee_imports"  # not under MEDIA_ROOT
+
+# Superuser dashboard rollups (home/rollups.py, `manage.py update_rollups`): rows are
+# counted once they are this old, so slower transactions have committed by then.
+ROLLUP_LAG_SECONDS = 60
+
+# Per-track completion rates (home/analytics.py) are cached for this long; progress,
+# subscription and membership changes drop them straight away.
+COMPLETION_RATES_CACHE_ALIAS = "shared"
+COMPLETION_RATES_CACHE_TTL = 300  # seconds
+
+# Reporting reads go to this database alias in views marked @use_replica (None: off).
+# After a request writes, the browser reads from the primary for REPLICA_PIN_SECONDS,
+# which should cover the replica's lag.
+REPLICA_DATABASE_ALIAS = "replica" if os.environ.get("DJANGO_REPLICA_DB_PATH") else None
+REPLICA_PIN_SECONDS = 10
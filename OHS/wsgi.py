@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OHS.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.CHATBOT_PRELOAD:
+    from home.chatbot_logic import preload
+
+    preload()
@@ -0,0 +1,103 @@
+# Training completion rates
+#
+# For each track, the share of entitled people who have completed every
+# module. People are grouped by the type of organisation that entitles them
+# (CORPORATE / SCHOOL), with individual subscribers as INDIVIDUAL. "Entitled"
+# means an ACTIVE, unexpired subscription to the track (or BOTH), held by the
+# person or by their organisation. "Completed" means a percent of 100 in their
+# TrainingProgressSummary row.
+#
+# The counting is done by the database, two grouped queries per track. The
+# result is cached for COMPLETION_RATES_CACHE_TTL seconds and dropped when
+# progress, subscriptions or memberships change (see home/signals.py).
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import OrganizationMember, Subscription, TrainingModule, TrainingProgressSummary
+
+CACHE_KEY = "completion_rates"
+ORG_TYPES = ["CORPORATE", "SCHOOL"]
+
+
+def _cache():
+    return caches[getattr(settings, "COMPLETION_RATES_CACHE_ALIAS", "default")]
+
+
+def _rate(entitled, completed):
+    return {
+        "entitled": entitled,
+        "completed": completed,
+        "percent": int(completed * 100 / entitled) if entitled else 0,
+    }
+
+
+def _track_rates(track, now):
+    entitling = Subscription.objects.filter(
+        status="ACTIVE", end_date__gt=now, plan__type__in=[track, "BOTH"]
+    )
+
+    def completed(user_ref):
+        return TrainingProgressSummary.objects.filter(
+            user=OuterRef(user_ref), module_type=track, percent__gte=100
+        )
+
+    # Members of entitled organisations, by organisation type
+    # Driven from the entitling subscriptions (range on status/end_date), not
+    # from every member
+    members = (
+        OrganizationMember.objects.filter(
+            organization__in=entitling.filter(organization__isnull=False).values("organization_id")
+        )
+        .annotate(done=Exists(completed("user_id")))
+        .values("organization__organization_type")
+        .annotate(
+            entitled=Count("user_id", distinct=True),
+            completed=Count("user_id", distinct=True, filter=Q(done=True)),
+        )
+        .order_by()
+    )
+    rates = {org_type: _rate(0, 0) for org_type in ORG_TYPES}
+    for row in members:
+        rates[row["organization__organization_type"]] = _rate(row["entitled"], row["completed"])
+
+    # Individual subscribers
+    individuals = (
+        entitling.filter(user__isnull=False)
+        .annotate(done=Exists(completed("user_id")))
+        .aggregate(
+            entitled=Count("user_id", distinct=True),
+            completed=Count("user_id", distinct=True, filter=Q(done=True)),
+        )
+    )
+    rates["INDIVIDUAL"] = _rate(individuals["entitled"], individuals["completed"])
+
+    # (someone entitled in two groups counts in both)
+    rates["ALL"] = _rate(
+        sum(rate["entitled"] for rate in rates.values()),
+        sum(rate["completed"] for rate in rates.values()),
+    )
+    return rates
+
+
+def compute_completion_rates(now=None):
+    """``{track: {org type | "INDIVIDUAL" | "ALL": {"entitled", "completed", "percent"}}}``"""
+    now = now or timezone.now()
+    return {track: _track_rates(track, now) for track, _ in TrainingModule.MODULE_TYPES}
+
+
+def completion_rates():
+    """Cached compute_completion_rates()."""
+    cache = _cache()
+    rates = cache.get(CACHE_KEY)
+    if rates is None:
+        rates = compute_completion_rates()
+        cache.set(CACHE_KEY, rates, getattr(settings, "COMPLETION_RATES_CACHE_TTL", 300))
+    return rates
+
+
+def invalidate_completion_rates():
+    """Drop the cached rates once the current transaction commits."""
+    transaction.on_commit(lambda: _cache().delete(CACHE_KEY))
@@ -0,0 +1,209 @@
+# Memory-mapped chatbot artifacts
+#
+# `manage.py build_chatbot_index` writes the FAQ into a directory that every
+# worker can open without deserialising anything:
+#
+#   embeddings.npy   float32 (N, dim) matrix, unit-length rows, opened with mmap_mode="r"
+#   strings.bin      UTF-8 questions, answers and keywords back to back
+#   offsets.npy      int64 (3N + 1,) byte offsets into strings.bin
+#   manifest.json    model name, dimension, row count and a SHA-256 per file
+#
+# All workers then share one page-cache copy of the data.
+import csv
+import hashlib
+import json
+import mmap
+import os
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_DIR = os.path.join(BASE_DIR, "faq_index")
+FORMAT_VERSION = 1
+
+EMBEDDINGS_FILE = "embeddings.npy"
+STRINGS_FILE = "strings.bin"
+OFFSETS_FILE = "offsets.npy"
+MANIFEST_FILE = "manifest.json"
+
+KEYWORD_SEPARATOR = "\x1f"
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# === Source files ===
+def read_source(path):
+    """
+    Read FAQ rows from CSV (``question``, ``answer`` and optional ``keywords``
+    columns, keywords separated by ``;``), JSON (a list of objects with the same
+    keys) or a legacy ``semantic_data.pkl``.
+
+    Returns ``(records, embeddings)``; ``embeddings`` is None unless the source
+    already carries them (the pickle).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pkl":
+        import joblib
+
+        data = joblib.load(path)
+        keywords = data.get("keywords") or [[] for _ in data["questions"]]
+        records = [
+            {"question": q, "answer": a, "keywords": list(k)}
+            for q, a, k in zip(data["questions"], data["answers"], keywords)
+        ]
+        return records, np.asarray(data["embeddings"], dtype=np.float32)
+
+    if ext == ".json":
+        with open(path, encoding="utf-8") as fh:
+            rows = json.load(fh)
+    elif ext == ".csv":
+        with open(path, encoding="utf-8-sig", newline="") as fh:
+            rows = list(csv.DictReader(fh))
+    else:
+        raise ArtifactError(f"Unsupported FAQ source: {path} (use .csv, .json or .pkl)")
+
+    records = []
+    for row in rows:
+        row = {str(k).strip().lower(): v for k, v in row.items()}
+        question = (row.get("question") or "").strip()
+        answer = (row.get("answer") or "").strip()
+        if not question or not answer:
+            continue
+        keywords = row.get("keywords") or []
+        if isinstance(keywords, str):
+            keywords = [k.strip() for k in keywords.split(";") if k.strip()]
+        records.append({"question": question, "answer": answer, "keywords": list(keywords)})
+    return records, None
+
+
+# === Writing ===
+def write_artifacts(records, embeddings, output_dir, model_name):
+    """Write ``records`` and their ``embeddings`` to ``output_dir``; returns the manifest."""
+    from .chatbot_index import normalize
+
+    embeddings = normalize(embeddings)
+    if embeddings.shape[0] != len(records):
+        raise ArtifactError(
+            f"{len(records)} records but {embeddings.shape[0]} embeddings"
+        )
+    os.makedirs(output_dir, exist_ok=True)
+
+    columns = (
+        [r["question"] for r in records]
+        + [r["answer"] for r in records]
+        + [KEYWORD_SEPARATOR.join(r.get("keywords") or []) for r in records]
+    )
+    offsets = np.zeros(len(columns) + 1, dtype=np.int64)
+    with open(os.path.join(output_dir, STRINGS_FILE), "wb") as fh:
+        for i, text in enumerate(columns):
+            encoded = text.encode("utf-8")
+            fh.write(encoded)
+            offsets[i + 1] = offsets[i] + len(encoded)
+    np.save(os.path.join(output_dir, OFFSETS_FILE), offsets)
+    np.save(os.path.join(output_dir, EMBEDDINGS_FILE), embeddings)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model_name": model_name,
+        "dimension": int(embeddings.shape[1]),
+        "count": len(records),
+        "files": {
+            name: _sha256(os.path.join(output_dir, name))
+            for name in (EMBEDDINGS_FILE, STRINGS_FILE, OFFSETS_FILE)
+        },
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+# === Reading ===
+class StringTable:
+    """Read-only sequence of strings sliced out of a memory-mapped UTF-8 blob."""
+
+    def __init__(self, blob, offsets, start, count):
+        self._blob = blob
+        self._offsets = offsets
+        self._start = start
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        begin = int(self._offsets[self._start + i])
+        end = int(self._offsets[self._start + i + 1])
+        return self._blob[begin:end].decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(self._count))
+
+
+class FaqArtifacts:
+    def __init__(self, manifest, embeddings, questions, answers, keywords):
+        self.manifest = manifest
+        self.embeddings = embeddings
+        self.questions = questions
+        self.answers = answers
+        self.keywords = keywords
+
+    def keywords_for(self, i):
+        text = self.keywords[i]
+        return text.split(KEYWORD_SEPARATOR) if text else []
+
+
+def artifacts_exist(directory=ARTIFACT_DIR):
+    return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+
+def load_artifacts(directory=ARTIFACT_DIR, model_name=None, verify=False):
+    """
+    Open the artifacts in ``directory`` without copying them into the process:
+    the embeddings and strings are memory-mapped. ``verify`` re-hashes the files
+    against the manifest (reads them fully, so it is off by default).
+    """
+    with open(os.path.join(directory, MANIFEST_FILE)) as fh:
+        manifest = json.load(fh)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format: {manifest.get('format_version')}")
+    if model_name and manifest["model_name"] != model_name:
+        raise ArtifactError(
+            f"Artifacts were built with {manifest['model_name']}, not {model_name}"
+        )
+    if verify:
+        for name, checksum in manifest["files"].items():
+            if _sha256(os.path.join(directory, name)) != checksum:
+                raise ArtifactError(f"Checksum mismatch for {name}")
+
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+    if embeddings.shape != (manifest["count"], manifest["dimension"]):
+        raise ArtifactError(f"Embeddings shape {embeddings.shape} does not match manifest")
+    offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+
+    count = manifest["count"]
+    with open(os.path.join(directory, STRINGS_FILE), "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        blob = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+    return FaqArtifacts(
+        manifest,
+        embeddings,
+        StringTable(blob, offsets, 0, count),
+        StringTable(blob, offsets, count, count),
+        StringTable(blob, offsets, 2 * count, count),
+    )
@@ -0,0 +1,78 @@
+# Bounded executor for chatbot inference under ASGI
+#
+# The async chat view hands the CPU-bound work (embedding + similarity search)
+# to a small thread pool so the event loop stays free to hold many open
+# connections. The pool has a hard cap on queued work: when it is full the
+# view answers "busy" straight away instead of letting latency grow unbounded.
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class ExecutorBusy(Exception):
+    """Raised when the inference queue is full."""
+
+
+class InferenceExecutor:
+    def __init__(self, max_workers=4, max_pending=64):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # Worker threads don't survive fork, so each process gets its own pool
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._slots = threading.BoundedSemaphore(self.max_pending)
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="chatbot-inference"
+                    )
+                    self._pid = os.getpid()
+        return self._pool
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run ``fn`` on the pool and return a ``concurrent.futures.Future``.
+        Raises ``ExecutorBusy`` if ``max_pending`` calls are already queued or running.
+        """
+        pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise ExecutorBusy()
+        try:
+            future = pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot is held until the work really finishes, even if the caller
+        # timed out, so abandoned calls still count against the limit.
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """Await ``fn(*args, **kwargs)``; raises ``asyncio.TimeoutError`` after ``timeout`` seconds."""
+        future = self.submit(fn, *args, **kwargs)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_inference_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = InferenceExecutor(
+                    max_workers=getattr(settings, "CHATBOT_EXECUTOR_WORKERS", 4),
+                    max_pending=getattr(settings, "CHATBOT_EXECUTOR_MAX_PENDING", 64),
+                )
+    return _executor
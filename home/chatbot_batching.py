@@ -0,0 +1,136 @@
+# Micro-batching for sentence embeddings
+#
+# Concurrent chat requests each need one embedding. Instead of every request
+# calling ``encode`` with a batch of one, callers enqueue their text and a
+# single worker thread gathers whatever arrives within ``max_wait_ms`` (up to
+# ``max_batch_size``) into one ``encode`` call, then hands each caller its row.
+import asyncio
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Histogram:
+    """Non-cumulative bucket counts; the last bucket is +Inf."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.total += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={b}" for b in self.buckets] + ["+Inf"]
+            return {
+                "buckets": dict(zip(labels, self.counts)),
+                "count": self.total,
+                "mean": round(self.sum / self.total, 3) if self.total else 0.0,
+            }
+
+
+class _Request:
+    __slots__ = ("text", "future", "enqueued_at")
+
+    def __init__(self, text):
+        self.text = text
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """
+    ``encode_batch`` takes a list of texts and returns one embedding row per text.
+
+    ``submit`` returns a ``concurrent.futures.Future`` (sync views call
+    ``encode`` which waits on it); ``aencode`` returns an awaitable for async views.
+    """
+
+    def __init__(self, encode_batch, max_batch_size=32, max_wait_ms=5, max_queue=1024):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+
+    # === Worker lifecycle ===
+    def _ensure_worker(self):
+        # Threads don't survive fork, so each process starts its own worker
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._pid = os.getpid()
+                self._worker = threading.Thread(
+                    target=self._run, name="chatbot-embedding-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            for request in batch:
+                self.queue_wait_ms.observe((started - request.enqueued_at) * 1000)
+            try:
+                rows = self.encode_batch([request.text for request in batch])
+            except BaseException as exc:  # hand the failure to every waiting caller
+                for request in batch:
+                    request.future.set_exception(exc)
+                continue
+            for request, row in zip(batch, rows):
+                request.future.set_result(row)
+
+    # === Public API ===
+    def submit(self, text):
+        """Queue ``text``; raises ``queue.Full`` if the backlog is at ``max_queue``."""
+        self._ensure_worker()
+        request = _Request(text)
+        self._queue.put_nowait(request)
+        return request.future
+
+    def encode(self, text, timeout=None):
+        return self.submit(text).result(timeout=timeout)
+
+    async def aencode(self, text):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
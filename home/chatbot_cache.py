@@ -0,0 +1,127 @@
+# Query normalisation and caches for the chatbot
+#
+# Repeated questions ("what is posh", "who is ic member") are answered from
+# these caches instead of re-running the sentence encoder. Keys are the
+# normalised query text, so "What is POSH?" and "what is posh" share an entry.
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = " ?!.,"
+
+
+def normalize_query(text):
+    """Canonical form of a chat message: lowercased, single-spaced, no trailing punctuation."""
+    text = _WHITESPACE.sub(" ", (text or "").strip().lower())
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with hit/miss counters."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCache:
+    """
+    Same interface as ``LRUCache`` but backed by a Django cache, so all workers
+    share entries. Eviction is left to the cache backend; counters are per process.
+    """
+
+    def __init__(self, namespace, alias="default", ttl=3600):
+        self.namespace = namespace
+        self.alias = alias
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key):
+        # Hash so arbitrary user text is a valid memcached key
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return f"chatbot:{self.namespace}:{digest}"
+
+    def get(self, key, default=None):
+        value = caches[self.alias].get(self._key(key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        caches[self.alias].set(self._key(key), value, self.ttl)
+
+    def clear(self):
+        # Entries expire with the TTL; a shared cache can't be cleared per namespace
+        pass
+
+    def after_fork(self):
+        pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": f"cache:{self.alias}",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def build_query_cache(namespace, max_entries):
+    """Cache for ``namespace`` ("embedding" or "answer") as configured in settings."""
+    if getattr(settings, "CHATBOT_QUERY_CACHE_BACKEND", "locmem") == "cache":
+        return SharedCache(
+            namespace,
+            alias=getattr(settings, "CHATBOT_QUERY_CACHE_ALIAS", "default"),
+            ttl=getattr(settings, "CHATBOT_QUERY_CACHE_TTL", 3600),
+        )
+    return LRUCache(max_entries=max_entries)
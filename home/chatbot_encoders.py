@@ -0,0 +1,174 @@
+# Sentence encoder backends for the chatbot
+#
+# Both backends implement the subset of ``SentenceTransformer.encode`` the
+# chatbot uses: a string or list of strings in, a float32 NumPy array out
+# (one row per string), optionally L2-normalised.
+#
+# "torch" runs sentence-transformers in fp32. "onnx" runs the same MiniLM
+# transformer exported to ONNX (optionally int8 dynamic-quantised) under
+# onnxruntime, with the mean pooling of the sentence-transformers pipeline
+# done in NumPy. Export with `manage.py export_onnx_encoder`.
+import json
+import os
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ONNX_DIR = os.path.join(BASE_DIR, "onnx_encoder")
+ONNX_MODEL = "model.onnx"
+ONNX_QUANTIZED_MODEL = "model_quint8.onnx"
+ONNX_CONFIG = "encoder_config.json"
+
+
+def _as_list(sentences):
+    return ([sentences], True) if isinstance(sentences, str) else (list(sentences), False)
+
+
+def _l2_normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class TorchEncoder:
+    backend = "torch"
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        return self.model.encode(
+            sentences,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=normalize_embeddings,
+        ).astype(np.float32, copy=False)
+
+
+class OnnxEncoder:
+    backend = "onnx"
+
+    def __init__(self, model_dir=ONNX_DIR, quantized=False, intra_op_threads=0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        filename = ONNX_QUANTIZED_MODEL if quantized else ONNX_MODEL
+        path = os.path.join(model_dir, filename)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"{path} not found. Run `manage.py export_onnx_encoder`"
+                + (" --quantize" if quantized else "")
+            )
+        with open(os.path.join(model_dir, ONNX_CONFIG)) as fh:
+            self.config = json.load(fh)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = self.config["max_seq_length"]
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        sentences, single = _as_list(sentences)
+        rows = []
+        for start in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(
+                sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds = {
+                name: tokens[name].astype(np.int64)
+                for name in self.input_names
+                if name in tokens
+            }
+            hidden = self.session.run(None, feeds)[0]
+            # Mean pooling over real (non-padding) tokens, as in sentence-transformers
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            rows.append(pooled.astype(np.float32))
+        embeddings = np.vstack(rows) if rows else np.zeros((0, self.config["dimension"]), np.float32)
+        if normalize_embeddings:
+            embeddings = _l2_normalize(embeddings)
+        return embeddings[0] if single else embeddings
+
+
+def export_onnx(model_name, output_dir=ONNX_DIR, quantize=False, opset=17):
+    """
+    Export the transformer of ``model_name`` to ``output_dir/model.onnx`` (and
+    ``model_quint8.onnx`` if ``quantize``), with its tokenizer and pooling config.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids,
+            )[0]
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = tokenizer(["export sample", "a slightly longer export sample"], padding=True, return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, ONNX_MODEL)
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(transformer.auto_model.eval()),
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ONNX_CONFIG), "w") as fh:
+        json.dump(
+            {
+                "model_name": model_name,
+                "max_seq_length": st_model.max_seq_length,
+                "dimension": st_model.get_sentence_embedding_dimension(),
+            },
+            fh,
+            indent=2,
+        )
+
+    paths = [model_path]
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.join(output_dir, ONNX_QUANTIZED_MODEL)
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        paths.append(quantized_path)
+    return paths
+
+
+def build_encoder(model_name, backend="torch", onnx_dir=ONNX_DIR, quantized=False, intra_op_threads=0):
+    if backend == "torch":
+        return TorchEncoder(model_name)
+    if backend == "onnx":
+        return OnnxEncoder(onnx_dir, quantized=quantized, intra_op_threads=intra_op_threads)
+    raise ValueError(f"Unknown encoder backend: {backend!r}")
@@ -0,0 +1,253 @@
+# Vector indexes for semantic FAQ retrieval
+#
+# Every index stores L2-normalised float32 vectors and scores by inner product,
+# which equals cosine similarity. "exact" is a brute-force scan; "hnsw" is a
+# faiss HNSW graph; "ivf" is a pure-NumPy inverted file (spherical k-means
+# clusters, only the ``nprobe`` closest clusters are scanned per query).
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+INDEX_FILENAMES = {
+    "hnsw": "semantic_index.faiss",
+    "ivf": "semantic_index_ivf.npz",
+}
+
+
+def normalize(vectors):
+    """Return ``vectors`` as a C-contiguous float32 matrix with unit-length rows."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def _top_k(scores, k):
+    """Indices of the ``k`` highest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    if k == scores.shape[1]:
+        part = np.tile(np.arange(k), (scores.shape[0], 1))
+    else:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class VectorIndex:
+    """
+    Common interface. ``search(query, k)`` takes one vector or a matrix of
+    queries and returns ``(scores, ids)``, both shaped ``(n_queries, k)``.
+    """
+
+    backend = None
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def search(self, query, k):
+        raise NotImplementedError
+
+    def save(self, path):
+        raise NotImplementedError
+
+
+class ExactIndex(VectorIndex):
+    backend = "exact"
+
+    def __init__(self, vectors, normalized=False):
+        # Already-normalised float32 input (e.g. a memory-mapped .npy) is used as
+        # is, so the matrix is not copied into the process.
+        if normalized and getattr(vectors, "dtype", None) == np.float32:
+            self.vectors = vectors
+        else:
+            self.vectors = normalize(vectors)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def search(self, query, k):
+        scores = normalize(query) @ self.vectors.T
+        ids = _top_k(scores, k)
+        return np.take_along_axis(scores, ids, axis=1), ids
+
+    def save(self, path):
+        # Nothing to precompute: the embeddings themselves are the index
+        pass
+
+
+class IVFIndex(VectorIndex):
+    """
+    Pure-NumPy IVF index. Vectors are stored grouped by cluster so each probed
+    list is one contiguous slice.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, centroids, vectors, ids, offsets, nprobe=8):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, nlist=None, nprobe=8, iterations=20, seed=0):
+        vectors = normalize(vectors)
+        n = vectors.shape[0]
+        if nlist is None:
+            nlist = max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        # Spherical k-means: assign by inner product, re-normalise the means
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize(sums)
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        return cls(
+            centroids,
+            np.ascontiguousarray(vectors[order]),
+            order.astype(np.int64),
+            offsets,
+            nprobe=nprobe,
+        )
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def search(self, query, k):
+        queries = normalize(query)
+        nprobe = min(self.nprobe, self.centroids.shape[0])
+        probes = _top_k(queries @ self.centroids.T, nprobe)
+
+        all_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        all_ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        for row, (q, lists) in enumerate(zip(queries, probes)):
+            rows = np.concatenate(
+                [np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists]
+            )
+            if rows.size == 0:
+                continue
+            scores = (self.vectors[rows] @ q)[None, :]
+            top = _top_k(scores, k)[0]
+            all_scores[row, : top.size] = scores[0, top]
+            all_ids[row, : top.size] = self.ids[rows[top]]
+        return all_scores, all_ids
+
+    def save(self, path):
+        with open(path, "wb") as fh:
+            np.savez(
+                fh,
+                centroids=self.centroids,
+                vectors=self.vectors,
+                ids=self.ids,
+                offsets=self.offsets,
+                nprobe=np.int64(self.nprobe),
+            )
+
+    @classmethod
+    def load(cls, path, nprobe=None):
+        data = np.load(path)
+        return cls(
+            data["centroids"],
+            data["vectors"],
+            data["ids"],
+            data["offsets"],
+            nprobe=int(data["nprobe"]) if nprobe is None else nprobe,
+        )
+
+
+class HNSWIndex(VectorIndex):
+    """faiss ``IndexHNSWFlat`` with inner-product metric (needs faiss-cpu)."""
+
+    backend = "hnsw"
+
+    def __init__(self, index, ef_search=64):
+        self.index = index
+        self.index.hnsw.efSearch = ef_search
+
+    @classmethod
+    def build(cls, vectors, m=32, ef_construction=200, ef_search=64):
+        import faiss
+
+        vectors = normalize(vectors)
+        index = faiss.IndexHNSWFlat(vectors.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        index.add(vectors)
+        return cls(index, ef_search=ef_search)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def search(self, query, k):
+        return self.index.search(normalize(query), k)
+
+    def save(self, path):
+        import faiss
+
+        faiss.write_index(self.index, path)
+
+    @classmethod
+    def load(cls, path, ef_search=64):
+        import faiss
+
+        return cls(faiss.read_index(path), ef_search=ef_search)
+
+
+INDEX_CLASSES = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+    "hnsw": HNSWIndex,
+}
+
+
+def index_path(backend, base_dir=BASE_DIR):
+    return os.path.join(base_dir, INDEX_FILENAMES[backend])
+
+
+def build_index(vectors, backend="exact", **params):
+    if backend not in INDEX_CLASSES:
+        raise ValueError(f"Unknown index backend: {backend!r}")
+    if backend == "exact":
+        return ExactIndex(vectors)
+    return INDEX_CLASSES[backend].build(vectors, **params)
+
+
+def load_index(vectors, backend="exact", base_dir=BASE_DIR, normalized=False, **params):
+    """
+    Load the saved ``backend`` index from ``base_dir``. Falls back to an exact
+    index over ``vectors`` if the file has not been built (or faiss is missing).
+    """
+    if backend == "exact":
+        return ExactIndex(vectors, normalized=normalized)
+    if backend not in INDEX_CLASSES:
+        raise ValueError(f"Unknown index backend: {backend!r}")
+    path = index_path(backend, base_dir)
+    if not os.path.exists(path):
+        logger.warning(
+            "%s not found; using exact search. Run `manage.py build_semantic_index`.",
+            path,
+        )
+        return ExactIndex(vectors, normalized=normalized)
+    try:
+        return INDEX_CLASSES[backend].load(path, **params)
+    except ImportError:
+        logger.warning("faiss is not installed; using exact search.")
+        return ExactIndex(vectors, normalized=normalized)
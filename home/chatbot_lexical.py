@@ -0,0 +1,171 @@
+# Lexical (BM25) retrieval over the chatbot FAQ
+#
+# The first stage of the hybrid retriever: an inverted index over each FAQ
+# question plus its keywords. A query whose terms all hit one question clearly
+# ahead of the rest is answered here, without running the sentence encoder;
+# otherwise the lexical candidates become the shortlist for semantic rerank.
+import math
+import os
+import re
+from collections import defaultdict
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KEYWORD_INDEX_FILE = "keyword_index.pkl"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    """
+    a an the is are was were be been am do does did can could should would will
+    shall may might must i me my we our you your he she it its they them their
+    what which who whom whose when where why how this that these those there
+    of to in on at by for from with about as into under over and or if not no
+    so than then any some all also just please tell explain mean meaning
+    """.split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens of ``text`` with stopwords removed."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Okapi BM25 over FAQ documents. ``search(query, k)`` mirrors
+    ``VectorIndex.search`` and returns ``(scores, ids)`` shaped ``(1, k)``.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        lengths = np.array([len(doc) for doc in documents], dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.size and lengths.any() else 1.0
+        self._norm = k1 * (1 - b + b * lengths / avg_length)
+
+        # term -> (doc ids, term frequencies), both as arrays for vectorised scoring
+        postings = defaultdict(dict)
+        for doc_id, doc in enumerate(documents):
+            for term in doc:
+                postings[term][doc_id] = postings[term].get(doc_id, 0) + 1
+        self.postings = {
+            term: (
+                np.fromiter(docs.keys(), dtype=np.int64, count=len(docs)),
+                np.fromiter(docs.values(), dtype=np.float32, count=len(docs)),
+            )
+            for term, docs in postings.items()
+        }
+        self.idf = {
+            term: math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            for term, (ids, _) in self.postings.items()
+        }
+        # Terms that are not in the index weigh as much as the rarest term
+        self._unknown_idf = math.log(1 + (self.size + 0.5) / 0.5)
+
+    @classmethod
+    def from_faq(cls, questions, keywords=None, **params):
+        """
+        Build from the FAQ questions; ``keywords`` is an optional list of
+        keyword lists (one per question) folded into each document.
+        """
+        documents = []
+        for i, question in enumerate(questions):
+            terms = tokenize(question)
+            if keywords is not None:
+                for keyword in keywords[i] or ():
+                    terms.extend(tokenize(keyword))
+            documents.append(terms)
+        return cls(documents, **params)
+
+    def __len__(self):
+        return self.size
+
+    def scores(self, query):
+        """``(bm25 scores for every document, query coverage per document)``."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = np.zeros(self.size, dtype=np.float32)
+        total = 0.0
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                total += self._unknown_idf
+                continue
+            idf = self.idf[term]
+            total += idf
+            ids, tf = posting
+            scores[ids] += idf * tf * (self.k1 + 1) / (tf + self._norm[ids])
+            matched[ids] += idf
+        coverage = matched / total if total else matched
+        return scores, coverage
+
+    def search(self, query, k):
+        scores, _ = self.scores(query)
+        candidates = np.flatnonzero(scores)
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        return scores[top][None, :], top[None, :]
+
+    def best_match(self, query, min_coverage=1.0, min_margin=0.25):
+        """
+        The id of the only question that clearly answers ``query`` on its own,
+        or None. It must contain at least ``min_coverage`` of the query's IDF
+        weight and beat the runner-up's BM25 score by ``min_margin`` (relative).
+        """
+        scores, coverage = self.scores(query)
+        if not scores.any():
+            return None
+        order = np.argsort(-scores, kind="stable")[:2]
+        best = int(order[0])
+        if coverage[best] < min_coverage:
+            return None
+        runner_up = float(scores[order[1]]) if len(order) > 1 else 0.0
+        if runner_up > (1 - min_margin) * float(scores[best]):
+            return None
+        return best
+
+
+def load_keyword_index(questions, base_dir=BASE_DIR):
+    """
+    Per-question keyword lists from ``keyword_index.pkl``, matched to
+    ``questions`` by text (the pickle may predate newer FAQ rows). Returns
+    None when the file is missing.
+    """
+    path = os.path.join(base_dir, KEYWORD_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    import joblib
+
+    data = joblib.load(path)
+    position = {q: i for i, q in enumerate(questions)}
+    keywords = [[] for _ in questions]
+    for keyword, entries in data.get("keyword_to_questions", {}).items():
+        for entry in entries:
+            i = position.get(entry.get("question"))
+            if i is not None:
+                keywords[i].append(keyword)
+    return keywords
+
+
+def fuse_scores(lexical, semantic, method="linear", alpha=0.7, rrf_k=60):
+    """
+    Combine the lexical and semantic scores of the same candidate list.
+    ``linear``: ``alpha * cosine + (1 - alpha) * bm25 / max(bm25)``.
+    ``rrf``: reciprocal rank fusion, ``1 / (rrf_k + rank)`` summed over both.
+    """
+    lexical = np.asarray(lexical, dtype=np.float32)
+    semantic = np.asarray(semantic, dtype=np.float32)
+    if method == "linear":
+        top = float(lexical.max()) if lexical.size else 0.0
+        lexical_norm = lexical / top if top > 0 else lexical
+        return alpha * semantic + (1 - alpha) * lexical_norm
+    if method == "rrf":
+        fused = np.zeros(len(lexical), dtype=np.float32)
+        for scores in (lexical, semantic):
+            ranks = np.empty(len(scores), dtype=np.float32)
+            ranks[np.argsort(-scores, kind="stable")] = np.arange(1, len(scores) + 1)
+            fused += 1.0 / (rrf_k + ranks)
+        return fused
+    raise ValueError(f"Unknown fusion method: {method!r}")
@@ -1,77 +1,378 @@
 # Handles chatbot response
-import joblib
+#
+# Nothing heavy is imported at module level: joblib, numpy, torch and
+# sentence-transformers are pulled in the first time the engine is used, so
+# Django startup, migrations and management commands stay cheap.
 import os
-from sentence_transformers import SentenceTransformer, util
-import torch
+import threading
 
-# === Load saved components ===
+from django.conf import settings
+
+from .chatbot_cache import normalize_query
+
+# === Paths to saved components ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+class ChatbotEngine:
+    """
+    Lazily loaded bundle of the FAQ data and the sentence encoder.
+
+    ``load()`` is idempotent and thread-safe. Calling it in the master process
+    before workers fork (``preload()``) lets every worker share the loaded
+    pages copy-on-write; otherwise the first request in each worker loads it.
+    """
+
+    def __init__(self, base_dir=BASE_DIR, model_name=MODEL_NAME):
+        self.base_dir = base_dir
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._state = None  # (questions, answers, index, semantic_model, vectors, lexical)
+        self._classifier = None
+        self._label_encoder = None
+        self.embedding_cache = None  # normalised text -> query embedding
+        self.answer_cache = None  # (normalised text, top_n) -> (suggestions, top score)
+        self.batcher = None  # EmbeddingBatcher when CHATBOT_BATCH_ENABLED
+        # How each uncached query was answered: BM25 alone, semantic rerank of
+        # the BM25 shortlist, or a full vector-index search
+        self.retrieval_counts = {"lexical": 0, "rerank": 0, "semantic": 0}
+
+    # === Loading ===
+    def _path(self, filename):
+        return os.path.join(self.base_dir, filename)
+
+    def load(self):
+        """Load the FAQ data, vector index and encoder once; later calls are no-ops."""
+        if self._state is not None:
+            return self
+        with self._lock:
+            if self._state is None:
+                from .chatbot_cache import build_query_cache
+                from .chatbot_encoders import build_encoder
+                from .chatbot_index import load_index
+                from .chatbot_lexical import LexicalIndex
+
+                # Load semantic data (questions, answers, embeddings, keywords)
+                questions, answers, embeddings, keywords, index_dir = self._load_faq()
+                index = load_index(
+                    embeddings,
+                    backend=getattr(settings, "CHATBOT_INDEX_BACKEND", "exact"),
+                    base_dir=index_dir,
+                    normalized=True,
+                    **getattr(settings, "CHATBOT_INDEX_PARAMS", {}),
+                )
+
+                lexical = None
+                if getattr(settings, "CHATBOT_RETRIEVER", "semantic") == "hybrid":
+                    lexical = LexicalIndex.from_faq(
+                        questions, keywords, **getattr(settings, "CHATBOT_LEXICAL_PARAMS", {})
+                    )
+
+                # Load sentence transformer model (PyTorch or ONNX Runtime)
+                semantic_model = build_encoder(
+                    self.model_name,
+                    backend=getattr(settings, "CHATBOT_ENCODER_BACKEND", "torch"),
+                    **getattr(settings, "CHATBOT_ENCODER_OPTIONS", {}),
+                )
+
+                self.embedding_cache = build_query_cache(
+                    "embedding", getattr(settings, "CHATBOT_EMBEDDING_CACHE_SIZE", 4096)
+                )
+                self.answer_cache = build_query_cache(
+                    "answer", getattr(settings, "CHATBOT_ANSWER_CACHE_SIZE", 1024)
+                )
+                if getattr(settings, "CHATBOT_BATCH_ENABLED", False):
+                    from .chatbot_batching import EmbeddingBatcher
+
+                    self.batcher = EmbeddingBatcher(
+                        self._encode_batch,
+                        max_batch_size=getattr(settings, "CHATBOT_BATCH_MAX_SIZE", 32),
+                        max_wait_ms=getattr(settings, "CHATBOT_BATCH_MAX_WAIT_MS", 5),
+                    )
+
+                # Publish everything at once so readers never see a half-loaded engine
+                self._state = (questions, answers, index, semantic_model, embeddings, lexical)
+        return self
+
+    def _load_faq(self):
+        """
+        ``(questions, answers, embeddings, keywords, index_dir)``: from the
+        memory-mapped artifacts of `manage.py build_chatbot_index` when they
+        exist (zero-copy, shared page cache), otherwise from the legacy
+        ``semantic_data.pkl``. Embeddings are unit-length float32 either way.
+        """
+        from .chatbot_artifacts import artifacts_exist, load_artifacts
+        from .chatbot_index import normalize
+        from .chatbot_lexical import load_keyword_index
+
+        artifact_dir = getattr(settings, "CHATBOT_ARTIFACT_DIR", None)
+        if artifact_dir and artifacts_exist(artifact_dir):
+            artifacts = load_artifacts(
+                artifact_dir,
+                model_name=self.model_name,
+                verify=getattr(settings, "CHATBOT_VERIFY_ARTIFACTS", False),
+            )
+            keywords = [artifacts.keywords_for(i) for i in range(len(artifacts.questions))]
+            return (
+                artifacts.questions,
+                artifacts.answers,
+                artifacts.embeddings,
+                keywords,
+                artifact_dir,
+            )
+
+        import joblib
+
+        semantic_data = joblib.load(self._path("semantic_data.pkl"))
+        questions = semantic_data["questions"]
+        keywords = [list(k) for k in semantic_data.get("keywords") or [[] for _ in questions]]
+        extra = load_keyword_index(questions, self.base_dir)
+        if extra is not None:
+            keywords = [own + more for own, more in zip(keywords, extra)]
+        return (
+            questions,
+            semantic_data["answers"],
+            normalize(semantic_data["embeddings"]),
+            keywords,
+            self.base_dir,
+        )
+
+    def is_ready(self):
+        """True once the FAQ data and encoder are in memory."""
+        return self._state is not None
+
+    def _after_fork_in_child(self):
+        # A lock held by another thread at fork time would never be released in the child
+        self._lock = threading.Lock()
+        for cache in (self.embedding_cache, self.answer_cache):
+            if cache is not None:
+                cache.after_fork()
+
+    def cache_stats(self):
+        if not self.is_ready():
+            return {}
+        stats = {
+            "embedding": self.embedding_cache.stats(),
+            "answer": self.answer_cache.stats(),
+        }
+        if self.batcher is not None:
+            stats["batching"] = self.batcher.stats()
+        if self._state[5] is not None:
+            stats["retrieval"] = dict(self.retrieval_counts)
+        return stats
+
+    @property
+    def questions(self):
+        return self.load()._state[0]
+
+    @property
+    def answers(self):
+        return self.load()._state[1]
+
+    @property
+    def index(self):
+        return self.load()._state[2]
 
-# Load SVM classifier and label encoder
-model = joblib.load(os.path.join(BASE_DIR, "chatbot_model.pkl"))
-label_encoder = joblib.load(os.path.join(BASE_DIR, "label_encoder.pkl"))
+    @property
+    def semantic_model(self):
+        return self.load()._state[3]
 
-# Load semantic data (questions, answers, embeddings)
-semantic_data = joblib.load(os.path.join(BASE_DIR, "semantic_data.pkl"))
-questions = semantic_data["questions"]
-answers = semantic_data["answers"]
-embeddings = torch.tensor(semantic_data["embeddings"])  # Convert to tensor
+    # The SVM classifier and label encoder are not used by the semantic path,
+    # so they are only read from disk if something asks for them.
+    @property
+    def classifier(self):
+        if self._classifier is None:
+            import joblib
 
-# Load sentence transformer model
-semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self._classifier = joblib.load(self._path("chatbot_model.pkl"))
+        return self._classifier
 
-# === Hybrid Predict Function ===
+    @property
+    def label_encoder(self):
+        if self._label_encoder is None:
+            import joblib
 
+            self._label_encoder = joblib.load(self._path("label_encoder.pkl"))
+        return self._label_encoder
+
+    def _encode_batch(self, texts):
+        return self.semantic_model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+
+    def encode(self, text):
+        """Unit-length float32 embedding of ``text``, cached by its normalised form."""
+        self.load()
+        key = normalize_query(text)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            if self.batcher is not None:
+                embedding = self.batcher.encode(key)
+            else:
+                embedding = self._encode_batch([key])[0]
+            self.embedding_cache.set(key, embedding)
+        return embedding
+
+    # === Suggest top N similar questions ===
+    def get_question_suggestions(self, user_question, top_n=3):
+        questions, answers, _, _, _, lexical = self.load()._state
+        key = (normalize_query(user_question), top_n)
+        cached = self.answer_cache.get(key)
+        if cached is not None:
+            return list(cached[0]), cached[1]
+
+        if lexical is not None:
+            top_indices, top_score = self._hybrid_search(user_question, top_n)
+        else:
+            top_indices, top_score = self._semantic_search(self.encode(user_question), top_n)
+        suggestions = [(questions[i], answers[i]) for i in top_indices]
+        self.answer_cache.set(key, (tuple(suggestions), top_score))
+        return suggestions, top_score
+
+    def _semantic_search(self, query_embedding, top_n):
+        self.retrieval_counts["semantic"] += 1
+        scores, ids = self._state[2].search(query_embedding, top_n)
+        return [int(i) for i in ids[0] if i >= 0], float(scores[0][0])
+
+    def _hybrid_search(self, user_question, top_n):
+        """
+        Two-stage retrieval. A query whose terms all point at one question is
+        answered from BM25 alone, without the encoder. Otherwise the BM25
+        shortlist is reranked by cosine similarity with fused scores; when the
+        shortlist is empty or none of it is semantically close, the full vector
+        index is searched instead.
+
+        The returned score is a cosine similarity (1.0 for a lexical answer),
+        so ``predict``'s threshold means the same thing in both modes.
+        """
+        import numpy as np
+
+        from .chatbot_lexical import fuse_scores
+
+        _, _, _, _, vectors, lexical = self._state
+        params = getattr(settings, "CHATBOT_HYBRID_PARAMS", {})
+
+        best = lexical.best_match(
+            user_question,
+            min_coverage=params.get("min_coverage", 1.0),
+            min_margin=params.get("min_margin", 0.25),
+        )
+        if best is not None:
+            self.retrieval_counts["lexical"] += 1
+            _, ids = lexical.search(user_question, top_n)
+            return [int(i) for i in ids[0]], 1.0
+
+        lexical_scores, ids = lexical.search(user_question, params.get("shortlist", 20))
+        query_embedding = self.encode(user_question)
+        if ids.size:
+            ids = ids[0]
+            semantic_scores = np.asarray(vectors[ids] @ query_embedding, dtype=np.float32)
+            if float(semantic_scores.max()) >= params.get("fallback_score", 0.5):
+                self.retrieval_counts["rerank"] += 1
+                fused = fuse_scores(
+                    lexical_scores[0],
+                    semantic_scores,
+                    method=params.get("fusion", "linear"),
+                    alpha=params.get("alpha", 0.7),
+                    rrf_k=params.get("rrf_k", 60),
+                )
+                order = np.argsort(-fused, kind="stable")[:top_n]
+                return [int(i) for i in ids[order]], float(semantic_scores[order[0]])
+        return self._semantic_search(query_embedding, top_n)
+
+
+engine = ChatbotEngine()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=engine._after_fork_in_child)
+
+
+def preload():
+    """Load the chatbot in the current process (call before workers fork)."""
+    return engine.load()
+
+
+def is_ready():
+    return engine.is_ready()
+
+
+def cache_stats():
+    return engine.cache_stats()
 
-# === Fallback memory for suggested questions ===
-last_suggestions = []
 
 # === Match user input to previous suggestions ===
-def match_followup(user_input):
-    global last_suggestions
+def match_followup(user_input, suggestions):
+    """
+    Return the answer for a reply to an earlier "did you mean" list, or None.
+    ``suggestions`` is that conversation's list of ``(question, answer)`` pairs.
+    """
+    if not suggestions:
+        return None
 
     # 1. Handle numeric replies like "1", "2", or "3"
     if user_input.strip().isdigit():
         index = int(user_input.strip()) - 1
-        if 0 <= index < len(last_suggestions):
-            answer = last_suggestions[index][1]
-            last_suggestions = []  # Clear suggestions
-            return answer
+        if 0 <= index < len(suggestions):
+            return suggestions[index][1]
 
     # 2. Handle text-based matches
-    for q, a in last_suggestions:
+    for q, a in suggestions:
         if user_input.strip().lower() in q.lower():
-            last_suggestions = []  # Clear suggestions
             return a
 
     return None
 
 # === Suggest top N similar questions ===
 def get_question_suggestions(user_question, top_n=3):
-    user_embedding = semantic_model.encode(user_question, convert_to_tensor=True)
-    cosine_scores = util.pytorch_cos_sim(user_embedding, embeddings)[0]
-    top_indices = torch.topk(cosine_scores, k=top_n).indices.tolist()
-    return [(questions[i], answers[i]) for i in top_indices], float(torch.max(cosine_scores))
+    return engine.get_question_suggestions(user_question, top_n=top_n)
 
 # === Hybrid Predict Function with fallback ===
-def predict_answer(user_question, threshold=0.5):
-    global last_suggestions
+def predict(user_question, threshold=0.5, conversation_id=None, store=None):
+    """
+    Structured answer for ``user_question``: ``{"answer": str}`` when a match is
+    found, or ``{"answer": None, "message": str, "suggestions": [question, ...]}``.
+
+    Pending suggestions are kept per ``conversation_id`` in the configured
+    conversation store; without an id, follow-ups are disabled.
+    """
+    if conversation_id is not None and store is None:
+        from .chatbot_state import get_conversation_store
+
+        store = get_conversation_store()
 
     # Step 1: Check if input is a follow-up to suggestions
-    followup = match_followup(user_question)
-    if followup:
-        return followup
+    if conversation_id is not None:
+        pending = store.pop(conversation_id)
+        followup = match_followup(user_question, pending)
+        if followup:
+            return {"answer": followup}
 
     # Step 2: Semantic similarity search
     suggestions, top_score = get_question_suggestions(user_question)
 
     if top_score >= threshold:
-        last_suggestions = []
-        return suggestions[0][1]
+        return {"answer": suggestions[0][1]}
     else:
-        last_suggestions = suggestions
-        options = "\n".join([f"{i+1}. {q}" for i, (q, _) in enumerate(suggestions)])
-        return (
-            f"Apologies I could not understand \"{user_question}\" since it is not related to OHS,\n"
-            f"Did you mean one of these?\n\n{options}\n\n" 
-        )
\ No newline at end of file
+        if conversation_id is not None:
+            store.set(conversation_id, suggestions)
+        return {
+            "answer": None,
+            "message": (
+                f"Apologies I could not understand \"{user_question}\" since it is not related to OHS,\n"
+                f"Did you mean one of these?"
+            ),
+            "suggestions": [q for q, _ in suggestions],
+        }
+
+
+def predict_answer(user_question, threshold=0.5, conversation_id=None, store=None):
+    """``predict`` rendered as the plain-text reply the chat widget expects."""
+    result = predict(user_question, threshold, conversation_id=conversation_id, store=store)
+    if result["answer"] is not None:
+        return result["answer"]
+    options = "\n".join([f"{i+1}. {q}" for i, q in enumerate(result["suggestions"])])
+    return f"{result['message']}\n\n{options}\n\n"
@@ -0,0 +1,157 @@
+# Per-conversation chatbot state ("did you mean" suggestions)
+#
+# Each visitor's pending suggestions are stored under their conversation id
+# (the session key by default) so a reply of "1" is matched against their own
+# list, not whichever list another visitor was last shown.
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ConversationStore:
+    """
+    Interface for conversation state backends.
+
+    ``get`` returns the pending suggestions as a list of ``(question, answer)``
+    tuples, or an empty list if there are none (or they have expired).
+    """
+
+    def get(self, conversation_id):
+        raise NotImplementedError
+
+    def set(self, conversation_id, suggestions):
+        raise NotImplementedError
+
+    def clear(self, conversation_id):
+        raise NotImplementedError
+
+    def pop(self, conversation_id):
+        suggestions = self.get(conversation_id)
+        if suggestions:
+            self.clear(conversation_id)
+        return suggestions
+
+
+class LocMemConversationStore(ConversationStore):
+    """
+    In-process LRU with a TTL. Only correct when every message of a
+    conversation is served by the same process (single worker, or sticky routing).
+    """
+
+    def __init__(self, max_entries=10000, ttl=900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # conversation_id -> (expires_at, suggestions)
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id):
+        with self._lock:
+            entry = self._data.get(conversation_id)
+            if entry is None:
+                return []
+            expires_at, suggestions = entry
+            if expires_at <= time.monotonic():
+                del self._data[conversation_id]
+                return []
+            self._data.move_to_end(conversation_id)
+            return list(suggestions)
+
+    def set(self, conversation_id, suggestions):
+        if not suggestions:
+            self.clear(conversation_id)
+            return
+        with self._lock:
+            self._data[conversation_id] = (time.monotonic() + self.ttl, tuple(suggestions))
+            self._data.move_to_end(conversation_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self, conversation_id):
+        with self._lock:
+            self._data.pop(conversation_id, None)
+
+    def pop(self, conversation_id):
+        # Read and clear under one lock so a suggestion is answered at most once
+        with self._lock:
+            entry = self._data.pop(conversation_id, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return []
+        return list(entry[1])
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheConversationStore(ConversationStore):
+    """
+    Stores state in a Django cache so it is shared by every worker. Size is
+    bounded by the cache backend's own eviction (e.g. ``MAX_ENTRIES``).
+    """
+
+    key_prefix = "chatbot:conv:"
+
+    def __init__(self, alias="default", ttl=900):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        # caches[...] is per-thread, so look it up on every call
+        return caches[self.alias]
+
+    def _key(self, conversation_id):
+        return f"{self.key_prefix}{conversation_id}"
+
+    def get(self, conversation_id):
+        suggestions = self.cache.get(self._key(conversation_id))
+        return [tuple(s) for s in suggestions] if suggestions else []
+
+    def set(self, conversation_id, suggestions):
+        if not suggestions:
+            self.clear(conversation_id)
+            return
+        self.cache.set(
+            self._key(conversation_id), [list(s) for s in suggestions], self.ttl
+        )
+
+    def clear(self, conversation_id):
+        self.cache.delete(self._key(conversation_id))
+
+    def pop(self, conversation_id):
+        key = self._key(conversation_id)
+        suggestions = self.cache.get(key)
+        # Only the request whose delete removed the entry answers it
+        if not suggestions or not self.cache.delete(key):
+            return []
+        return [tuple(s) for s in suggestions]
+
+
+# === Configured store ===
+_store = None
+_store_lock = threading.Lock()
+
+
+def build_conversation_store():
+    backend = getattr(settings, "CHATBOT_STATE_BACKEND", "locmem")
+    ttl = getattr(settings, "CHATBOT_STATE_TTL", 900)
+    if backend == "cache":
+        return CacheConversationStore(
+            alias=getattr(settings, "CHATBOT_STATE_CACHE_ALIAS", "default"), ttl=ttl
+        )
+    if backend == "locmem":
+        return LocMemConversationStore(
+            max_entries=getattr(settings, "CHATBOT_STATE_MAX_ENTRIES", 10000), ttl=ttl
+        )
+    raise ValueError(f"Unknown CHATBOT_STATE_BACKEND: {backend!r}")
+
+
+def get_conversation_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = build_conversation_store()
+    return _store
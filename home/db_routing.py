@@ -0,0 +1,111 @@
+# Read replica routing
+#
+# Views marked @use_replica send their reads to the REPLICA_DATABASE_ALIAS
+# database, a copy of db.sqlite3 kept up to date outside Django, so dashboard
+# and report queries stop competing with the heartbeat and progress writes on
+# "default". Other views, and every write, use "default".
+#
+# Read-your-writes: the first write in a request sends the rest of that
+# request's reads to the primary. ReplicaPinMiddleware then sets a short-lived
+# cookie, so the same browser keeps reading the primary for
+# REPLICA_PIN_SECONDS (the replica's expected lag), e.g. on the dashboard it
+# is redirected to after a form post.
+#
+# The state is an asgiref Local: per thread under WSGI, and per request
+# context under ASGI, where requests share threads and sync code runs on
+# sync_to_async threads.
+#
+# Migrations are never applied to the replica: it is a copy of the primary.
+from functools import wraps
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "db_pin_primary"
+
+
+# replica_reads: inside a @use_replica view; pinned: the browser wrote
+# recently (cookie); wrote: this request wrote
+_state = Local()
+
+
+def _flag(name):
+    return getattr(_state, name, False)
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is none."""
+    alias = getattr(settings, "REPLICA_DATABASE_ALIAS", None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def _is_cache(model):
+    # DatabaseCache entries: always on the primary, and not counted as writes
+    return model._meta.app_label == "django_cache"
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _flag("replica_reads") or _is_cache(model):
+            return None
+        if _flag("pinned") or _flag("wrote"):
+            # Not None: an instance read from the replica would otherwise
+            # keep its related lookups there
+            return DEFAULT_DB_ALIAS
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        if _is_cache(model):
+            return None
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
+
+
+def use_replica(view):
+    """Read from the replica in this view until it writes."""
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        previous, wrote = _flag("replica_reads"), _flag("wrote")
+        _state.replica_reads, _state.wrote = True, False
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica_reads = previous
+            _state.wrote = wrote or _flag("wrote")
+
+    return wrapped
+
+
+class ReplicaPinMiddleware:
+    """Keep a browser on the primary for REPLICA_PIN_SECONDS after it writes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned, _state.wrote = PIN_COOKIE in request.COOKIES, False
+        try:
+            response = self.get_response(request)
+            wrote = _flag("wrote")
+        finally:
+            _state.pinned, _state.wrote = False, False
+        if wrote and replica_alias():
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=getattr(settings, "REPLICA_PIN_SECONDS", 10),
+                httponly=True, samesite="Lax",
+            )
+        return response
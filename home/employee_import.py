@@ -0,0 +1,174 @@
+# Bulk employee import
+#
+# The upload is read line by line (Django yields an uploaded file's lines
+# chunk by chunk) and processed in batches of EMPLOYEE_IMPORT_BATCH_SIZE
+# rows. Each batch does one ``email IN (...)`` query for existing accounts,
+# then bulk-creates the users and their OrganizationMember rows in one
+# transaction. A failed batch is reported row by row and the import carries
+# on with the next batch. The seat limit comes from a single up-front count.
+#
+# Rows that are not imported are collected as ``(line, email, reason)`` for a
+# downloadable CSV error report.
+import codecs
+import csv
+import io
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+
+from .models import OrganizationMember, User
+
+COLUMNS = ["Name", "Last name", "Department", "Email", "Phone no", "Default password"]
+REPORT_COLUMNS = ["Line", "Email", "Error"]
+PHONE_MAX_LENGTH = User._meta.get_field("phone").max_length
+
+
+class ImportResult:
+    def __init__(self, added=0, errors=None):
+        self.added = added
+        self.errors = list(errors or [])
+
+    def error(self, line, email, reason):
+        self.errors.append((line, email, reason))
+
+
+def read_rows(uploaded_file):
+    """
+    Yield ``(line number, row dict)`` from an uploaded CSV without reading it
+    into memory. Handles an Excel BOM and stray whitespace in the headers.
+    """
+    reader = csv.DictReader(codecs.iterdecode(uploaded_file, "utf-8-sig"))
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip() for name in reader.fieldnames]
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _clean(row):
+    return {column: (row.get(column) or "").strip() for column in COLUMNS}
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _existing_emails(emails):
+    """Lower-cased emails already taken, as email or as username (one query)."""
+    taken = set()
+    for email, username in User.objects.filter(
+        Q(email__in=emails) | Q(username__in=emails)
+    ).values_list("email", "username"):
+        taken.add(email.lower())
+        taken.add(username.lower())
+    return taken
+
+
+def hash_serially(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def _build_user(fields, password_hash):
+    email = fields["Email"]
+    return User(
+        username=email,
+        email=email,
+        password=password_hash,
+        first_name=fields["Name"],
+        last_name=fields["Last name"],
+        department=fields["Department"],
+        phone=fields["Phone no"] or None,
+        account_type="EMPLOYEE",
+    )
+
+
+def _insert_batch(org, users):
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        OrganizationMember.objects.bulk_create(
+            [OrganizationMember(organization=org, user=user, role="MEMBER") for user in users]
+        )
+
+
+def import_employees(
+    org, rows, batch_size=None, hash_passwords=hash_serially, result=None, on_batch=None
+):
+    """
+    Create employees of ``org`` from ``(line, row)`` pairs (see read_rows).
+    Returns an ImportResult with the number added and the rejected rows.
+
+    ``hash_passwords`` turns a list of raw passwords into hashes. ``result``
+    continues a partial import. ``on_batch(result, last_line)`` is called in
+    the transaction that commits each batch, so progress saved there always
+    matches the rows written.
+    """
+    batch_size = batch_size or getattr(settings, "EMPLOYEE_IMPORT_BATCH_SIZE", 500)
+    result = result or ImportResult()
+    seats_left = org.max_users - OrganizationMember.objects.filter(organization=org).count()
+    seen = set()
+
+    for batch in _batches(rows, batch_size):
+        candidates = []
+        for line, row in batch:
+            fields = _clean(row)
+            email = fields["Email"]
+            if not email or not fields["Default password"]:
+                result.error(line, email, "Email and default password are required")
+                continue
+            try:
+                validate_email(email)
+            except ValidationError:
+                result.error(line, email, "Invalid email address")
+                continue
+            if len(fields["Phone no"]) > PHONE_MAX_LENGTH:
+                # Checked here: one over-long value would fail the whole batch insert
+                result.error(line, email, f"Phone number longer than {PHONE_MAX_LENGTH} characters")
+                continue
+            if email.lower() in seen:
+                result.error(line, email, "Duplicate email in file")
+                continue
+            seen.add(email.lower())
+            candidates.append((line, fields))
+
+        taken = _existing_emails([fields["Email"] for _, fields in candidates]) if candidates else set()
+        new = []
+        for line, fields in candidates:
+            email = fields["Email"]
+            if email.lower() in taken:
+                result.error(line, email, "A user with this email already exists")
+            elif len(new) >= seats_left:
+                result.error(line, email, f"Seat limit reached ({org.max_users})")
+            else:
+                new.append((line, fields))
+
+        hashes = hash_passwords([fields["Default password"] for _, fields in new]) if new else []
+        with transaction.atomic():
+            if new:
+                users = [_build_user(fields, password_hash) for (_, fields), password_hash in zip(new, hashes)]
+                try:
+                    _insert_batch(org, users)
+                except Exception as e:
+                    for line, fields in new:
+                        result.error(line, fields["Email"], f"Not imported: {e}")
+                else:
+                    result.added += len(users)
+                    seats_left -= len(users)
+            if on_batch:
+                on_batch(result, batch[-1][0])
+
+    return result
+
+
+def error_report_csv(errors):
+    """The rejected rows as CSV text, in file order, for download."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(REPORT_COLUMNS)
+    writer.writerows(sorted(errors, key=lambda error: error[0]))
+    return out.getvalue()
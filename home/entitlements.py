@@ -0,0 +1,145 @@
+# Subscription entitlements
+#
+# Which training tracks a user may open, from their own subscriptions and
+# those of every organisation they belong to. Resolved with one query, then
+# memoised on the request and kept in the cache for ENTITLEMENT_CACHE_TTL
+# seconds (never past the moment the earliest subscription ends). Saving or
+# deleting a Subscription or OrganizationMember drops the affected users'
+# entries (see home/signals.py).
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import invalidate_completion_rates
+from .models import OrganizationMember, Subscription
+
+# Plan type -> tracks it grants
+PLAN_TRACKS = {
+    "POSH": {"POSH"},
+    "POCSO": {"POCSO"},
+    "BOTH": {"POSH", "POCSO"},
+}
+
+
+def _cache():
+    return caches[getattr(settings, "ENTITLEMENT_CACHE_ALIAS", "default")]
+
+
+def _key(user_id):
+    return f"entitlements:{user_id}"
+
+
+def active_subscriptions(user, now=None):
+    """
+    ``(plan type, end date)`` of the user's own and their organisations'
+    subscriptions that grant access right now. It is a UNION of two lookups,
+    each on its own partial index, because SQLite would answer the OR form
+    with a range scan over every active subscription.
+    """
+    active = Subscription.objects.filter(status="ACTIVE", end_date__gt=now or timezone.now())
+    own = active.filter(user=user).values_list("plan__type", "end_date")
+    through_orgs = active.filter(organization__organizationmember__user=user).values_list(
+        "plan__type", "end_date"
+    )
+    return own.union(through_orgs, all=True)
+
+
+def resolve_tracks(user):
+    """``(frozenset of tracks, seconds until the first of them ends or None)`` in one query."""
+    now = timezone.now()
+    tracks, first_end = set(), None
+    for plan_type, end_date in active_subscriptions(user, now):
+        tracks |= PLAN_TRACKS.get(plan_type, set())
+        if first_end is None or end_date < first_end:
+            first_end = end_date
+    expires_in = (first_end - now).total_seconds() if first_end else None
+    return frozenset(tracks), expires_in
+
+
+def get_active_tracks(request):
+    """Tracks ``request.user`` is entitled to, resolved at most once per request."""
+    cached = getattr(request, "_active_tracks", None)
+    if cached is not None:
+        return cached
+
+    user = request.user
+    if not user.is_authenticated:
+        tracks = frozenset()
+    else:
+        cache = _cache()
+        tracks = cache.get(_key(user.pk))
+        if tracks is None:
+            tracks, expires_in = resolve_tracks(user)
+            timeout = getattr(settings, "ENTITLEMENT_CACHE_TTL", 60)
+            if expires_in is not None:
+                timeout = max(1, min(timeout, int(expires_in)))
+            cache.set(_key(user.pk), tracks, timeout)
+    request._active_tracks = tracks
+    return tracks
+
+
+def has_track(request, track):
+    return track in get_active_tracks(request)
+
+
+def invalidate_users(user_ids):
+    _cache().delete_many([_key(user_id) for user_id in user_ids if user_id is not None])
+
+
+def invalidate_subscription(subscription):
+    """Drop cached entitlements of everyone a subscription applies to."""
+    user_ids = []
+    if subscription.user_id:
+        user_ids.append(subscription.user_id)
+    if subscription.organization_id:
+        user_ids += OrganizationMember.objects.filter(
+            organization_id=subscription.organization_id
+        ).values_list("user_id", flat=True)
+    invalidate_users(user_ids)
+
+
+def _affected_users(rows):
+    """User ids whose entitlements depend on ``(user_id, organization_id)`` subscription rows."""
+    user_ids = {user_id for user_id, _ in rows if user_id}
+    org_ids = {org_id for _, org_id in rows if org_id}
+    if org_ids:
+        user_ids.update(
+            OrganizationMember.objects.filter(organization_id__in=org_ids).values_list(
+                "user_id", flat=True
+            )
+        )
+    return user_ids
+
+
+def expire_subscriptions(batch_size=1000, now=None, dry_run=False):
+    """
+    Move ACTIVE subscriptions whose ``end_date`` has passed to EXPIRED, one
+    batch per transaction, and drop the affected users' cached entitlements.
+    Each batch is an index range scan on (status, end_date) followed by an
+    UPDATE by primary key, so the cost follows the number of expiring rows
+    rather than the size of the table. Returns ``(expired, users invalidated)``.
+    """
+    now = now or timezone.now()
+    due = Subscription.objects.filter(status="ACTIVE", end_date__lte=now)
+    if dry_run:
+        return due.count(), 0
+
+    expired = invalidated = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                due.order_by("end_date").values_list("id", "user_id", "organization_id")[:batch_size]
+            )
+            if not rows:
+                break
+            # .update() sends no signals, so invalidation is done here
+            expired += Subscription.objects.filter(
+                id__in=[row[0] for row in rows], status="ACTIVE"
+            ).update(status="EXPIRED")
+            user_ids = _affected_users([row[1:] for row in rows])
+        invalidate_users(user_ids)
+        invalidated += len(user_ids)
+    if expired:
+        invalidate_completion_rates()
+    return expired, invalidated
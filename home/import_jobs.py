@@ -0,0 +1,230 @@
+# Background bulk employee imports
+#
+# upload_employee_bulk stores the CSV and queues an ImportJob row; the
+# database is the queue. A worker claims a job with a conditional UPDATE
+# (QUEUED -> RUNNING, or a RUNNING job whose heartbeat went stale because its
+# worker died). It then runs the importer, saving progress in the transaction
+# that commits each batch, so a reclaimed job resumes after the last
+# committed line.
+#
+# Workers are either a daemon thread started in the web process once the job
+# is committed (EMPLOYEE_IMPORT_WORKER = "thread") or `manage.py
+# run_import_jobs` (EMPLOYEE_IMPORT_WORKER = "command"). Either way the
+# password hashing, which is where the time goes, runs on a process pool
+# across EMPLOYEE_IMPORT_HASH_WORKERS cores, and the heartbeat is refreshed
+# while a batch is being hashed, not only when it commits.
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .employee_import import ImportResult, import_employees, read_rows
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 30  # a running job's heartbeat_at is refreshed at least this often
+
+
+# === Password hashing pool ===
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hash_workers():
+    workers = getattr(settings, "EMPLOYEE_IMPORT_HASH_WORKERS", None)
+    return (os.cpu_count() or 1) if workers is None else workers
+
+
+def _hash_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a web process copies its threads' locks and
+                # open database connections into the workers
+                _pool = ProcessPoolExecutor(
+                    max_workers=_hash_workers(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=django.setup,
+                )
+    return _pool
+
+
+def hash_passwords(passwords, heartbeat=None):
+    """
+    make_password for every password, in parallel on the process pool.
+    ``heartbeat()``, if given, is called every HEARTBEAT_SECONDS while hashing.
+    """
+    workers = _hash_workers()
+    if workers <= 1 or len(passwords) < 2:
+        hashes = map(make_password, passwords)
+    else:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        hashes = _hash_pool().map(make_password, passwords, chunksize=chunksize)
+    if heartbeat is None:
+        return list(hashes)
+
+    result, last_beat = [], time.monotonic()
+    for password_hash in hashes:
+        result.append(password_hash)
+        if time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+            heartbeat()
+            last_beat = time.monotonic()
+    return result
+
+
+def _discard_pool_after_fork():
+    global _pool
+    _pool = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_discard_pool_after_fork)
+
+
+# === Queue ===
+def enqueue_import(organization, user, uploaded_file):
+    """Store the upload and queue its import; starts a worker thread if configured."""
+    job = ImportJob.objects.create(organization=organization, created_by=user, file=uploaded_file)
+    if getattr(settings, "EMPLOYEE_IMPORT_WORKER", "thread") == "thread":
+        transaction.on_commit(start_worker_thread)
+    return job
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, "EMPLOYEE_IMPORT_STALE_AFTER", 300))
+
+
+def claim_next_job():
+    """Take the oldest queued (or abandoned) job for this worker; None if there is none."""
+    claimable = Q(status="QUEUED") | Q(status="RUNNING", heartbeat_at__lt=_stale_before())
+    for job_id in ImportJob.objects.filter(claimable).order_by("created_at").values_list("id", flat=True)[:5]:
+        now = timezone.now()
+        # Only one worker's UPDATE can match while the job is still claimable
+        claimed = ImportJob.objects.filter(claimable, id=job_id).update(
+            status="RUNNING", heartbeat_at=now
+        )
+        if claimed:
+            job = ImportJob.objects.select_related("organization").get(id=job_id)
+            if not job.started_at:
+                job.started_at = now
+                job.save(update_fields=["started_at"])
+            return job
+    return None
+
+
+def _count_rows(job):
+    with job.file.open("rb") as f:
+        return sum(1 for _ in read_rows(f))
+
+
+def run_job(job):
+    """Import a claimed job's file from where it left off and mark it DONE or FAILED."""
+    try:
+        if job.total_rows is None:
+            job.total_rows = _count_rows(job)
+            job.save(update_fields=["total_rows"])
+
+        def save_progress(result, last_line):
+            ImportJob.objects.filter(id=job.id).update(
+                processed_rows=last_line,
+                added_count=result.added,
+                errors=result.errors,
+                heartbeat_at=timezone.now(),
+            )
+
+        def heartbeat():
+            ImportJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now())
+
+        resumed_from = job.processed_rows
+        result = ImportResult(job.added_count, job.errors)
+        with job.file.open("rb") as f:
+            rows = ((line, row) for line, row in read_rows(f) if line > resumed_from)
+            import_employees(
+                job.organization, rows,
+                hash_passwords=lambda passwords: hash_passwords(passwords, heartbeat),
+                result=result, on_batch=save_progress,
+            )
+        job.refresh_from_db()
+        job.status = "DONE"
+        job.message = ""
+    except Exception as e:
+        logger.exception("Import job %s failed", job.pk)
+        job.refresh_from_db()
+        job.status = "FAILED"
+        job.message = f"Error processing file: {e}"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "message", "finished_at"])
+    # The upload holds plain-text default passwords
+    if job.file:
+        job.file.delete(save=True)
+    return job
+
+
+def is_waiting(job):
+    """Whether ``job`` still needs a worker (queued, or its worker died)."""
+    return job.status == "QUEUED" or (
+        job.status == "RUNNING" and job.heartbeat_at is not None and job.heartbeat_at < _stale_before()
+    )
+
+
+def run_pending_jobs():
+    """Run jobs until the queue is empty; returns how many were run."""
+    count = 0
+    while (job := claim_next_job()) is not None:
+        run_job(job)
+        count += 1
+    return count
+
+
+_thread = None
+_thread_wanted = False
+_thread_lock = threading.Lock()
+
+
+def _worker_loop():
+    global _thread, _thread_wanted
+    try:
+        while True:
+            with _thread_lock:
+                _thread_wanted = False
+            run_pending_jobs()
+            # A job queued while the last one ran asks for another pass
+            with _thread_lock:
+                if not _thread_wanted:
+                    _thread = None
+                    return
+    except Exception:
+        logger.exception("Import worker stopped")
+        with _thread_lock:
+            _thread = None
+    finally:
+        close_old_connections()
+
+
+def ensure_worker(job):
+    """In thread mode, (re)start the worker for a job left waiting, e.g. by a restarted web process."""
+    if getattr(settings, "EMPLOYEE_IMPORT_WORKER", "thread") == "thread" and is_waiting(job):
+        start_worker_thread()
+
+
+def start_worker_thread():
+    """Drain the queue on a daemon thread, or wake the one already doing it in this process."""
+    global _thread, _thread_wanted
+    with _thread_lock:
+        _thread_wanted = True
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_worker_loop, name="employee-import", daemon=True)
+        _thread.start()
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import time
+
+import joblib
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from home.chatbot_encoders import ONNX_DIR, build_encoder
+from home.chatbot_logic import BASE_DIR, MODEL_NAME
+
+BACKENDS = {
+    "torch": {"backend": "torch"},
+    "onnx": {"backend": "onnx"},
+    "onnx-int8": {"backend": "onnx", "quantized": True},
+}
+
+
+def _rss_mb():
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_backend(name, options, questions, repeats, result_queue):
+    # Runs in a fresh process so RSS reflects only this backend
+    try:
+        baseline = _rss_mb()
+        start = time.perf_counter()
+        encoder = build_encoder(options.pop("model_name"), **options)
+        load_s = time.perf_counter() - start
+        encoder.encode(questions[:8], normalize_embeddings=True)  # warm up
+
+        latencies = []
+        for _ in range(repeats):
+            for question in questions:
+                start = time.perf_counter()
+                encoder.encode(question, normalize_embeddings=True)
+                latencies.append(time.perf_counter() - start)
+        result_queue.put({
+            "name": name,
+            "load_s": load_s,
+            "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+            "rss_mb": _rss_mb() - baseline,
+        })
+    except Exception as exc:
+        result_queue.put({"name": name, "error": str(exc)})
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks single-sentence encode latency (p50/p99) and resident memory "
+        "of the torch and ONNX Runtime chatbot encoders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+        parser.add_argument("--onnx-dir", default=ONNX_DIR)
+        parser.add_argument("--questions", type=int, default=200)
+        parser.add_argument("--repeats", type=int, default=1)
+        parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads")
+
+    def handle(self, *args, **options):
+        questions = joblib.load(os.path.join(BASE_DIR, "semantic_data.pkl"))["questions"]
+        questions = questions[: options["questions"]]
+        context = multiprocessing.get_context("spawn")
+
+        self.stdout.write(f"{len(questions)} questions x {options['repeats']}, batch size 1")
+        self.stdout.write(f"{'backend':<12}{'load s':>8}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}")
+        for name in [b.strip() for b in options["backends"].split(",") if b.strip()]:
+            backend_options = dict(BACKENDS[name], model_name=MODEL_NAME)
+            if backend_options["backend"] == "onnx":
+                backend_options["onnx_dir"] = options["onnx_dir"]
+                backend_options["intra_op_threads"] = options["threads"]
+
+            result_queue = context.Queue()
+            process = context.Process(
+                target=_run_backend,
+                args=(name, backend_options, questions, options["repeats"], result_queue),
+            )
+            process.start()
+            result = result_queue.get()
+            process.join()
+
+            if "error" in result:
+                self.stdout.write(f"{name:<12}skipped ({result['error']})")
+                continue
+            self.stdout.write(
+                f"{name:<12}{result['load_s']:>8.2f}{result['p50_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['rss_mb']:>9.0f}"
+            )
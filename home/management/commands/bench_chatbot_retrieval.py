@@ -0,0 +1,123 @@
+import re
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from home.chatbot_lexical import LexicalIndex
+from home.chatbot_logic import ChatbotEngine
+
+
+def _percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000 if samples else 0.0
+
+
+def _queries(questions, keywords):
+    """
+    ``(variant, text, question index)`` triples derived from the FAQ: each
+    question verbatim, lowercased without punctuation, its keywords only, and
+    with its first two words dropped.
+    """
+    for i, question in enumerate(questions):
+        yield "verbatim", question, i
+        yield "lowercase", re.sub(r"[^\w\s]", "", question.lower()), i
+        if keywords and keywords[i]:
+            yield "keywords", " ".join(keywords[i]), i
+        words = question.split()
+        if len(words) > 4:
+            yield "truncated", " ".join(words[2:]), i
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares top-1 accuracy and latency of pure semantic retrieval against "
+        "the hybrid BM25 + semantic retriever on queries derived from the FAQ."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fusions", default="linear,rrf", help="Fusion methods to run in hybrid mode"
+        )
+        parser.add_argument("--alpha", type=float, default=0.7)
+        parser.add_argument("--min-margin", type=float, default=0.25)
+        parser.add_argument("--limit", type=int, default=0, help="Only use the first N questions")
+
+    def handle(self, *args, **options):
+        reference = ChatbotEngine()
+        questions, answers, _, keywords, _ = reference._load_faq()
+        questions, answers = list(questions), list(answers)
+        position = {q: i for i, q in reversed(list(enumerate(questions)))}
+        queries = list(_queries(questions[: options["limit"] or None], keywords))
+        self.stdout.write(f"faq={len(answers)} queries={len(queries)}")
+
+        # A retrieved row counts as correct if it carries the expected answer
+        # (the FAQ has a few near-duplicate questions with the same answer).
+        def correct(found, expected):
+            return found is not None and answers[found] == answers[expected]
+
+        self.stdout.write(
+            f"{'retriever':<18}{'top-1':>8}{'answered':>10}{'encoder %':>11}"
+            f"{'p50 ms':>9}{'p95 ms':>9}"
+        )
+
+        # Lexical stage on its own: how often it answers, and how accurately
+        lexical = LexicalIndex.from_faq(
+            questions, keywords, **getattr(settings, "CHATBOT_LEXICAL_PARAMS", {})
+        )
+        hits, answered, latencies = 0, 0, []
+        for _, text, expected in queries:
+            start = time.perf_counter()
+            best = lexical.best_match(text, min_margin=options["min_margin"])
+            latencies.append(time.perf_counter() - start)
+            if best is not None:
+                answered += 1
+                hits += correct(best, expected)
+        self._row("lexical only", hits / max(answered, 1), answered / len(queries), 0.0, latencies)
+
+        modes = [("semantic", {"CHATBOT_RETRIEVER": "semantic"})]
+        for fusion in [f.strip() for f in options["fusions"].split(",") if f.strip()]:
+            params = dict(
+                getattr(settings, "CHATBOT_HYBRID_PARAMS", {}),
+                fusion=fusion,
+                alpha=options["alpha"],
+                min_margin=options["min_margin"],
+            )
+            modes.append(
+                (f"hybrid ({fusion})", {"CHATBOT_RETRIEVER": "hybrid", "CHATBOT_HYBRID_PARAMS": params})
+            )
+
+        for name, overrides in modes:
+            # No query caches, so every query pays its real cost
+            with override_settings(
+                CHATBOT_QUERY_CACHE_BACKEND="locmem",
+                CHATBOT_EMBEDDING_CACHE_SIZE=0,
+                CHATBOT_ANSWER_CACHE_SIZE=0,
+                CHATBOT_BATCH_ENABLED=False,
+                **overrides,
+            ):
+                engine = ChatbotEngine()
+                try:
+                    engine.load()
+                except ImportError as exc:
+                    self.stdout.write(f"{name:<18}skipped ({exc})")
+                    continue
+                engine.encode(queries[0][1])  # warm up the encoder
+
+                hits, latencies = 0, []
+                for _, text, expected in queries:
+                    start = time.perf_counter()
+                    suggestions, _ = engine.get_question_suggestions(text, top_n=3)
+                    latencies.append(time.perf_counter() - start)
+                    found = position[suggestions[0][0]] if suggestions else None
+                    hits += correct(found, expected)
+                counts = engine.retrieval_counts
+                encoded = counts["rerank"] + counts["semantic"]
+                self._row(name, hits / len(queries), 1.0, encoded / len(queries), latencies)
+
+    def _row(self, name, accuracy, answered, encoded, latencies):
+        self.stdout.write(
+            f"{name:<18}{accuracy:>8.3f}{answered:>10.1%}{encoded:>11.1%}"
+            f"{_percentile_ms(latencies, 50):>9.3f}{_percentile_ms(latencies, 95):>9.3f}"
+        )
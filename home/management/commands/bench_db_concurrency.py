@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from OHS.db_profiles import PROFILES
+from home.models import DailyActivity, User
+from home.progress import activity_matrix, last_7_days
+from home.watch_time import record_direct
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency benchmark for the SQLite profiles (OHS/db_profiles.py): writer "
+        "threads send unbuffered watch-time heartbeats while reader threads run "
+        "dashboard queries. Each profile runs in its own process on a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", default=",".join(PROFILES))
+        parser.add_argument("--writers", type=int, default=16)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            self.stdout.write(json.dumps(self._run(options)))
+            return
+
+        self.stdout.write(
+            f"writers={options['writers']} readers={options['readers']} "
+            f"seconds={options['seconds']} users={options['users']}"
+        )
+        self.stdout.write(
+            f"{'profile':<13}{'writes/s':>10}{'reads/s':>10}{'locked':>8}"
+            f"{'write avg ms':>14}{'write p95 ms':>14}{'write max ms':>14}"
+        )
+        for profile in options["profiles"].split(","):
+            if profile not in PROFILES:
+                raise CommandError(f"Unknown profile {profile!r}")
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(
+                    os.environ,
+                    DJANGO_DB_PROFILE=profile,
+                    DJANGO_DB_PATH=os.path.join(tmp, "bench.sqlite3"),
+                )
+                command = [
+                    sys.executable, "manage.py", "bench_db_concurrency", "--worker",
+                    "--writers", str(options["writers"]), "--readers", str(options["readers"]),
+                    "--seconds", str(options["seconds"]), "--users", str(options["users"]),
+                ]
+                out = subprocess.run(
+                    command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True
+                )
+                if out.returncode:
+                    raise CommandError(f"{profile} run failed:\n{out.stderr}")
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+            self.stdout.write(
+                f"{profile:<13}{r['writes_per_s']:>10.0f}{r['reads_per_s']:>10.1f}{r['locked']:>8}"
+                f"{r['write_avg_ms']:>14.1f}{r['write_p95_ms']:>14.1f}{r['write_max_ms']:>14.1f}"
+            )
+
+    def _run(self, options):
+        """Worker: seed the scratch database, then run the threads for --seconds."""
+        if not os.environ.get("DJANGO_DB_PATH"):
+            raise CommandError("--worker needs DJANGO_DB_PATH (a scratch database)")
+        call_command("migrate", verbosity=0)
+        users = User.objects.bulk_create(
+            [User(username=f"bench-db-{i}") for i in range(options["users"])], batch_size=500
+        )
+        user_ids = [u.pk for u in users]
+        days = last_7_days()
+        DailyActivity.objects.bulk_create(
+            [DailyActivity(user_id=uid, date=day, minutes_watched=5) for uid in user_ids for day in days[:-1]],
+            batch_size=500,
+        )
+        connection.close()
+
+        lock = threading.Lock()
+        stats = {"writes": 0, "reads": 0, "locked": 0, "latencies": []}
+        deadline = time.monotonic() + options["seconds"]
+        today = timezone.localdate()
+
+        def writer(n):
+            latencies, writes, locked = [], 0, 0
+            i = n
+            while time.monotonic() < deadline:
+                uid = user_ids[i % len(user_ids)]
+                i += options["writers"]
+                start = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        record_direct(uid, today)
+                    writes += 1
+                except OperationalError as e:
+                    if "locked" not in str(e):
+                        raise
+                    locked += 1
+                latencies.append(time.perf_counter() - start)
+            connection.close()
+            with lock:
+                stats["writes"] += writes
+                stats["locked"] += locked
+                stats["latencies"] += latencies
+
+        def reader(n):
+            reads, page = 0, 50
+            i = n * page
+            while time.monotonic() < deadline:
+                # A company dashboard: a page of members' week of activity, plus totals
+                members = user_ids[i % len(user_ids):][:page]
+                i += page
+                try:
+                    activity_matrix(members, days)
+                    DailyActivity.objects.filter(date__gte=today - timedelta(days=6)).count()
+                    reads += 1
+                except OperationalError as e:
+                    if "locked" not in str(e):
+                        raise
+                    with lock:
+                        stats["locked"] += 1
+            connection.close()
+            with lock:
+                stats["reads"] += reads
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(options["writers"])]
+        threads += [threading.Thread(target=reader, args=(n,)) for n in range(options["readers"])]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+
+        latencies = stats["latencies"]
+        return {
+            "writes_per_s": stats["writes"] / elapsed,
+            "reads_per_s": stats["reads"] / elapsed,
+            "locked": stats["locked"],
+            "write_avg_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "write_p95_ms": 1000 * _percentile(latencies, 0.95),
+            "write_max_ms": 1000 * max(latencies, default=0.0),
+        }
@@ -0,0 +1,116 @@
+import os
+import time
+
+import joblib
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from home.chatbot_index import BASE_DIR, ExactIndex, build_index, normalize
+
+
+def _percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares recall@k and per-query latency of the chatbot vector indexes "
+        "against exact search (and the torch cos_sim/topk path if torch is installed)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source", default=os.path.join(BASE_DIR, "semantic_data.pkl")
+        )
+        parser.add_argument("--k", type=int, default=3)
+        parser.add_argument("--queries", type=int, default=500)
+        parser.add_argument(
+            "--noise", type=float, default=0.05,
+            help="Std-dev of the noise added to corpus vectors to make queries",
+        )
+        parser.add_argument(
+            "--corpus-size", type=int, default=0,
+            help="Grow the corpus to this many rows with perturbed copies (0 = as is)",
+        )
+        parser.add_argument("--backends", default="ivf,hnsw")
+        parser.add_argument("--nprobe", type=int, default=8)
+        parser.add_argument("--ef-search", type=int, default=64)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        k = options["k"]
+
+        corpus = normalize(joblib.load(options["source"])["embeddings"])
+        if options["corpus_size"] > len(corpus):
+            extra = options["corpus_size"] - len(corpus)
+            base = corpus[rng.integers(0, len(corpus), extra)]
+            corpus = np.vstack([corpus, normalize(base + rng.normal(0, 0.1, base.shape))])
+        queries = corpus[rng.integers(0, len(corpus), options["queries"])]
+        queries = normalize(queries + rng.normal(0, options["noise"], queries.shape))
+
+        self.stdout.write(
+            f"corpus={corpus.shape[0]}x{corpus.shape[1]} queries={len(queries)} k={k}"
+        )
+        exact = ExactIndex(corpus)
+        _, truth = exact.search(queries, k)
+
+        candidates = [("exact", lambda: exact)]
+        try:
+            import torch  # noqa: F401
+            import sentence_transformers  # noqa: F401
+
+            candidates.insert(0, ("torch (current)", None))
+        except ImportError:
+            pass
+        for backend in [b.strip() for b in options["backends"].split(",") if b.strip()]:
+            if backend == "ivf":
+                params = {"nprobe": options["nprobe"]}
+            elif backend == "hnsw":
+                params = {"ef_search": options["ef_search"]}
+            else:
+                params = {}
+            candidates.append((backend, lambda b=backend, p=params: build_index(corpus, b, **p)))
+
+        self.stdout.write(
+            f"{'backend':<16}{'build s':>9}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}"
+        )
+        for name, factory in candidates:
+            if factory is None:
+                build_s, search = 0.0, self._torch_search(corpus)
+            else:
+                try:
+                    start = time.perf_counter()
+                    index = factory()
+                    build_s = time.perf_counter() - start
+                except ImportError as exc:
+                    self.stdout.write(f"{name:<16}skipped ({exc})")
+                    continue
+                search = index.search
+
+            found, latencies = [], []
+            for q in queries:
+                start = time.perf_counter()
+                _, ids = search(q, k)
+                latencies.append(time.perf_counter() - start)
+                found.append(np.asarray(ids)[0])
+            hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+            recall = hits / float(truth.size)
+            self.stdout.write(
+                f"{name:<16}{build_s:>9.3f}{recall:>10.3f}"
+                f"{_percentile_ms(latencies, 50):>9.3f}{_percentile_ms(latencies, 99):>9.3f}"
+            )
+
+    @staticmethod
+    def _torch_search(corpus):
+        import torch
+        from sentence_transformers import util
+
+        embeddings = torch.tensor(corpus)
+
+        def search(query, k):
+            cosine_scores = util.pytorch_cos_sim(torch.tensor(query), embeddings)[0]
+            top = torch.topk(cosine_scores, k=k)
+            return top.values[None, :].numpy(), top.indices[None, :].numpy()
+
+        return search
@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from home.models import DailyActivity, User
+from home.watch_time import WatchTimeBuffer, record_direct
+
+
+class _WriteCounter:
+    """connection.execute_wrapper that counts INSERT/UPDATE statements."""
+
+    def __init__(self):
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(("INSERT", "UPDATE")):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test for update_watch_time: N simultaneous watchers each send one "
+        "heartbeat per minute. Compares DB write statements of direct writes "
+        "against the coalescing buffer. Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watchers", type=int, default=5000)
+        parser.add_argument("--minutes", type=int, default=5, help="Heartbeats per watcher")
+        parser.add_argument(
+            "--flush-every", type=int, default=1,
+            help="Buffered mode: flush after this many simulated minutes",
+        )
+        parser.add_argument("--threads", type=int, default=32)
+
+    def handle(self, *args, **options):
+        watchers, minutes = options["watchers"], options["minutes"]
+        today = timezone.now().date()
+        self.stdout.write(f"watchers={watchers} heartbeats/watcher={minutes}")
+        self.stdout.write(f"{'mode':<10}{'writes':>10}{'seconds':>10}{'minutes ok':>12}")
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [User(username=f"bench-watch-{i}") for i in range(watchers)], batch_size=1000
+            )
+            user_ids = [u.pk for u in users]
+            if None in user_ids:
+                user_ids = list(
+                    User.objects.filter(username__startswith="bench-watch-").values_list("pk", flat=True)
+                )
+
+            for mode in ("direct", "buffered"):
+                DailyActivity.objects.filter(user_id__in=user_ids).delete()
+                counter = _WriteCounter()
+                start = time.perf_counter()
+                with connection.execute_wrapper(counter):
+                    if mode == "direct":
+                        for _ in range(minutes):
+                            for user_id in user_ids:
+                                record_direct(user_id, today)
+                    else:
+                        buffer = WatchTimeBuffer(flush_interval=None, max_pending=10 ** 9)
+                        with ThreadPoolExecutor(options["threads"]) as pool:
+                            for minute in range(1, minutes + 1):
+                                list(pool.map(lambda uid: buffer.record(uid, today), user_ids))
+                                if minute % options["flush_every"] == 0:
+                                    buffer.flush()
+                        buffer.flush()
+                elapsed = time.perf_counter() - start
+
+                total = DailyActivity.objects.filter(user_id__in=user_ids).aggregate(
+                    total=Sum("minutes_watched")
+                )["total"]
+                ok = total == watchers * minutes
+                self.stdout.write(f"{mode:<10}{counter.writes:>10}{elapsed:>10.2f}{str(ok):>12}")
+
+            transaction.set_rollback(True)
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from home.chatbot_artifacts import ARTIFACT_DIR, ArtifactError, read_source, write_artifacts
+from home.chatbot_logic import MODEL_NAME
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the memory-mapped chatbot FAQ artifacts (embeddings.npy, string "
+        "table and manifest) from a CSV, JSON or semantic_data.pkl source."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="FAQ source: .csv, .json or semantic_data.pkl")
+        parser.add_argument("--output-dir", default=ARTIFACT_DIR)
+        parser.add_argument("--model", default=MODEL_NAME, help="sentence-transformers model name")
+        parser.add_argument(
+            "--reencode",
+            action="store_true",
+            help="Re-encode the questions even if the source already has embeddings",
+        )
+        parser.add_argument(
+            "--ann",
+            choices=["ivf", "hnsw"],
+            help="Also build an approximate nearest-neighbour index next to the artifacts",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            records, embeddings = read_source(options["source"])
+        except (ArtifactError, OSError, KeyError, ValueError) as exc:
+            raise CommandError(str(exc))
+        if not records:
+            raise CommandError(f"No FAQ rows found in {options['source']}")
+
+        if embeddings is None or options["reencode"]:
+            from home.chatbot_encoders import build_encoder
+
+            self.stdout.write(f"Encoding {len(records)} questions with {options['model']}...")
+            encoder = build_encoder(options["model"])
+            embeddings = encoder.encode(
+                [r["question"] for r in records],
+                batch_size=64,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+
+        try:
+            manifest = write_artifacts(records, embeddings, options["output_dir"], options["model"])
+        except ArtifactError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {manifest['count']} rows ({manifest['dimension']}-d) to {options['output_dir']}"
+            )
+        )
+
+        if options["ann"]:
+            from home.chatbot_artifacts import load_artifacts
+            from home.chatbot_index import build_index, index_path
+
+            artifacts = load_artifacts(options["output_dir"])
+            index = build_index(artifacts.embeddings, backend=options["ann"])
+            path = index_path(options["ann"], options["output_dir"])
+            index.save(path)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['ann']} index to {path}"))
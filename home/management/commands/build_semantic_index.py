@@ -0,0 +1,43 @@
+import os
+
+import joblib
+from django.core.management.base import BaseCommand
+
+from home.chatbot_index import build_index, index_path, BASE_DIR
+
+
+class Command(BaseCommand):
+    help = "Builds the approximate nearest-neighbour index for the chatbot FAQ embeddings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=["hnsw", "ivf"], default="ivf")
+        parser.add_argument(
+            "--source",
+            default=os.path.join(BASE_DIR, "semantic_data.pkl"),
+            help="semantic_data.pkl with an 'embeddings' matrix",
+        )
+        parser.add_argument("--nlist", type=int, help="IVF: number of clusters (default sqrt(N))")
+        parser.add_argument("--nprobe", type=int, default=8, help="IVF: clusters scanned per query")
+        parser.add_argument("--m", type=int, default=32, help="HNSW: links per node")
+        parser.add_argument("--ef-construction", type=int, default=200)
+        parser.add_argument("--ef-search", type=int, default=64)
+
+    def handle(self, *args, **options):
+        backend = options["backend"]
+        embeddings = joblib.load(options["source"])["embeddings"]
+
+        if backend == "ivf":
+            params = {"nlist": options["nlist"], "nprobe": options["nprobe"]}
+        else:
+            params = {
+                "m": options["m"],
+                "ef_construction": options["ef_construction"],
+                "ef_search": options["ef_search"],
+            }
+        index = build_index(embeddings, backend=backend, **params)
+
+        path = index_path(backend, os.path.dirname(os.path.abspath(options["source"])))
+        index.save(path)
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {backend} index of {len(index)} vectors to {path}")
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from home.entitlements import expire_subscriptions
+
+
+class Command(BaseCommand):
+    help = (
+        "Marks ACTIVE subscriptions past their end_date as EXPIRED in batches and "
+        "invalidates the affected users' cached entitlements. Run it from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only count the subscriptions that are due"
+        )
+
+    def handle(self, *args, **options):
+        expired, invalidated = expire_subscriptions(
+            batch_size=options["batch_size"], dry_run=options["dry_run"]
+        )
+        if options["dry_run"]:
+            self.stdout.write(f"{expired} subscriptions are due to expire")
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Expired {expired} subscriptions; invalidated entitlements of {invalidated} users"
+            )
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from home.chatbot_encoders import ONNX_DIR, export_onnx
+from home.chatbot_logic import MODEL_NAME
+
+
+class Command(BaseCommand):
+    help = "Exports the chatbot sentence encoder to ONNX, optionally with an int8 quantised copy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default=MODEL_NAME)
+        parser.add_argument("--output-dir", default=ONNX_DIR)
+        parser.add_argument(
+            "--quantize", action="store_true",
+            help="Also write an int8 dynamic-quantised model (needs the onnx package)",
+        )
+        parser.add_argument("--opset", type=int, default=17)
+
+    def handle(self, *args, **options):
+        try:
+            paths = export_onnx(
+                options["model"],
+                output_dir=options["output_dir"],
+                quantize=options["quantize"],
+                opset=options["opset"],
+            )
+        except ImportError as exc:
+            raise CommandError(f"Export needs torch, sentence-transformers and onnx: {exc}")
+        for path in paths:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from home.progress import TRACKS, rebuild_progress_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized per-user training progress summary from ModuleProgress."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--track", choices=TRACKS, help="Only rebuild this module type")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rebuild_progress_summaries(options["track"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} progress summary rows"))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.import_jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued bulk employee imports, and resumes ones whose worker died. "
+        "Use with EMPLOYEE_IMPORT_WORKER = \"command\"."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll", type=float, default=0,
+            help="Keep polling for new jobs every POLL seconds instead of exiting when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            ran = run_pending_jobs()
+            if ran:
+                self.stdout.write(f"Ran {ran} import jobs")
+            if not options["poll"]:
+                break
+            time.sleep(options["poll"])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from home.rollups import rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds rows created since the last run to the superuser dashboard rollups and "
+        "snapshots today's active subscriptions. Run it from cron (e.g. every 5 minutes)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild", action="store_true", help="Drop the rollups and recount everything"
+        )
+
+    def handle(self, *args, **options):
+        groups = rebuild_rollups() if options["rebuild"] else update_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {groups} new (metric, day, dimension) groups"))
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # The checked-in db.sqlite3 got these tables from migrations that were never
+    # committed; it records them under these names
+    replaces = [
+        ('home', '0006_dailywatchtime_videoprogress'),
+        ('home', '0007_dailyactivity_moduleprogress_trainingmodule_and_more'),
+        ('home', '0008_organization_organization_type'),
+    ]
+
+    dependencies = [
+        ('home', '0005_remove_subscription_check_end_date_after_start_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingModule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('video_file', models.FileField(upload_to='training_videos/')),
+                ('thumbnail', models.ImageField(blank=True, null=True, upload_to='training_thumbnails/')),
+                ('module_type', models.CharField(choices=[('POSH', 'POSH Act'), ('POCSO', 'POCSO Act')], default='POSH', max_length=10)),
+                ('order', models.IntegerField(default=1)),
+                ('duration_seconds', models.IntegerField(default=0, help_text='Duration in seconds')),
+            ],
+            options={
+                'ordering': ['order'],
+            },
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='organization_type',
+            field=models.CharField(choices=[('CORPORATE', 'Corporate'), ('SCHOOL', 'School')], default='CORPORATE', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=django.utils.timezone.now)),
+                ('minutes_watched', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ModuleProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_completed', models.BooleanField(default=False)),
+                ('timestamp', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='module_progress', to=settings.AUTH_USER_MODEL)),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.trainingmodule')),
+            ],
+            options={
+                'unique_together': {('user', 'module')},
+            },
+        ),
+    ]
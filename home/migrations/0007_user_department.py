@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0006_trainingmodule_organization_organization_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='department',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
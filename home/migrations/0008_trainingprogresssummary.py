@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0007_user_department'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingProgressSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('module_type', models.CharField(choices=[('POSH', 'POSH Act'), ('POCSO', 'POCSO Act')], max_length=10)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('total_modules', models.IntegerField(default=0)),
+                ('percent', models.IntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['module_type', 'percent'], name='home_traini_module__972daa_idx')],
+                'unique_together': {('user', 'module_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_trainingprogresssummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='last_position',
+            field=models.IntegerField(default=0, help_text='Resume position in seconds'),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='watched_bitmap',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='watched_seconds',
+            field=models.IntegerField(default=0),
+        ),
+    ]
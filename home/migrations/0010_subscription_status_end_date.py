@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0009_moduleprogress_playback'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['status', 'end_date'], name='home_subscr_status_af2752_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0012_metric_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyactivity',
+            index=models.Index(condition=models.Q(('minutes_watched__gt', 0)), fields=['user', 'date'], name='home_activity_watched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moduleprogress',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['user', 'module'], name='home_progress_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organization',
+            index=models.Index(fields=['created_at'], name='home_organi_created_7faec7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationmember',
+            index=models.Index(fields=['organization', 'role'], name='home_organi_organiz_4e800e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['user', 'end_date'], name='home_sub_active_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['organization', 'end_date'], name='home_sub_active_org_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import Count, Max, Q
+
+
+def backfill_progress_summaries(apps, schema_editor):
+    # Summaries were only written on mod_complete after 0008, so progress made
+    # before that showed as 0% until `manage.py rebuild_progress_summary` ran.
+    # Creates the missing rows; existing ones are left as they are.
+    ModuleProgress = apps.get_model('home', 'ModuleProgress')
+    TrainingModule = apps.get_model('home', 'TrainingModule')
+    TrainingProgressSummary = apps.get_model('home', 'TrainingProgressSummary')
+
+    for track in ('POSH', 'POCSO'):
+        total = TrainingModule.objects.filter(module_type=track).count()
+        existing = set(
+            TrainingProgressSummary.objects.filter(module_type=track).values_list('user_id', flat=True)
+        )
+        rows = (
+            ModuleProgress.objects.filter(module__module_type=track)
+            .values('user_id')
+            .annotate(
+                completed=Count('id', filter=Q(is_completed=True)),
+                last_completed=Max('timestamp', filter=Q(is_completed=True)),
+                last_activity=Max('timestamp'),
+            )
+            .order_by()
+        )
+        summaries = []
+        for row in rows:
+            if row['user_id'] in existing:
+                continue
+            complete = total > 0 and row['completed'] >= total
+            summaries.append(TrainingProgressSummary(
+                user_id=row['user_id'],
+                module_type=track,
+                completed_count=row['completed'],
+                total_modules=total,
+                percent=int(row['completed'] * 100 / total) if total > 0 else 0,
+                completed_at=row['last_completed'] if complete else None,
+                last_activity=row['last_activity'],
+            ))
+        TrainingProgressSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0014_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_progress_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_existing_completions(apps, schema_editor):
+    # Recorded at their completed_at: the rollups counted completions by that
+    # field until now, so the ones before the watermark are not counted again.
+    TrackCompletion = apps.get_model('home', 'TrackCompletion')
+    TrainingProgressSummary = apps.get_model('home', 'TrainingProgressSummary')
+    TrackCompletion.objects.bulk_create(
+        (
+            TrackCompletion(
+                user_id=user_id, module_type=module_type, completed_at=completed_at, recorded_at=completed_at
+            )
+            for user_id, module_type, completed_at in TrainingProgressSummary.objects.filter(
+                completed_at__isnull=False
+            ).values_list('user_id', 'module_type', 'completed_at')
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0015_backfill_progress_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('module_type', models.CharField(choices=[('POSH', 'POSH Act'), ('POCSO', 'POCSO Act')], max_length=10)),
+                ('completed_at', models.DateTimeField()),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_completions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recorded_at'], name='home_trackc_recorde_74cec4_idx')],
+                'unique_together': {('user', 'module_type')},
+            },
+        ),
+        migrations.RunPython(record_existing_completions, migrations.RunPython.noop),
+    ]
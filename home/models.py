@@ -1,5 +1,8 @@
+import os
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.files.storage import FileSystemStorage
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Q
@@ -9,6 +12,7 @@ from django.db.models import Q
 class User(AbstractUser):
     # AbstractUser has username, email, password, first_name, date_joined
     phone = models.CharField(max_length=15, blank=True, null=True)
+    department = models.CharField(max_length=100, blank=True, default="")
 
     # NEW: Distinct types for data separation
     USER_TYPES = (
@@ -58,6 +62,9 @@ class Organization(models.Model):
     max_users = models.IntegerField(default=10)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["created_at"])]  # "newest organisations" lists
+
     def __str__(self):
         return self.name
 
@@ -100,6 +107,16 @@ class Subscription(models.Model):
                 name="subscription_owner_constraint",
             )
         ]
+        indexes = [
+            # The expiry sweep and platform-wide counts are range scans on this
+            models.Index(fields=["status", "end_date"]),
+            # Entitlement lookups for one user or one organisation (partial: only
+            # ACTIVE rows are ever looked up this way)
+            models.Index(fields=["user", "end_date"], condition=Q(status="ACTIVE"), name="home_sub_active_user_idx"),
+            models.Index(
+                fields=["organization", "end_date"], condition=Q(status="ACTIVE"), name="home_sub_active_org_idx"
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.end_date:
@@ -124,6 +141,7 @@ class OrganizationMember(models.Model):
 
     class Meta:
         unique_together = ("organization", "user")  # User can't be in same org twice
+        indexes = [models.Index(fields=["organization", "role"])]
 
 
 # 6. Invitations
@@ -171,9 +189,17 @@ class ModuleProgress(models.Model):
     module = models.ForeignKey(TrainingModule, on_delete=models.CASCADE)
     is_completed = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now=True)  # Last watched
+    # Second-granularity playback, merged from client beacons (see home/playback.py)
+    watched_seconds = models.IntegerField(default=0)
+    last_position = models.IntegerField(default=0, help_text="Resume position in seconds")
+    watched_bitmap = models.BinaryField(default=b"", blank=True)  # bit i set = second i watched
 
     class Meta:
         unique_together = ("user", "module")
+        indexes = [
+            # Completed modules per user (progress summaries, completion sets)
+            models.Index(fields=["user", "module"], condition=Q(is_completed=True), name="home_progress_completed_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.module.title} ({'Done' if self.is_completed else 'In Progress'})"
@@ -187,6 +213,147 @@ class DailyActivity(models.Model):
 
     class Meta:
         unique_together = ("user", "date")
+        indexes = [
+            # "Last day watched" lookups skip the zero-minute rows
+            models.Index(fields=["user", "date"], condition=Q(minutes_watched__gt=0), name="home_activity_watched_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.date} - {self.minutes_watched} min"
+
+
+# 11. Training Progress Summary (materialized per user and track)
+class TrainingProgressSummary(models.Model):
+    """
+    Denormalized completion of one module track for one user, so dashboards
+    read a single row instead of aggregating ModuleProgress. Maintained by
+    home.progress (refresh on mod_complete, rebuild when modules change or via
+    `manage.py rebuild_progress_summary`).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="progress_summaries")
+    module_type = models.CharField(max_length=10, choices=TrainingModule.MODULE_TYPES)
+    completed_count = models.IntegerField(default=0)
+    total_modules = models.IntegerField(default=0)
+    percent = models.IntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)  # when every module was first done
+    last_activity = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("user", "module_type")
+        indexes = [models.Index(fields=["module_type", "percent"])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.module_type} {self.percent}%"
+
+
+class TrackCompletion(models.Model):
+    """
+    The first time a user finished every module of a track, written once and
+    never changed (TrainingProgressSummary rows are rebuilt), so the dashboard
+    rollups count each completion exactly once, by ``recorded_at``.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="track_completions")
+    module_type = models.CharField(max_length=10, choices=TrainingModule.MODULE_TYPES)
+    completed_at = models.DateTimeField()  # as on the summary
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("user", "module_type")
+        indexes = [models.Index(fields=["recorded_at"])]
+
+    def __str__(self):
+        return f"{self.user.username} completed {self.module_type}"
+
+
+# 12. Bulk Employee Import Jobs
+class EmployeeImportStorage(FileSystemStorage):
+    """
+    Uploads hold default passwords: keep them out of MEDIA_ROOT (publicly
+    served), in EMPLOYEE_IMPORT_DIR. The setting is read on every access, not
+    when the field is created, so overriding it (e.g. in tests) takes effect.
+    """
+
+    @property
+    def base_location(self):
+        from django.conf import settings
+
+        return self._value_or_setting(
+            self._location,
+            getattr(settings, "EMPLOYEE_IMPORT_DIR", settings.BASE_DIR / "private" / "employee_imports"),
+        )
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def employee_import_storage():
+    return EmployeeImportStorage()
+
+
+class ImportJob(models.Model):
+    """
+    A bulk employee upload processed in the background (see home/import_jobs.py).
+    ``processed_rows`` is the last CSV line committed, so a job picked up again
+    after a worker crash continues from there. The file is deleted once the job ends.
+    """
+    STATUS_CHOICES = (
+        ("QUEUED", "Queued"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    )
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name="import_jobs")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    file = models.FileField(upload_to="%Y/%m/", storage=employee_import_storage, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="QUEUED")
+    total_rows = models.IntegerField(null=True, blank=True)
+    processed_rows = models.IntegerField(default=0)  # last CSV line number committed
+    added_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # [[line, email, reason], ...]
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # a stale RUNNING job is reclaimed
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Import #{self.pk} for {self.organization} ({self.status})"
+
+
+# 13. Dashboard Rollups
+class MetricRollup(models.Model):
+    """
+    Pre-aggregated platform metrics for the superuser dashboard, one row per
+    (metric, period, period start, dimension). Event metrics (registrations,
+    new subscriptions, completions) are added to incrementally by
+    home.rollups; ``active_subscriptions`` is a daily snapshot.
+    """
+    PERIOD_CHOICES = (
+        ("D", "Day"),
+        ("M", "Month"),
+    )
+    metric = models.CharField(max_length=40)
+    period = models.CharField(max_length=1, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    dimension = models.CharField(max_length=40, blank=True, default="")
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("metric", "period", "period_start", "dimension")
+
+    def __str__(self):
+        return f"{self.metric}[{self.dimension}] {self.period} {self.period_start}: {self.value}"
+
+
+class RollupWatermark(models.Model):
+    """Rows timestamped up to ``processed_until`` are already counted in the rollups."""
+    name = models.CharField(max_length=40, unique=True)
+    processed_until = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.processed_until}"
@@ -0,0 +1,124 @@
+# Second-granularity playback progress
+#
+# The training pages send batched beacons ({"updates": [{"module": id,
+# "position": seconds, "intervals": [[start, end], ...]}, ...]}) every few
+# seconds and on pause/unload. Each module's watched seconds are kept as a
+# bitmap (bit i = second i was watched), so merging is a bitwise OR: replaying
+# or overlapping beacons never double-counts, and watched_seconds is just the
+# number of set bits.
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ModuleProgress, TrainingModule
+
+MAX_TRACKED_SECONDS = 6 * 60 * 60  # caps the bitmap at 2.7 kB per module
+MAX_UPDATES = 50
+MAX_INTERVALS = 500
+
+
+def _as_int(bitmap):
+    return int.from_bytes(bytes(bitmap or b""), "little")
+
+
+def _as_bytes(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def merge_intervals(bitmap, intervals, limit=MAX_TRACKED_SECONDS):
+    """
+    OR the ``[start, end)`` second ranges into ``bitmap``; returns
+    ``(new bitmap bytes, watched seconds)``. Ranges are clipped to ``limit``.
+    """
+    bits = _as_int(bitmap)
+    for start, end in intervals:
+        start, end = max(0, int(start)), min(int(end), limit)
+        if end > start:
+            bits |= ((1 << (end - start)) - 1) << start
+    return _as_bytes(bits), bits.bit_count()
+
+
+def parse_progress_beacon(body):
+    """
+    Validate a beacon body into ``{module_id: (position, intervals)}``.
+    Later updates for the same module win. Raises ValueError if malformed.
+    """
+    try:
+        payload = json.loads(body or b"{}")
+        updates = payload["updates"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Expected a JSON object with an 'updates' list.")
+    if not isinstance(updates, list) or len(updates) > MAX_UPDATES:
+        raise ValueError(f"'updates' must be a list of at most {MAX_UPDATES} items.")
+
+    parsed = {}
+    for update in updates:
+        try:
+            module_id = int(update["module"])
+            position = max(0, int(float(update.get("position", 0))))
+            intervals = [
+                (int(float(start)), int(float(end)))
+                for start, end in update.get("intervals", [])[:MAX_INTERVALS]
+            ]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Each update needs a module id, a position and [start, end] intervals.")
+        parsed[module_id] = (position, intervals)
+    return parsed
+
+
+def apply_progress_updates(user, updates):
+    """
+    Merge parsed beacon ``updates`` into ``user``'s ModuleProgress rows with a
+    fixed number of queries: read the modules, insert the missing rows, read
+    and lock the rows, then one upsert for all of them. Returns the ids of the
+    modules updated.
+
+    The read-merge-write is serialized per user: the insert takes SQLite's
+    write lock (and select_for_update the row locks elsewhere) before the
+    bitmaps are read, so a concurrent beacon for the same module waits instead
+    of overwriting the seconds this one adds.
+    """
+    if not updates:
+        return []
+    now = timezone.now()
+    durations = dict(
+        TrainingModule.objects.filter(id__in=updates).values_list("id", "duration_seconds")
+    )
+    with transaction.atomic():
+        ModuleProgress.objects.bulk_create(
+            [ModuleProgress(user=user, module_id=module_id) for module_id in durations],
+            ignore_conflicts=True,
+        )
+        existing = {
+            row.module_id: row
+            for row in ModuleProgress.objects.select_for_update().filter(
+                user=user, module_id__in=durations
+            )
+        }
+        rows = []
+        for module_id, duration in durations.items():
+            position, intervals = updates[module_id]
+            limit = min(duration + 1, MAX_TRACKED_SECONDS) if duration else MAX_TRACKED_SECONDS
+            current = existing.get(module_id)
+            bitmap, watched = merge_intervals(
+                current.watched_bitmap if current else b"", intervals, limit
+            )
+            rows.append(
+                ModuleProgress(
+                    user=user,
+                    module_id=module_id,
+                    is_completed=current.is_completed if current else False,
+                    watched_seconds=watched,
+                    last_position=min(position, limit),
+                    watched_bitmap=bitmap,
+                    timestamp=now,
+                )
+            )
+        ModuleProgress.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["user", "module"],
+            update_fields=["watched_seconds", "last_position", "watched_bitmap", "timestamp"],
+        )
+    return sorted(durations)
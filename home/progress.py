@@ -0,0 +1,264 @@
+# Set-based training progress queries
+#
+# Dashboards need the same few facts for many users at once: which modules each
+# user has completed and how many minutes they watched on each of the last
+# seven days. Each helper answers that for a whole group of users in a single
+# query and pivots the rows in memory, so the query count of a page does not
+# grow with the number of users on it.
+#
+# Per-track completion is also materialized in TrainingProgressSummary: one
+# row per (user, module type), refreshed when a module is completed and
+# rebuilt for a whole track when its modules change. The first time a track
+# is finished is also recorded as a TrackCompletion, which is never changed.
+import json
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    FilteredRelation,
+    IntegerField,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .analytics import invalidate_completion_rates
+from .models import (
+    DailyActivity,
+    ModuleProgress,
+    TrackCompletion,
+    TrainingModule,
+    TrainingProgressSummary,
+)
+
+TRACKS = [code for code, _ in TrainingModule.MODULE_TYPES]
+
+
+def last_7_days(today=None):
+    """The last seven dates, oldest first, ending with ``today``."""
+    today = today or timezone.now().date()
+    return [today - timedelta(days=i) for i in range(6, -1, -1)]
+
+
+def subscription_track(subscription):
+    """Module type an organisation's dashboard tracks: POCSO only for POCSO-only plans."""
+    if subscription and subscription.plan.type == "POCSO":
+        return "POCSO"
+    return "POSH"
+
+
+def annotate_member_progress(members, module_type):
+    """
+    Annotate an ``OrganizationMember`` queryset with ``completed_modules`` (int,
+    from the progress summary) and ``last_activity`` (last day watched, or
+    None) as correlated subqueries, so the result can be filtered, ordered and
+    paginated in SQL.
+    """
+    completed = TrainingProgressSummary.objects.filter(
+        user=OuterRef("user_id"), module_type=module_type
+    ).values("completed_count")[:1]
+    last_activity = (
+        DailyActivity.objects.filter(user=OuterRef("user_id"), minutes_watched__gt=0)
+        .order_by("-date")
+        .values("date")[:1]
+    )
+    return members.annotate(
+        completed_modules=Coalesce(Subquery(completed, output_field=IntegerField()), 0),
+        last_activity=Subquery(last_activity),
+    )
+
+
+def track_page_context(user, module_type, today=None):
+    """
+    Template context for a training track page, in two queries and without
+    writing anything: the track's modules LEFT JOINed to ``user``'s progress
+    (no progress row just means not started), and one ranged query for the
+    7-day watch chart. Modules unlock one by one, in order.
+    """
+    modules = (
+        TrainingModule.objects.filter(module_type=module_type)
+        .annotate(progress=FilteredRelation("moduleprogress", condition=Q(moduleprogress__user=user)))
+        .annotate(
+            done=Coalesce("progress__is_completed", Value(False), output_field=BooleanField()),
+            resume_at=Coalesce("progress__last_position", Value(0)),
+        )
+        .order_by("order")
+    )
+
+    module_list = []
+    previous_completed = True  # First one is always allowed
+    for mod in modules:
+        module_list.append({
+            "obj": mod,
+            "is_completed": mod.done,
+            "is_locked": not previous_completed,
+            "last_position": mod.resume_at,
+        })
+        previous_completed = mod.done
+
+    total_modules = len(module_list)
+    completed_count = sum(1 for item in module_list if item["is_completed"])
+    percent_complete = int((completed_count / total_modules) * 100) if total_modules > 0 else 0
+
+    days = last_7_days(today)
+    chart_data = activity_matrix([user.pk], days).get(user.pk, [0] * len(days))
+
+    return {
+        "module_type": module_type,
+        "modules": module_list,
+        "percent_complete": percent_complete,
+        "completed_count": completed_count,
+        "total_modules": total_modules,
+        "chart_labels": json.dumps([d.strftime("%a") for d in days]),
+        "chart_data": json.dumps(chart_data),
+        "is_assessment_unlocked": percent_complete == 100,
+    }
+
+
+def completed_module_sets(users, module_type):
+    """``{user_id: {module_id, ...}}`` of completed ``module_type`` modules (one query)."""
+    completed = defaultdict(set)
+    rows = ModuleProgress.objects.filter(
+        user__in=users, module__module_type=module_type, is_completed=True
+    ).values_list("user_id", "module_id")
+    for user_id, module_id in rows:
+        completed[user_id].add(module_id)
+    return completed
+
+
+def activity_matrix(users, days):
+    """
+    ``{user_id: [minutes for each of days]}`` from one ``date__range`` query;
+    users without activity are missing (use ``.get(uid, [0] * len(days))``).
+    """
+    position = {d: i for i, d in enumerate(days)}
+    matrix = {}
+    rows = DailyActivity.objects.filter(
+        user__in=users, date__range=(days[0], days[-1])
+    ).values_list("user_id", "date", "minutes_watched")
+    for user_id, date, minutes in rows:
+        if user_id not in matrix:
+            matrix[user_id] = [0] * len(days)
+        matrix[user_id][position[date]] = minutes
+    return matrix
+
+
+# === Materialized progress summary ===
+def _summary_values(completed_count, total, last_completed, last_activity, completed_at=None):
+    """
+    ``completed_at`` is when the track was first finished: an existing value
+    is kept (ModuleProgress.timestamp moves on every re-completion, and a
+    module added later does not undo the completion); otherwise it is the last
+    module completion, once every module is done.
+    """
+    complete = total > 0 and completed_count >= total
+    return {
+        "completed_count": completed_count,
+        "total_modules": total,
+        "percent": int((completed_count / total) * 100) if total > 0 else 0,
+        "completed_at": completed_at or (last_completed if complete else None),
+        "last_activity": last_activity,
+    }
+
+
+def _progress_aggregates():
+    return {
+        "completed": Count("id", filter=Q(is_completed=True)),
+        "last_completed": Max("timestamp", filter=Q(is_completed=True)),
+        "last_activity": Max("timestamp"),
+    }
+
+
+def _record_completions(summaries):
+    # One row per (user, track) ever: a completion already recorded is kept
+    TrackCompletion.objects.bulk_create(
+        [
+            TrackCompletion(user_id=s.user_id, module_type=s.module_type, completed_at=s.completed_at)
+            for s in summaries
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def refresh_progress_summary(user, module_type):
+    """
+    Recompute ``user``'s summary row for ``module_type`` from ModuleProgress.
+    Call it inside the transaction that changed the progress.
+    """
+    row = ModuleProgress.objects.filter(
+        user=user, module__module_type=module_type
+    ).aggregate(**_progress_aggregates())
+    total = TrainingModule.objects.filter(module_type=module_type).count()
+    values = _summary_values(row["completed"], total, row["last_completed"], row["last_activity"])
+    completed_at = values.pop("completed_at")
+    summary, created = TrainingProgressSummary.objects.update_or_create(
+        user=user,
+        module_type=module_type,
+        defaults=values,
+        create_defaults={**values, "completed_at": completed_at},
+    )
+    if completed_at is not None and (created or summary.completed_at is None):
+        # First time the track is finished (an existing completed_at is kept)
+        if not created:
+            summary.completed_at = completed_at
+            summary.save(update_fields=["completed_at"])
+        _record_completions([summary])
+    return summary
+
+
+def rebuild_progress_summaries(module_type=None, batch_size=1000):
+    """
+    Rebuild the summary rows of one track (or every track) from scratch with a
+    grouped query per track. Returns the number of rows written.
+    """
+    written = 0
+    for track in [module_type] if module_type else TRACKS:
+        total = TrainingModule.objects.filter(module_type=track).count()
+        rows = (
+            ModuleProgress.objects.filter(module__module_type=track)
+            .values("user_id")
+            .annotate(**_progress_aggregates())
+            .order_by()
+        )
+        with transaction.atomic():
+            completed_at = dict(
+                TrainingProgressSummary.objects.filter(
+                    module_type=track, completed_at__isnull=False
+                ).values_list("user_id", "completed_at")
+            )
+            summaries = [
+                TrainingProgressSummary(
+                    user_id=row["user_id"],
+                    module_type=track,
+                    **_summary_values(
+                        row["completed"], total, row["last_completed"], row["last_activity"],
+                        completed_at.get(row["user_id"]),
+                    ),
+                )
+                for row in rows
+            ]
+            TrainingProgressSummary.objects.filter(module_type=track).delete()
+            TrainingProgressSummary.objects.bulk_create(summaries, batch_size=batch_size)
+            _record_completions(
+                [s for s in summaries if s.completed_at and s.user_id not in completed_at]
+            )
+        written += len(summaries)
+    invalidate_completion_rates()  # bulk_create sends no post_save
+    return written
+
+
+def invalidate_progress_summaries(tracks):
+    """
+    Modules of ``tracks`` were added, removed or re-typed, so their stored
+    totals and percentages are stale: rebuild those tracks once the current
+    transaction commits.
+    """
+    for track in set(tracks):
+        transaction.on_commit(lambda track=track: rebuild_progress_summaries(track))
@@ -0,0 +1,258 @@
+# Pre-aggregated metrics for the superuser dashboard
+#
+# update_rollups() counts the rows created since the last run, as found by the
+# RollupWatermark timestamp, grouped by day and dimension. It adds the counts
+# to the day and month rows of MetricRollup and moves the watermark forward,
+# all in one transaction, so each row is counted exactly once however often
+# the job runs. Rows are only counted once they are ROLLUP_LAG_SECONDS old,
+# which leaves time for transactions that started earlier to commit. Every
+# counted timestamp is set once when its row is written: completions come from
+# TrackCompletion, not from the rebuildable progress summaries.
+#
+# Runs are serialized: each one writes the watermark row before reading it,
+# which takes SQLite's write lock (the row lock elsewhere), so a second run
+# waits for the first to commit and then sees its watermark. It runs from
+# cron (`manage.py update_rollups`), never from a request.
+#
+# Active subscriptions are a state rather than an event, so they are stored as
+# a snapshot for the current day (one grouped query over the (status,
+# end_date) index).
+#
+# dashboard_metrics() reads only MetricRollup, with a fixed number of queries
+# however much data the platform has.
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, Concat, TruncDate
+from django.utils import timezone
+
+from .models import (
+    MetricRollup,
+    Organization,
+    RollupWatermark,
+    Subscription,
+    TrackCompletion,
+    User,
+)
+
+WATERMARK = "dashboard"
+NOTHING_COUNTED = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)  # a new watermark
+EVENT_METRICS = ["users", "organizations", "subscriptions", "completions"]
+SNAPSHOT_METRIC = "active_subscriptions"
+
+
+def _subscription_dimension():
+    # "<plan type>:<CORPORATE|SCHOOL|INDIVIDUAL>"
+    return Concat(
+        F("plan__type"),
+        Value(":"),
+        Coalesce(F("organization__organization_type"), Value("INDIVIDUAL")),
+    )
+
+
+# metric -> (queryset, timestamp field, dimension expression)
+def _event_sources():
+    return {
+        "users": (User.objects.all(), "date_joined", F("account_type")),
+        "organizations": (Organization.objects.all(), "created_at", F("organization_type")),
+        "subscriptions": (
+            Subscription.objects.exclude(status="PENDING"), "start_date", _subscription_dimension()
+        ),
+        "completions": (TrackCompletion.objects.all(), "recorded_at", F("module_type")),
+    }
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _count_events(since, until):
+    """``{(metric, day, dimension): count}`` for rows timestamped in ``(since, until]``."""
+    counts = {}
+    for metric, (queryset, field, dimension) in _event_sources().items():
+        rows = (
+            queryset.filter(**{f"{field}__gt": since, f"{field}__lte": until})
+            .annotate(day=TruncDate(field), dim=dimension)
+            .values("day", "dim")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        for row in rows:
+            counts[(metric, row["day"], row["dim"] or "")] = row["n"]
+    return counts
+
+
+def _add_to_rollups(counts):
+    increments = defaultdict(int)
+    for (metric, day, dimension), n in counts.items():
+        increments[(metric, "D", day, dimension)] += n
+        increments[(metric, "M", _month(day), dimension)] += n
+    if not increments:
+        return
+    existing = {
+        (r.metric, r.period, r.period_start, r.dimension): r.value
+        for r in MetricRollup.objects.filter(
+            metric__in={key[0] for key in increments},
+            period_start__gte=min(key[2] for key in increments),
+        )
+    }
+    MetricRollup.objects.bulk_create(
+        [
+            MetricRollup(
+                metric=metric, period=period, period_start=start, dimension=dimension,
+                value=existing.get((metric, period, start, dimension), 0) + n,
+            )
+            for (metric, period, start, dimension), n in increments.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["metric", "period", "period_start", "dimension"],
+        update_fields=["value"],
+        batch_size=500,
+    )
+
+
+def _snapshot_active_subscriptions(now):
+    today = timezone.localdate(now)
+    rows = (
+        Subscription.objects.filter(status="ACTIVE", end_date__gt=now)
+        .annotate(dim=_subscription_dimension())
+        .values("dim")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    MetricRollup.objects.filter(metric=SNAPSHOT_METRIC, period="D", period_start=today).delete()
+    MetricRollup.objects.bulk_create(
+        MetricRollup(metric=SNAPSHOT_METRIC, period="D", period_start=today, dimension=row["dim"], value=row["n"])
+        for row in rows
+    )
+
+
+def rollups_exist():
+    return RollupWatermark.objects.filter(name=WATERMARK).exists()
+
+
+def update_rollups(now=None):
+    """
+    Count everything created since the last run into the rollups and refresh
+    today's active-subscription snapshot. Returns the number of (metric, day,
+    dimension) groups added.
+    """
+    now = now or timezone.now()
+    until = now - timedelta(seconds=getattr(settings, "ROLLUP_LAG_SECONDS", 60))
+    with transaction.atomic():
+        # Write before reading (see the top of this module)
+        RollupWatermark.objects.bulk_create(
+            [RollupWatermark(name=WATERMARK, processed_until=NOTHING_COUNTED)], ignore_conflicts=True
+        )
+        watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK)
+        counts = {}
+        if until > watermark.processed_until:
+            counts = _count_events(watermark.processed_until, until)
+            _add_to_rollups(counts)
+            watermark.processed_until = until
+            watermark.save(update_fields=["processed_until", "updated_at"])
+        _snapshot_active_subscriptions(now)
+    return len(counts)
+
+
+def rebuild_rollups(now=None):
+    """Drop every rollup and recount from scratch."""
+    with transaction.atomic():
+        MetricRollup.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK).delete()
+        return update_rollups(now)
+
+
+# === Reading ===
+def last_months(count, today=None):
+    """First days of the last ``count`` months, oldest first, ending with this month."""
+    month = _month(today or timezone.localdate())
+    months = [month]
+    for _ in range(count - 1):
+        month = _month(month - timedelta(days=1))
+        months.append(month)
+    return months[::-1]
+
+
+def growth_percent(current, previous):
+    if previous:
+        return round((current - previous) * 100 / previous)
+    return 100 if current else 0
+
+
+def _sum(values, metric, dimensions):
+    return sum(values.get((metric, dimension), 0) for dimension in dimensions)
+
+
+def dashboard_metrics(today=None):
+    """
+    Everything superuser_dashboard shows about the platform, from the rollups
+    in four queries: all-time totals, the monthly series, the last two weeks
+    of days and the latest snapshot.
+    """
+    today = today or timezone.localdate()
+    months = last_months(6, today)
+    rollups = MetricRollup.objects.filter(metric__in=EVENT_METRICS)  # an index prefix, unlike exclude()
+
+    totals = {
+        (row["metric"], row["dimension"]): row["total"]
+        for row in rollups.filter(period="M").values("metric", "dimension").annotate(total=Sum("value"))
+    }
+    monthly = defaultdict(int)
+    for row in rollups.filter(period="M", period_start__gte=months[0]).values(
+        "metric", "dimension", "period_start", "value"
+    ):
+        monthly[(row["metric"], row["dimension"], row["period_start"])] = row["value"]
+    week_start = today - timedelta(days=6)
+    weekly = defaultdict(int)
+    for row in rollups.filter(
+        metric="completions", period="D", period_start__gte=week_start - timedelta(days=7)
+    ).values("period_start", "value"):
+        weekly["current" if row["period_start"] >= week_start else "previous"] += row["value"]
+    latest = MetricRollup.objects.filter(metric=SNAPSHOT_METRIC, period="D").order_by("-period_start")
+    snapshot = {
+        (SNAPSHOT_METRIC, row["dimension"]): row["value"]
+        for row in MetricRollup.objects.filter(
+            metric=SNAPSHOT_METRIC, period="D", period_start=latest.values("period_start")[:1]
+        ).values("dimension", "value")
+    }
+
+    def month_series(dimensions):
+        return [sum(monthly[("subscriptions", d, m)] for d in dimensions) for m in months]
+
+    metrics = {
+        "total_users": sum(v for (metric, _), v in totals.items() if metric == "users"),
+        "total_companies": totals.get(("organizations", "CORPORATE"), 0),
+        "total_schools": totals.get(("organizations", "SCHOOL"), 0),
+        "completions": sum(v for (metric, _), v in totals.items() if metric == "completions"),
+        "completions_growth": growth_percent(weekly["current"], weekly["previous"]),
+        "month_labels": [m.strftime("%b") for m in months],
+        "tracks": {},
+    }
+    for track in ("POSH", "POCSO"):
+        plans = [track, "BOTH"]
+
+        def active(owner):
+            return _sum(snapshot, SNAPSHOT_METRIC, [f"{plan}:{owner}" for plan in plans])
+
+        new_subs = [f"{plan}:{owner}" for plan in plans for owner in ("INDIVIDUAL", "CORPORATE", "SCHOOL")]
+        counts = {
+            "individuals": active("INDIVIDUAL"),
+            "companies": active("CORPORATE"),
+            "schools": active("SCHOOL"),
+            "completions": totals.get(("completions", track), 0),
+            "growth": growth_percent(
+                sum(monthly[("subscriptions", d, months[-1])] for d in new_subs),
+                sum(monthly[("subscriptions", d, months[-2])] for d in new_subs),
+            ),
+            # New organisation subscriptions per month: companies for POSH, schools for POCSO
+            "monthly": month_series(
+                [f"{plan}:{'CORPORATE' if track == 'POSH' else 'SCHOOL'}" for plan in plans]
+            ),
+        }
+        counts["total"] = counts["individuals"] + counts["companies"] + counts["schools"]
+        metrics["tracks"][track] = counts
+    return metrics
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .analytics import invalidate_completion_rates
+from .entitlements import invalidate_subscription, invalidate_users
+from .models import OrganizationMember, Subscription, TrainingModule, TrainingProgressSummary
+from .progress import invalidate_progress_summaries
+
+
+# Adding, removing or re-typing a module changes every user's total and
+# percentage for that track; other edits (title, video, order) change nothing
+@receiver(pre_save, sender=TrainingModule)
+def training_module_saving(sender, instance, raw=False, **kwargs):
+    instance._stored_module_type = None
+    if instance.pk and not raw:
+        instance._stored_module_type = (
+            sender.objects.filter(pk=instance.pk).values_list("module_type", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=TrainingModule)
+def training_module_saved(sender, instance, created, raw=False, **kwargs):
+    stored = getattr(instance, "_stored_module_type", None)
+    if created or raw:
+        invalidate_progress_summaries([instance.module_type])
+    elif stored != instance.module_type:
+        invalidate_progress_summaries([t for t in (stored, instance.module_type) if t])
+
+
+@receiver(post_delete, sender=TrainingModule)
+def training_module_deleted(sender, instance, **kwargs):
+    invalidate_progress_summaries([instance.module_type])
+
+
+# Cached entitlements must not outlive a change to what grants them
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    invalidate_subscription(instance)
+    invalidate_completion_rates()
+
+
+@receiver(post_save, sender=OrganizationMember)
+@receiver(post_delete, sender=OrganizationMember)
+def membership_changed(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
+    invalidate_completion_rates()
+
+
+# A user's summary row changes whenever they complete a module. No post_delete
+# receiver: it would stop rebuild_progress_summaries deleting a track's rows in
+# one query (Django loads and signals each row), and the rebuild invalidates once.
+@receiver(post_save, sender=TrainingProgressSummary)
+def progress_summary_changed(sender, **kwargs):
+    invalidate_completion_rates()
@@ -1,3 +1,1732 @@
-from django.test import TestCase
+import importlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    DailyActivity,
+    ImportJob,
+    ModuleProgress,
+    Organization,
+    OrganizationMember,
+    Subscription,
+    SubscriptionPlan,
+    TrackCompletion,
+    TrainingModule,
+    TrainingProgressSummary,
+    User,
+)
+from .progress import rebuild_progress_summaries, refresh_progress_summary
 
 # Create your tests here.
+
+# For tests that count SQL queries: a shared cache that, like Redis, is not in
+# the database (the default "shared" alias is a database table)
+IN_MEMORY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "shared"},
+}
+
+
+def _installed(*modules):
+    return all(importlib.util.find_spec(m) is not None for m in modules)
+
+
+@unittest.skipUnless(
+    _installed("joblib", "torch", "sentence_transformers", "onnxruntime", "transformers"),
+    "encoder parity needs torch, sentence-transformers and onnxruntime",
+)
+class EncoderParityTests(SimpleTestCase):
+    """
+    The ONNX encoders must rank the FAQ like the torch encoder does: cosine
+    scores of every question in semantic_data.pkl against the FAQ embeddings
+    stay within tolerance of the torch scores.
+    """
+
+    FP32_TOLERANCE = 1e-3
+    INT8_TOLERANCE = 0.05
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import joblib
+
+        from .chatbot_encoders import ONNX_DIR, ONNX_QUANTIZED_MODEL, build_encoder, export_onnx
+        from .chatbot_logic import BASE_DIR, MODEL_NAME
+
+        data = joblib.load(os.path.join(BASE_DIR, "semantic_data.pkl"))
+        cls.questions = data["questions"]
+        cls.embeddings = data["embeddings"]
+
+        cls.onnx_dir = ONNX_DIR
+        if not os.path.exists(os.path.join(ONNX_DIR, ONNX_QUANTIZED_MODEL)):
+            cls._tmp = tempfile.TemporaryDirectory()
+            cls.onnx_dir = cls._tmp.name
+            export_onnx(MODEL_NAME, cls.onnx_dir, quantize=True)
+
+        torch_encoder = build_encoder(MODEL_NAME, backend="torch")
+        cls.reference = cls._scores(torch_encoder)
+
+    @classmethod
+    def tearDownClass(cls):
+        if hasattr(cls, "_tmp"):
+            cls._tmp.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def _scores(cls, encoder):
+        queries = encoder.encode(cls.questions, normalize_embeddings=True)
+        return queries @ cls.embeddings.T
+
+    def _assert_parity(self, quantized, tolerance):
+        from .chatbot_encoders import build_encoder
+        from .chatbot_logic import MODEL_NAME
+
+        encoder = build_encoder(
+            MODEL_NAME, backend="onnx", onnx_dir=self.onnx_dir, quantized=quantized
+        )
+        scores = self._scores(encoder)
+        self.assertEqual(scores.shape, self.reference.shape)
+        self.assertLessEqual(float(abs(scores - self.reference).max()), tolerance)
+
+    def test_onnx_fp32_matches_torch(self):
+        self._assert_parity(quantized=False, tolerance=self.FP32_TOLERANCE)
+
+    def test_onnx_int8_matches_torch(self):
+        self._assert_parity(quantized=True, tolerance=self.INT8_TOLERANCE)
+
+
+FAQ = [
+    ("What is the POSH Act?", "The POSH Act protects women from sexual harassment at work.", ["posh"]),
+    ("Who can be a member of the Internal Committee?", "Senior women employees and an external member.", ["ic"]),
+    ("What does section 19 of the POCSO Act require?", "Anyone who knows of an offence must report it.", []),
+    ("How do I file a complaint?", "Write to the Internal Committee within three months.", []),
+]
+
+
+class StubEncoder:
+    """Bag-of-words hashing encoder: texts sharing words get similar vectors."""
+
+    dimension = 64
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        import numpy as np
+
+        from .chatbot_lexical import tokenize
+
+        sentences = [sentences] if isinstance(sentences, str) else list(sentences)
+        self.calls.append(sentences)
+        vectors = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for token in tokenize(sentence):
+                vectors[row, sum(map(ord, token)) % self.dimension] += 1
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors /= norms
+        return vectors
+
+
+@override_settings(
+    CHATBOT_INDEX_BACKEND="exact",
+    CHATBOT_RETRIEVER="semantic",
+    CHATBOT_QUERY_CACHE_BACKEND="locmem",
+    CHATBOT_BATCH_ENABLED=False,
+    CHATBOT_ENCODER_BACKEND="torch",
+)
+class ChatbotEngineTests(SimpleTestCase):
+    """ChatbotEngine over artifacts in a temporary directory, with StubEncoder."""
+
+    def setUp(self):
+        from .chatbot_artifacts import write_artifacts
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.encoder = StubEncoder()
+        records = [{"question": q, "answer": a, "keywords": k} for q, a, k in FAQ]
+        write_artifacts(records, self.encoder.encode([q for q, _, _ in FAQ]), tmp.name, "stub")
+        self.encoder.calls.clear()
+
+        settings_patch = override_settings(CHATBOT_ARTIFACT_DIR=tmp.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        encoder_patch = mock.patch("home.chatbot_encoders.build_encoder", return_value=self.encoder)
+        encoder_patch.start()
+        self.addCleanup(encoder_patch.stop)
+
+    def _engine(self):
+        from .chatbot_logic import ChatbotEngine
+
+        engine = ChatbotEngine(model_name="stub")
+        patch = mock.patch("home.chatbot_logic.engine", engine)
+        patch.start()
+        self.addCleanup(patch.stop)
+        return engine
+
+    def test_loads_lazily(self):
+        engine = self._engine()
+        self.assertFalse(engine.is_ready())
+        self.assertEqual(engine.questions[0], "What is the POSH Act?")
+        self.assertTrue(engine.is_ready())
+        self.assertIs(engine.load(), engine)
+
+    def test_answer_and_embedding_cache(self):
+        from .chatbot_logic import predict
+
+        self._engine()
+        self.assertEqual(predict("What is the POSH act")["answer"], FAQ[0][1])
+        self.assertEqual(predict("  what is the posh ACT? ")["answer"], FAQ[0][1])
+        self.assertEqual(len(self.encoder.calls), 1)
+
+    def test_followups_are_per_conversation(self):
+        from .chatbot_logic import predict
+        from .chatbot_state import LocMemConversationStore
+
+        self._engine()
+        store = LocMemConversationStore()
+        unclear = predict("zebra crossing", conversation_id="a", store=store)
+        self.assertIsNone(unclear["answer"])
+        self.assertEqual(len(unclear["suggestions"]), 3)
+
+        # Another visitor's "1" is not an answer to a's list...
+        self.assertIsNone(predict("1", conversation_id="b", store=store)["answer"])
+        # ...but a's is, once
+        first = FAQ[[q for q, _, _ in FAQ].index(unclear["suggestions"][0])][1]
+        self.assertEqual(predict("1", conversation_id="a", store=store)["answer"], first)
+        self.assertEqual(store.get("a"), [])
+
+    @override_settings(CHATBOT_RETRIEVER="hybrid")
+    def test_hybrid_answers_keyword_hits_without_the_encoder(self):
+        from .chatbot_logic import predict
+
+        engine = self._engine()
+        self.assertEqual(predict("pocso section 19")["answer"], FAQ[2][1])
+        self.assertEqual(self.encoder.calls, [])
+        self.assertEqual(engine.cache_stats()["retrieval"]["lexical"], 1)
+
+
+class ConversationStoreTests(SimpleTestCase):
+    def test_ttl(self):
+        from .chatbot_state import LocMemConversationStore
+
+        store = LocMemConversationStore(ttl=10)
+        with mock.patch("home.chatbot_state.time.monotonic", return_value=100.0):
+            store.set("a", [("q", "a")])
+        with mock.patch("home.chatbot_state.time.monotonic", return_value=109.0):
+            self.assertEqual(store.get("a"), [("q", "a")])
+        with mock.patch("home.chatbot_state.time.monotonic", return_value=110.0):
+            self.assertEqual(store.get("a"), [])
+            self.assertEqual(len(store), 0)
+
+    def test_lru_eviction(self):
+        from .chatbot_state import LocMemConversationStore
+
+        store = LocMemConversationStore(max_entries=2)
+        store.set("a", [("qa", "a")])
+        store.set("b", [("qb", "b")])
+        store.get("a")  # b is now least recently used
+        store.set("c", [("qc", "c")])
+        self.assertEqual(store.get("b"), [])
+        self.assertEqual(store.get("a"), [("qa", "a")])
+        self.assertEqual(len(store), 2)
+
+    def test_isolation_and_pop(self):
+        from .chatbot_state import LocMemConversationStore
+
+        store = LocMemConversationStore()
+        store.set("a", [("qa", "a")])
+        store.set("b", [("qb", "b")])
+        self.assertEqual(store.pop("a"), [("qa", "a")])
+        self.assertEqual(store.pop("a"), [])
+        self.assertEqual(store.get("b"), [("qb", "b")])
+        store.set("b", [])
+        self.assertEqual(store.get("b"), [])
+
+
+class QueryCacheTests(SimpleTestCase):
+    def test_normalize_query(self):
+        from .chatbot_cache import normalize_query
+
+        self.assertEqual(normalize_query("  What is   POSH?! "), "what is posh")
+        self.assertEqual(normalize_query("Who is\tIC member."), "who is ic member")
+        self.assertEqual(normalize_query(None), "")
+        self.assertEqual(normalize_query("?"), "")
+
+    def test_lru_cache(self):
+        from .chatbot_cache import LRUCache
+
+        lru = LRUCache(max_entries=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        self.assertEqual(lru.get("a"), 1)
+        lru.set("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.stats(), {"size": 2, "max_entries": 2, "hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    @override_settings(CACHES=IN_MEMORY_CACHES)
+    def test_shared_cache_is_seen_by_other_instances(self):
+        from .chatbot_cache import SharedCache
+
+        writer, reader = SharedCache("answer", alias="shared"), SharedCache("answer", alias="shared")
+        self.assertIsNone(reader.get(("what is posh", 3)))
+        writer.set(("what is posh", 3), "cached")
+        self.assertEqual(reader.get(("what is posh", 3)), "cached")
+        self.assertIsNone(SharedCache("embedding", alias="shared").get(("what is posh", 3)))
+        self.assertEqual((reader.hits, reader.misses), (1, 1))
+
+    @override_settings(CHATBOT_QUERY_CACHE_BACKEND="cache")
+    def test_build_query_cache(self):
+        from .chatbot_cache import SharedCache, build_query_cache
+
+        self.assertIsInstance(build_query_cache("answer", 10), SharedCache)
+
+
+class VectorIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 32))
+        cls.vectors = (centers[rng.integers(0, 20, 1000)] + 0.3 * rng.normal(size=(1000, 32))).astype(np.float32)
+        cls.queries = cls.vectors[:50] + 0.05 * rng.normal(size=(50, 32)).astype(np.float32)
+
+    def _recall(self, index, k=10):
+        from .chatbot_index import ExactIndex
+
+        _, truth = ExactIndex(self.vectors).search(self.queries, k)
+        _, found = index.search(self.queries, k)
+        return sum(len(set(t) & set(f)) for t, f in zip(truth, found)) / truth.size
+
+    def test_exact_search(self):
+        from .chatbot_index import ExactIndex
+
+        scores, ids = ExactIndex(self.vectors).search(self.vectors[7], 3)
+        self.assertEqual(ids.shape, (1, 3))
+        self.assertEqual(ids[0][0], 7)
+        self.assertAlmostEqual(float(scores[0][0]), 1.0, places=5)
+        self.assertTrue((scores[0][:-1] >= scores[0][1:]).all())
+
+    def test_ivf_recall(self):
+        from .chatbot_index import IVFIndex
+
+        index = IVFIndex.build(self.vectors, nprobe=8)
+        self.assertGreaterEqual(self._recall(index), 0.9)
+        # Probing every list is exact
+        index.nprobe = index.centroids.shape[0]
+        self.assertEqual(self._recall(index), 1.0)
+
+    def test_ivf_save_and_load(self):
+        from .chatbot_index import IVFIndex, load_index
+
+        index = IVFIndex.build(self.vectors, nprobe=4)
+        with tempfile.TemporaryDirectory() as tmp:
+            index.save(os.path.join(tmp, "semantic_index_ivf.npz"))
+            loaded = load_index(self.vectors, backend="ivf", base_dir=tmp)
+            self.assertIsInstance(loaded, IVFIndex)
+            self.assertEqual(loaded.nprobe, 4)
+            self.assertEqual(loaded.search(self.queries, 5)[1].tolist(), index.search(self.queries, 5)[1].tolist())
+            # A backend that was never built falls back to exact search
+            with self.assertLogs("home.chatbot_index", "WARNING"):
+                self.assertEqual(load_index(self.vectors, backend="hnsw", base_dir=tmp).backend, "exact")
+
+
+class EmbeddingBatcherTests(SimpleTestCase):
+    def _batcher(self, **options):
+        import numpy as np
+
+        from .chatbot_batching import EmbeddingBatcher
+
+        calls = []
+
+        def encode_batch(texts):
+            calls.append(list(texts))
+            return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+        return EmbeddingBatcher(encode_batch, **options), calls
+
+    def test_concurrent_requests_share_one_encode(self):
+        batcher, calls = self._batcher(max_batch_size=4, max_wait_ms=200)
+        texts = [f"q{'x' * i}" for i in range(8)]
+        futures = [batcher.submit(text) for text in texts]
+        rows = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual([int(row[0]) for row in rows], [len(text) for text in texts])
+        self.assertEqual(sorted(text for batch in calls for text in batch), sorted(texts))
+        self.assertTrue(all(len(batch) <= 4 for batch in calls))
+        self.assertLess(len(calls), len(texts))
+        self.assertEqual(batcher.stats()["batch_size"]["count"], len(calls))
+
+    def test_lone_request_is_flushed_after_max_wait(self):
+        batcher, calls = self._batcher(max_batch_size=32, max_wait_ms=5)
+        self.assertEqual(int(batcher.encode("abc", timeout=5)[0]), 3)
+        self.assertEqual(calls, [["abc"]])
+
+    def test_failure_reaches_every_caller(self):
+        from .chatbot_batching import EmbeddingBatcher
+
+        def fail(texts):
+            raise RuntimeError("encoder down")
+
+        batcher = EmbeddingBatcher(fail, max_wait_ms=50)
+        futures = [batcher.submit("a"), batcher.submit("b")]
+        for future in futures:
+            with self.assertRaisesMessage(RuntimeError, "encoder down"):
+                future.result(timeout=5)
+
+
+class InferenceExecutorTests(SimpleTestCase):
+    def test_rejects_work_beyond_max_pending(self):
+        import threading
+
+        from .chatbot_async import ExecutorBusy, InferenceExecutor
+
+        executor = InferenceExecutor(max_workers=1, max_pending=1)
+        release = threading.Event()
+        running = executor.submit(release.wait, 5)
+        with self.assertRaises(ExecutorBusy):
+            executor.submit(lambda: None)
+        release.set()
+        running.result(timeout=5)
+        self.assertEqual(executor.submit(lambda: 42).result(timeout=5), 42)
+
+    async def _post_chat(self):
+        return await self.async_client.post(
+            reverse("chatbot_response_async"),
+            {"message": "what is posh", "conversation_id": "t1"},
+            content_type="application/json",
+        )
+
+    async def test_async_view_answers_503_when_busy(self):
+        from .chatbot_async import ExecutorBusy, get_inference_executor
+
+        with mock.patch.object(get_inference_executor(), "submit", side_effect=ExecutorBusy):
+            response = await self._post_chat()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+    @override_settings(CHATBOT_REQUEST_TIMEOUT=0.05)
+    async def test_async_view_answers_504_on_timeout(self):
+        import time
+
+        def slow_reply(msg, conversation_id):
+            time.sleep(0.5)
+            return {"response": "late"}
+
+        with mock.patch("home.views._chat_reply", slow_reply):
+            response = await self._post_chat()
+        self.assertEqual(response.status_code, 504)
+
+    async def test_async_view_answers(self):
+        with mock.patch("home.views._chat_reply", return_value={"response": "An act."}):
+            response = await self._post_chat()
+        self.assertEqual(json.loads(response.content), {"response": "An act."})
+
+
+class ChatStreamTests(SimpleTestCase):
+    def _events(self, message, result=None):
+        with mock.patch("home.views.predict", return_value=result):
+            response = self.client.post(
+                reverse("chatbot_stream"), {"message": message, "conversation_id": "t1"},
+                content_type="application/json",
+            )
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            body = b"".join(response.streaming_content).decode()
+        events = []
+        for block in body.strip().split("\n\n"):
+            event, data = block.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        return events
+
+    def test_answer(self):
+        events = self._events("what is posh", {"answer": "An act."})
+        self.assertEqual(events, [("answer", {"text": "An act."}), ("done", {"reset": False})])
+
+    def test_suggestions_follow_the_answer(self):
+        events = self._events(
+            "posh?", {"answer": None, "message": "Did you mean:", "suggestions": ["Q1", "Q2"]}
+        )
+        self.assertEqual(
+            events,
+            [
+                ("answer", {"text": "Did you mean:"}),
+                ("suggestion", {"index": 1, "text": "Q1"}),
+                ("suggestion", {"index": 2, "text": "Q2"}),
+                ("done", {"reset": False}),
+            ],
+        )
+
+    def test_greeting_and_reset(self):
+        self.assertEqual(self._events("hello")[0], ("answer", {"text": "Hi! Ask me about OHS."}))
+        with mock.patch("home.views.get_conversation_store") as store:
+            self.assertEqual(self._events("bye")[-1], ("done", {"reset": True}))
+        store.return_value.clear.assert_called_once_with("c:t1")
+
+    def test_error_event(self):
+        with mock.patch("home.views.predict", side_effect=RuntimeError):
+            response = self.client.post(
+                reverse("chatbot_stream"), {"message": "posh", "conversation_id": "t1"},
+                content_type="application/json",
+            )
+            body = b"".join(response.streaming_content).decode()
+        self.assertEqual(body, 'event: error\ndata: {"error": "Error"}\n\n')
+
+
+class ChatbotArtifactTests(SimpleTestCase):
+    def setUp(self):
+        import numpy as np
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.records = [
+            {"question": "What is POSH?", "answer": "Prévention — 予防", "keywords": ["posh", "act"]},
+            {"question": "Who is on the IC?", "answer": "", "keywords": []},
+        ]
+        self.embeddings = np.array([[3.0, 4.0], [1.0, 0.0]], dtype=np.float32)
+
+    def test_round_trip_is_memory_mapped(self):
+        import numpy as np
+
+        from .chatbot_artifacts import load_artifacts, write_artifacts
+
+        write_artifacts(self.records, self.embeddings, self.dir, "stub")
+        artifacts = load_artifacts(self.dir, model_name="stub", verify=True)
+        self.assertIsInstance(artifacts.embeddings, np.memmap)
+        np.testing.assert_allclose(artifacts.embeddings, [[0.6, 0.8], [1.0, 0.0]], rtol=1e-6)
+        self.assertEqual(list(artifacts.questions), ["What is POSH?", "Who is on the IC?"])
+        self.assertEqual(artifacts.answers[0], "Prévention — 予防")
+        self.assertEqual(artifacts.answers[-1], "")
+        self.assertEqual(artifacts.keywords_for(0), ["posh", "act"])
+        self.assertEqual(artifacts.keywords_for(1), [])
+
+    def test_rejects_other_model_and_tampering(self):
+        from .chatbot_artifacts import STRINGS_FILE, ArtifactError, load_artifacts, write_artifacts
+
+        write_artifacts(self.records, self.embeddings, self.dir, "stub")
+        with self.assertRaises(ArtifactError):
+            load_artifacts(self.dir, model_name="other")
+        with open(os.path.join(self.dir, STRINGS_FILE), "r+b") as fh:
+            fh.write(b"X")
+        with self.assertRaisesMessage(ArtifactError, "Checksum mismatch"):
+            load_artifacts(self.dir, verify=True)
+
+
+class LexicalRetrievalTests(SimpleTestCase):
+    def setUp(self):
+        from .chatbot_lexical import LexicalIndex
+
+        self.index = LexicalIndex.from_faq(
+            [q for q, _, _ in FAQ], [k for _, _, k in FAQ]
+        )
+
+    def test_tokenize_drops_stopwords(self):
+        from .chatbot_lexical import tokenize
+
+        self.assertEqual(tokenize("What is the POSH Act?"), ["posh", "act"])
+
+    def test_bm25_ranking(self):
+        scores, ids = self.index.search("internal committee member", 2)
+        self.assertEqual(ids[0][0], 1)
+        self.assertTrue((scores[0][:-1] >= scores[0][1:]).all())
+        self.assertEqual(self.index.search("zebra", 3)[1].shape, (1, 0))
+
+    def test_best_match_needs_coverage_and_margin(self):
+        self.assertEqual(self.index.best_match("pocso section 19"), 2)
+        self.assertEqual(self.index.best_match("ic"), 1)  # a keyword
+        self.assertIsNone(self.index.best_match("posh zebra"))  # not every term matched
+        self.assertIsNone(self.index.best_match("act"))  # POSH and POCSO questions tie
+        self.assertIsNone(self.index.best_match("what is the"))
+
+    def test_fuse_scores(self):
+        import numpy as np
+
+        from .chatbot_lexical import fuse_scores
+
+        lexical, semantic = [4.0, 2.0, 0.0], [0.2, 0.9, 0.5]
+        np.testing.assert_allclose(
+            fuse_scores(lexical, semantic, "linear", alpha=0.5), [0.6, 0.7, 0.25], rtol=1e-6
+        )
+        np.testing.assert_allclose(
+            fuse_scores(lexical, semantic, "rrf", rrf_k=0), [1 + 1 / 3, 1 / 2 + 1, 1 / 3 + 1 / 2], rtol=1e-6
+        )
+        with self.assertRaises(ValueError):
+            fuse_scores(lexical, semantic, "max")
+
+
+class CompanyDashboardTests(TestCase):
+    """The company dashboard and its employee endpoints must not issue queries per member."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", first_name="Admin", password="x", account_type="COMPANY_ADMIN"
+        )
+        cls.org = Organization.objects.create(name="Acme", owner=cls.admin, max_users=100)
+        OrganizationMember.objects.create(organization=cls.org, user=cls.admin, role="ADMIN")
+        plan = SubscriptionPlan.objects.create(
+            name="POSH", type="POSH", price=100, duration_days=365, description=""
+        )
+        Subscription.objects.create(organization=cls.org, plan=plan, status="ACTIVE")
+        cls.modules = [
+            TrainingModule.objects.create(
+                title=f"Module {i}", description="", video_file="v.mp4", module_type="POSH", order=i
+            )
+            for i in range(1, 4)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _add_members(self, count, completed=1, department="Sales"):
+        today = timezone.now().date()
+        for i in range(count):
+            n = OrganizationMember.objects.count()
+            user = User.objects.create_user(
+                username=f"emp{n}", first_name=f"Emp{n:03d}", email=f"emp{n}@acme.test",
+                account_type="EMPLOYEE", department=department,
+            )
+            OrganizationMember.objects.create(organization=self.org, user=user)
+            for module in self.modules[:completed]:
+                ModuleProgress.objects.create(user=user, module=module, is_completed=True)
+            refresh_progress_summary(user, "POSH")
+            DailyActivity.objects.create(user=user, date=today - timedelta(days=i % 7), minutes_watched=5)
+
+    def _get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def _all_pages(self, **params):
+        names, cursor = [], None
+        while True:
+            page = self.client.get(
+                reverse("company_employees_api"), dict(params, limit=3, **({"cursor": cursor} if cursor else {}))
+            ).json()
+            names += [row["name"] for row in page["results"]]
+            if not page["has_more"]:
+                return names
+            cursor = page["next_cursor"]
+
+    def test_query_count_does_not_grow_with_members(self):
+        self._add_members(2)
+        small_page, _ = self._get(reverse("company_dashboard"))
+        small_api, _ = self._get(reverse("company_employees_api"), limit=50)
+        self._add_members(20)
+        large_page, response = self._get(reverse("company_dashboard"))
+        large_api, _ = self._get(reverse("company_employees_api"), limit=50)
+        self.assertEqual(small_page, large_page)
+        self.assertEqual(small_api, large_api)
+        self.assertEqual(response.context["total_employees"], 23)
+
+    def test_keyset_pagination_covers_every_member_once(self):
+        self._add_members(8)
+        names = self._all_pages(sort="name")
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 9)
+
+    def test_sort_and_filters(self):
+        self._add_members(2, completed=3, department="Legal")
+        self._add_members(3, completed=1)
+        by_completion = self._all_pages(sort="-completion")
+        self.assertCountEqual(by_completion[:2], ["Emp001", "Emp002"])
+        self.assertEqual(len(self._all_pages(status="completed")), 2)
+        self.assertEqual(len(self._all_pages(status="not_started")), 1)  # the admin
+        self.assertEqual(len(self._all_pages(department="Sales")), 3)
+        self.assertEqual(self._all_pages(q="emp4@"), ["Emp004"])
+
+    def test_member_detail(self):
+        self._add_members(1)
+        member = OrganizationMember.objects.get(user__username="emp1")
+        _, response = self._get(reverse("company_employee_detail", args=[member.id]))
+        data = response.json()
+        self.assertEqual(data["completed_modules"], 1)
+        self.assertEqual(data["percent_complete"], 33)
+        self.assertEqual([m["is_completed"] for m in data["modules"]], [True, False, False])
+        self.assertEqual(data["chart_data"][-1], 5)
+
+
+class ProgressSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="learner", password="x")
+        cls.modules = [
+            TrainingModule.objects.create(
+                title=f"Module {i}", description="", video_file="v.mp4", module_type="POSH", order=i
+            )
+            for i in range(1, 3)
+        ]
+
+    def _summary(self):
+        return TrainingProgressSummary.objects.get(user=self.user, module_type="POSH")
+
+    def test_mod_complete_updates_summary(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse("mod_complete", args=[self.modules[0].id]))
+        summary = self._summary()
+        self.assertEqual((summary.completed_count, summary.total_modules, summary.percent), (1, 2, 50))
+        self.assertIsNone(summary.completed_at)
+
+        self.client.post(reverse("mod_complete", args=[self.modules[1].id]))
+        summary = self._summary()
+        self.assertEqual(summary.percent, 100)
+        self.assertIsNotNone(summary.completed_at)
+
+    def test_module_changes_rebuild_track(self):
+        for module in self.modules:
+            ModuleProgress.objects.create(user=self.user, module=module, is_completed=True)
+        refresh_progress_summary(self.user, "POSH")
+        self.assertEqual(self._summary().percent, 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TrainingModule.objects.create(
+                title="Module 3", description="", video_file="v.mp4", module_type="POSH", order=3
+            )
+        summary = self._summary()
+        self.assertEqual((summary.completed_count, summary.total_modules, summary.percent), (2, 3, 66))
+        # Still the time the track was first finished
+        self.assertIsNotNone(summary.completed_at)
+
+    def test_only_track_changes_rebuild(self):
+        module = self.modules[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            module.title = "Renamed"
+            module.save()
+        self.assertEqual(callbacks, [])
+
+        ModuleProgress.objects.create(user=self.user, module=module, is_completed=True)
+        refresh_progress_summary(self.user, "POSH")
+        # Both the track it left and the one it joined are rebuilt
+        with self.captureOnCommitCallbacks(execute=True):
+            module.module_type = "POCSO"
+            module.save()
+        self.assertEqual(
+            TrainingProgressSummary.objects.get(user=self.user, module_type="POCSO").percent, 100
+        )
+        self.assertFalse(TrainingProgressSummary.objects.filter(user=self.user, module_type="POSH").exists())
+
+    def test_completed_at_is_kept_on_recompletion_and_rebuild(self):
+        self.client.force_login(self.user)
+        for module in self.modules:
+            self.client.post(reverse("mod_complete", args=[module.id]))
+        first = self._summary().completed_at
+        self.assertIsNotNone(first)
+
+        self.client.post(reverse("mod_complete", args=[self.modules[0].id]))  # rewatched
+        self.assertEqual(self._summary().completed_at, first)
+        rebuild_progress_summaries("POSH")
+        self.assertEqual(self._summary().completed_at, first)
+        self.assertEqual(
+            list(TrackCompletion.objects.values_list("user", "module_type", "completed_at")),
+            [(self.user.id, "POSH", first)],
+        )
+
+    def test_rebuild_deletes_rows_without_per_row_signals(self):
+        users = [self.user] + [User.objects.create_user(username=f"l{i}") for i in range(10)]
+        for user in users:
+            ModuleProgress.objects.create(user=user, module=self.modules[0], is_completed=True)
+        rebuild_progress_summaries("POSH")
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks() as callbacks:
+            rebuild_progress_summaries("POSH")
+        self.assertEqual(TrainingProgressSummary.objects.filter(module_type="POSH").count(), 11)
+        self.assertEqual(len(callbacks), 1)  # one completion-rate invalidation, not one per row
+        table = TrainingProgressSummary._meta.db_table
+        # The completed_at map is the only read: the DELETE doesn't load the rows first
+        self.assertEqual(
+            len([q for q in ctx.captured_queries if q["sql"].startswith("SELECT") and f'FROM "{table}"' in q["sql"]]),
+            1,
+        )
+
+    def test_rebuild_command(self):
+        ModuleProgress.objects.create(user=self.user, module=self.modules[0], is_completed=True)
+        call_command("rebuild_progress_summary", stdout=io.StringIO())
+        self.assertEqual(self._summary().percent, 50)
+
+    def test_migration_backfills_missing_summaries(self):
+        from django.apps import apps
+
+        migration = importlib.import_module("home.migrations.0015_backfill_progress_summaries")
+        other = User.objects.create_user(username="other", password="x")
+        for user in (self.user, other):
+            ModuleProgress.objects.create(user=user, module=self.modules[0], is_completed=True)
+        refresh_progress_summary(self.user, "POSH")
+        TrainingProgressSummary.objects.filter(user=self.user).update(percent=1)
+
+        migration.backfill_progress_summaries(apps, None)
+        self.assertEqual(self._summary().percent, 1)  # existing rows are left alone
+        summary = TrainingProgressSummary.objects.get(user=other, module_type="POSH")
+        self.assertEqual((summary.completed_count, summary.total_modules, summary.percent), (1, 2, 50))
+
+
+class WatchTimeBufferTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f"viewer{i}") for i in range(3)]
+        self.today = timezone.now().date()
+
+    def test_heartbeats_are_coalesced_into_increments(self):
+        from .watch_time import WatchTimeBuffer
+
+        DailyActivity.objects.create(user=self.users[0], date=self.today, minutes_watched=10)
+        buffer = WatchTimeBuffer(flush_interval=None)
+        for _ in range(3):
+            for user in self.users:
+                buffer.record(user.pk, self.today)
+        buffer.record(self.users[2].pk, self.today)
+
+        # One INSERT for missing rows, one UPDATE per distinct increment (+3, +4)
+        with self.assertNumQueries(5):
+            self.assertEqual(buffer.flush(), 10)
+        minutes = dict(
+            DailyActivity.objects.filter(date=self.today).values_list("user__username", "minutes_watched")
+        )
+        self.assertEqual(minutes, {"viewer0": 13, "viewer1": 3, "viewer2": 4})
+        self.assertEqual(buffer.pending(), 0)
+
+    def test_failed_flush_keeps_counts(self):
+        from unittest import mock
+
+        from .watch_time import WatchTimeBuffer
+
+        buffer = WatchTimeBuffer(flush_interval=None)
+        buffer.record(self.users[0].pk, self.today, minutes=2)
+        with mock.patch("home.watch_time.flush_counts", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(buffer.pending(), 2)
+        buffer.flush()
+        self.assertEqual(DailyActivity.objects.get(user=self.users[0]).minutes_watched, 2)
+
+    def test_exit_flush_waits_for_a_flush_in_progress(self):
+        import threading
+
+        from .watch_time import WatchTimeBuffer
+
+        key = (self.users[0].pk, self.today)
+        started, release, written = threading.Event(), threading.Event(), []
+
+        def slow_flush_counts(counts):
+            if not started.is_set():  # only the first flush is slow
+                started.set()
+                release.wait(5)
+            written.append(dict(counts))
+
+        buffer = WatchTimeBuffer(flush_interval=None)
+        buffer.record(*key, minutes=2)
+        with mock.patch("home.watch_time.flush_counts", slow_flush_counts):
+            background = threading.Thread(target=buffer.flush)
+            background.start()
+            started.wait(5)
+            buffer.record(*key, minutes=1)
+            exiting = threading.Thread(target=buffer.stop)
+            exiting.start()
+            exiting.join(0.2)
+            self.assertTrue(exiting.is_alive())  # still writing the first two minutes
+            release.set()
+            background.join()
+            exiting.join()
+        self.assertEqual(written, [{key: 2}, {key: 1}])
+
+    def test_stop_ends_the_flusher_thread(self):
+        from .watch_time import WatchTimeBuffer
+
+        buffer = WatchTimeBuffer(flush_interval=60)
+        buffer.record(self.users[0].pk, self.today, minutes=3)
+        with mock.patch("home.watch_time.flush_counts") as flush_counts:
+            self.assertEqual(buffer.stop(), 3)
+        self.assertFalse(buffer._thread.is_alive())
+        flush_counts.assert_called_once_with({(self.users[0].pk, self.today): 3})
+
+
+class ProgressBeaconTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="watcher", password="x")
+        cls.modules = [
+            TrainingModule.objects.create(
+                title=f"Module {i}", description="", video_file="v.mp4",
+                module_type="POSH", order=i, duration_seconds=120,
+            )
+            for i in range(1, 4)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _send(self, updates):
+        return self.client.post(
+            reverse("progress_beacon"), json.dumps({"updates": updates}), content_type="application/json"
+        )
+
+    def test_merge_is_idempotent(self):
+        beacon = [{"module": self.modules[0].id, "position": 40, "intervals": [[0, 30], [20, 40]]}]
+        for _ in range(2):
+            self.assertEqual(self._send(beacon).status_code, 200)
+        progress = ModuleProgress.objects.get(user=self.user, module=self.modules[0])
+        self.assertEqual((progress.watched_seconds, progress.last_position), (40, 40))
+
+        self._send([{"module": self.modules[0].id, "position": 65, "intervals": [[30, 60], [100, 500]]}])
+        progress.refresh_from_db()
+        # [0, 60) plus [100, 121): ranges past the module's duration are clipped
+        self.assertEqual((progress.watched_seconds, progress.last_position), (81, 65))
+
+    def test_batch_is_one_upsert(self):
+        ModuleProgress.objects.create(user=self.user, module=self.modules[0], is_completed=True)
+        updates = [
+            {"module": m.id, "position": 10, "intervals": [[0, 10]]} for m in self.modules
+        ]
+        from .playback import apply_progress_updates, parse_progress_beacon
+
+        parsed = parse_progress_beacon(json.dumps({"updates": updates}))
+        # modules, insert missing rows, locked read, savepoint pair around one upsert
+        with self.assertNumQueries(6):
+            apply_progress_updates(self.user, parsed)
+        rows = ModuleProgress.objects.filter(user=self.user).order_by("module__order")
+        self.assertEqual([r.watched_seconds for r in rows], [10, 10, 10])
+        self.assertTrue(rows[0].is_completed)
+
+    def test_write_lock_is_taken_before_the_bitmaps_are_read(self):
+        from .playback import apply_progress_updates
+
+        with CaptureQueriesContext(connection) as ctx:
+            apply_progress_updates(self.user, {self.modules[0].id: (10, [(0, 10)])})
+        progress_queries = [
+            q["sql"] for q in ctx.captured_queries if ModuleProgress._meta.db_table in q["sql"]
+        ]
+        self.assertTrue(progress_queries[0].startswith("INSERT"), progress_queries[0])
+        self.assertTrue(progress_queries[1].startswith("SELECT"), progress_queries[1])
+
+    def test_malformed_beacon_is_rejected(self):
+        response = self.client.post(reverse("progress_beacon"), "nope", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=IN_MEMORY_CACHES)
+class TrackPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="trainee", password="x")
+        plan = SubscriptionPlan.objects.create(
+            name="POSH", type="POSH", price=100, duration_days=365, description=""
+        )
+        Subscription.objects.create(user=cls.user, plan=plan, status="ACTIVE")
+
+    def _add_modules(self, count):
+        start = TrainingModule.objects.count()
+        return [
+            TrainingModule.objects.create(
+                title=f"Module {i}", description="", video_file="v.mp4", module_type="POSH", order=i
+            )
+            for i in range(start + 1, start + count + 1)
+        ]
+
+    def setUp(self):
+        caches["shared"].clear()
+
+    def _render(self, queries=3):
+        from .views import posh_act_page
+
+        request = RequestFactory().get(reverse("posh_act_page"))
+        request.user = self.user
+        # entitlements (until cached), modules LEFT JOIN progress, 7-day activity
+        with self.assertNumQueries(queries):
+            response = posh_act_page(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_is_flat_and_get_writes_nothing(self):
+        modules = self._add_modules(2)
+        ModuleProgress.objects.create(user=self.user, module=modules[0], is_completed=True)
+        self._render()
+        self._add_modules(8)
+        self._render(queries=2)
+        self.assertEqual(ModuleProgress.objects.filter(user=self.user).count(), 1)
+
+    def test_context_locks_modules_in_order(self):
+        from .progress import track_page_context
+
+        modules = self._add_modules(3)
+        ModuleProgress.objects.create(user=self.user, module=modules[0], is_completed=True)
+        ModuleProgress.objects.create(user=self.user, module=modules[1], last_position=42)
+        context = track_page_context(self.user, "POSH")
+        self.assertEqual([m["is_completed"] for m in context["modules"]], [True, False, False])
+        self.assertEqual([m["is_locked"] for m in context["modules"]], [False, False, True])
+        self.assertEqual(context["modules"][1]["last_position"], 42)
+        self.assertEqual((context["completed_count"], context["percent_complete"]), (1, 33))
+
+    def test_generic_track_url(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("training_track_page", args=["posh"])).status_code, 200)
+        self.assertEqual(self.client.get(reverse("training_track_page", args=["nope"])).status_code, 404)
+
+
+@override_settings(CACHES=IN_MEMORY_CACHES)
+class EntitlementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.posh = SubscriptionPlan.objects.create(
+            name="POSH", type="POSH", price=100, duration_days=365, description=""
+        )
+        cls.both = SubscriptionPlan.objects.create(
+            name="Both", type="BOTH", price=200, duration_days=365, description=""
+        )
+        cls.admin = User.objects.create_user(username="orgadmin", password="x", account_type="COMPANY_ADMIN")
+        cls.org = Organization.objects.create(name="Acme", owner=cls.admin)
+        cls.user = User.objects.create_user(username="learner", password="x", account_type="EMPLOYEE")
+
+    def setUp(self):
+        caches["shared"].clear()
+
+    def _request(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        return request
+
+    def test_resolved_once_per_request_then_cached(self):
+        from .entitlements import get_active_tracks, has_track
+
+        Subscription.objects.create(user=self.user, plan=self.posh, status="ACTIVE")
+        request = self._request()
+        with self.assertNumQueries(1):
+            self.assertTrue(has_track(request, "POSH"))
+            self.assertFalse(has_track(request, "POCSO"))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_tracks(self._request()), {"POSH"})
+
+    def test_organization_plan_and_expiry(self):
+        from .entitlements import get_active_tracks
+
+        sub = Subscription.objects.create(organization=self.org, plan=self.both, status="ACTIVE")
+        self.assertEqual(get_active_tracks(self._request()), frozenset())
+
+        # Joining the organisation invalidates the cached (empty) entitlements
+        member = OrganizationMember.objects.create(organization=self.org, user=self.user)
+        self.assertEqual(get_active_tracks(self._request()), {"POSH", "POCSO"})
+
+        # So does the organisation's subscription ending
+        sub.end_date = timezone.now() - timedelta(minutes=1)
+        sub.start_date = sub.end_date - timedelta(days=1)
+        sub.save()
+        self.assertEqual(get_active_tracks(self._request()), frozenset())
+
+        sub.delete()
+        member.delete()
+        self.assertEqual(get_active_tracks(self._request()), frozenset())
+
+    def test_login_redirect_uses_entitlements(self):
+        Subscription.objects.create(user=self.user, plan=self.both, status="ACTIVE")
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("custom_login_redirect"))
+        self.assertRedirects(response, reverse("posh_act_page"), fetch_redirect_response=False)
+
+
+class SubscriptionExpiryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = SubscriptionPlan.objects.create(
+            name="POSH", type="POSH", price=100, duration_days=365, description=""
+        )
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        cls.org = Organization.objects.create(name="Acme", owner=cls.owner)
+        cls.member = User.objects.create_user(username="member", password="x")
+        OrganizationMember.objects.create(organization=cls.org, user=cls.member)
+
+    def setUp(self):
+        caches["shared"].clear()
+
+    def _subscription(self, days_left, **owner):
+        end = timezone.now() + timedelta(days=days_left)
+        return Subscription.objects.create(
+            plan=self.plan, status="ACTIVE", start_date=end - timedelta(days=365), end_date=end, **owner
+        )
+
+    def test_sweep_expires_in_batches_and_invalidates(self):
+        from .entitlements import get_active_tracks
+
+        individuals = [User.objects.create_user(username=f"ind{i}", password="x") for i in range(3)]
+        for user in individuals:
+            self._subscription(-1, user=user)
+        self._subscription(-2, organization=self.org)
+        current = self._subscription(30, user=self.owner)
+
+        # Cached before the sweep; expired rows no longer grant access either way
+        request = RequestFactory().get("/")
+        request.user = self.member
+        self.assertEqual(get_active_tracks(request), frozenset())
+        caches["shared"].set(f"entitlements:{self.member.pk}", frozenset({"POSH"}))
+
+        out = io.StringIO()
+        call_command("expire_subscriptions", "--batch-size", "2", stdout=out)
+        self.assertIn("Expired 4 subscriptions; invalidated entitlements of 4 users", out.getvalue())
+        self.assertEqual(Subscription.objects.filter(status="EXPIRED").count(), 4)
+        current.refresh_from_db()
+        self.assertEqual(current.status, "ACTIVE")
+        self.assertIsNone(caches["shared"].get(f"entitlements:{self.member.pk}"))
+
+        out = io.StringIO()
+        call_command("expire_subscriptions", "--dry-run", stdout=out)
+        self.assertIn("0 subscriptions are due", out.getvalue())
+
+
+@override_settings(EMPLOYEE_IMPORT_WORKER="command", EMPLOYEE_IMPORT_HASH_WORKERS=0)
+class EmployeeImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin@acme.test", email="admin@acme.test", password="x", account_type="COMPANY_ADMIN"
+        )
+        cls.org = Organization.objects.create(name="Acme", owner=cls.admin, max_users=5)
+        OrganizationMember.objects.create(organization=cls.org, user=cls.admin, role="ADMIN")
+        User.objects.create_user(username="taken@acme.test", email="taken@acme.test", password="x")
+
+    def setUp(self):
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        self.enterContext(override_settings(EMPLOYEE_IMPORT_DIR=upload_dir.name))
+        self.upload_dir = upload_dir.name
+
+    def _upload(self, lines):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        body = "\ufeff" + "\r\n".join(
+            ["Name ,Last name,Department,Email,Phone no,Default password"] + lines
+        )
+        self.client.force_login(self.admin)
+        upload = SimpleUploadedFile("staff.csv", body.encode("utf-8"), content_type="text/csv")
+        return self.client.post(reverse("upload_employee_bulk"), {"employee_file": upload})
+
+    def test_batched_import_with_error_report(self):
+        from .employee_import import import_employees, read_rows
+
+        lines = [
+            "Ann,Lee,HR,ann@acme.test,+91 98765 43210,pw",
+            "Bob,Roy,IT,taken@acme.test,2,pw",
+            "Cat,Poe,IT,not-an-email,3,pw",
+            "Dan,Fox,IT,ann@acme.test,4,pw",
+            "Eve,Kim,IT,eve@acme.test,5,",
+            "Fay,Ng,Ops,fay@acme.test,6,pw",
+            "Gus,Orr,Ops,gus@acme.test,+91 98765 43210 7,pw",
+            "Hal,Ray,Ops,hal@acme.test,8,pw",
+            "Ivy,Sun,Ops,ivy@acme.test,9,pw",
+            "Joe,Tan,Ops,joe@acme.test,10,pw",
+        ]
+        from .import_jobs import run_pending_jobs
+
+        response = self._upload(lines)
+        self.assertRedirects(response, reverse("company_dashboard"), fetch_redirect_response=False)
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, "QUEUED")
+        self.assertEqual(run_pending_jobs(), 1)
+
+        status = self.client.get(reverse("import_job_status", args=[job.id])).json()
+        self.assertEqual(
+            {k: status[k] for k in ("status", "total_rows", "processed_rows", "added", "errors")},
+            {"status": "DONE", "total_rows": 10, "processed_rows": 10, "added": 4, "errors": 6},
+        )
+        job.refresh_from_db()
+        self.assertFalse(job.file)  # the upload (with passwords) is deleted
+
+        members = OrganizationMember.objects.filter(organization=self.org, role="MEMBER")
+        # 4 seats were free: ann, fay, hal, ivy
+        self.assertEqual(
+            sorted(members.values_list("user__email", flat=True)),
+            ["ann@acme.test", "fay@acme.test", "hal@acme.test", "ivy@acme.test"],
+        )
+        ann = User.objects.get(email="ann@acme.test")
+        self.assertEqual((ann.department, ann.phone, ann.account_type), ("HR", "+91 98765 43210", "EMPLOYEE"))
+        self.assertTrue(ann.check_password("pw"))
+
+        report = self.client.get(status["error_report_url"]).content.decode()
+        self.assertEqual(
+            report.splitlines(),
+            [
+                "Line,Email,Error",
+                "3,taken@acme.test,A user with this email already exists",
+                "4,not-an-email,Invalid email address",
+                "5,ann@acme.test,Duplicate email in file",
+                "6,eve@acme.test,Email and default password are required",
+                "8,gus@acme.test,Phone number longer than 15 characters",
+                "11,joe@acme.test,Seat limit reached (5)",
+            ],
+        )
+
+        # Queries per batch don't depend on its size: IN check, user + member inserts
+        self.org.max_users = 100
+        self.org.save()
+        rows = read_rows(io.BytesIO("\n".join(
+            ["Name,Email,Default password"] + [f"N{i},bulk{i}@acme.test,pw" for i in range(40)]
+        ).encode()))
+        with CaptureQueriesContext(connection) as ctx:
+            result = import_employees(self.org, rows, batch_size=20, hash_passwords=list)
+        self.assertEqual((result.added, result.errors), (40, []))
+        statements = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        # seat count + per batch (IN check, user insert, member insert)
+        self.assertEqual(len(statements), 1 + 2 * 3)
+
+    def test_crashed_job_resumes_after_last_committed_line(self):
+        from django.core.files.base import ContentFile
+
+        from .import_jobs import run_pending_jobs
+
+        body = "Name,Email,Default password\n" + "".join(f"N{i},r{i}@acme.test,pw\n" for i in range(4))
+        job = ImportJob(organization=self.org, status="RUNNING", total_rows=4, processed_rows=3,
+                        heartbeat_at=timezone.now() - timedelta(hours=1), added_count=2)
+        job.file.save("staff.csv", ContentFile(body.encode()))
+        self.assertTrue(job.file.path.startswith(self.upload_dir))
+        # Lines 2-3 (r0, r1) were committed before the worker died
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.added_count, job.processed_rows), ("DONE", 4, 5))
+        self.assertEqual(
+            sorted(User.objects.filter(email__startswith="r").values_list("email", flat=True)),
+            ["r2@acme.test", "r3@acme.test"],
+        )
+
+        # A live job is left to its worker
+        live = ImportJob.objects.create(organization=self.org, status="RUNNING", heartbeat_at=timezone.now())
+        self.assertEqual(run_pending_jobs(), 0)
+        live.refresh_from_db()
+        self.assertEqual(live.status, "RUNNING")
+
+    @override_settings(EMPLOYEE_IMPORT_HASH_WORKERS=2)
+    def test_passwords_hashed_on_process_pool(self):
+        from django.contrib.auth.hashers import check_password
+
+        from .import_jobs import hash_passwords
+
+        hashes = hash_passwords(["a", "b", "c"])
+        self.assertEqual([check_password(p, h) for p, h in zip("abc", hashes)], [True] * 3)
+
+    def test_heartbeat_is_refreshed_while_hashing(self):
+        from .import_jobs import hash_passwords
+
+        heartbeat = mock.Mock()
+        with mock.patch("home.import_jobs.HEARTBEAT_SECONDS", 0):
+            hashes = hash_passwords(["a", "b", "c"], heartbeat)
+        self.assertEqual(len(hashes), 3)
+        self.assertEqual(heartbeat.call_count, 3)
+
+
+@override_settings(ROLLUP_LAG_SECONDS=0)
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = User.objects.create_superuser(username="root", password="x", email="root@x.test")
+        owner = User.objects.create_user(username="owner", password="x", account_type="COMPANY_ADMIN")
+        posh = SubscriptionPlan.objects.create(
+            name="POSH", type="POSH", price=100, duration_days=365, description=""
+        )
+        both = SubscriptionPlan.objects.create(
+            name="Both", type="BOTH", price=200, duration_days=365, description=""
+        )
+        corp = Organization.objects.create(name="Acme", owner=owner, organization_type="CORPORATE")
+        school = Organization.objects.create(name="School", owner=owner, organization_type="SCHOOL")
+        Subscription.objects.create(organization=corp, plan=posh, status="ACTIVE")
+        Subscription.objects.create(organization=school, plan=both, status="ACTIVE")
+        Subscription.objects.create(user=owner, plan=posh, status="ACTIVE")
+        yesterday = timezone.now() - timedelta(days=1)
+        TrackCompletion.objects.create(
+            user=owner, module_type="POSH", completed_at=yesterday, recorded_at=yesterday
+        )
+
+    def test_incremental_counts_and_constant_dashboard(self):
+        from .rollups import dashboard_metrics, update_rollups
+
+        update_rollups()
+        self.assertEqual(update_rollups(), 0)  # nothing new
+
+        metrics = dashboard_metrics()
+        self.assertEqual((metrics["total_users"], metrics["total_companies"], metrics["total_schools"]), (2, 1, 1))
+        self.assertEqual(metrics["completions"], 1)
+        posh, pocso = metrics["tracks"]["POSH"], metrics["tracks"]["POCSO"]
+        self.assertEqual(
+            (posh["individuals"], posh["companies"], posh["schools"], posh["total"]), (1, 1, 1, 3)
+        )
+        self.assertEqual((pocso["schools"], pocso["total"]), (1, 1))
+        self.assertEqual(posh["monthly"][-1], 1)  # the company's POSH subscription, this month
+
+        # Only rows after the watermark are added
+        User.objects.create_user(username="late", password="x")
+        self.assertEqual(dashboard_metrics()["total_users"], 2)
+        update_rollups()
+        self.assertEqual(dashboard_metrics()["total_users"], 3)
+
+        self.client.force_login(self.root)
+        self.client.get(reverse("superuser_dashboard"))  # warms the cached completion rates
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse("superuser_dashboard")).status_code, 200)
+        queries = len(ctx)
+        for i in range(20):
+            User.objects.create_user(username=f"bulk{i}", password="x")
+        update_rollups()
+        with self.assertNumQueries(queries):
+            self.client.get(reverse("superuser_dashboard"))
+
+    def test_completions_are_counted_once(self):
+        from .rollups import dashboard_metrics, update_rollups
+
+        update_rollups()
+        learner = User.objects.create_user(username="learner", password="x")
+        module = TrainingModule.objects.create(
+            title="Intro", description="", video_file="v.mp4", module_type="POCSO", order=1
+        )
+        ModuleProgress.objects.create(user=learner, module=module, is_completed=True)
+        # Finished a month ago, but only summarised now: completed_at predates the watermark
+        ModuleProgress.objects.filter(user=learner).update(timestamp=timezone.now() - timedelta(days=30))
+        for _ in range(2):
+            rebuild_progress_summaries("POCSO")
+            refresh_progress_summary(learner, "POCSO")
+            update_rollups()
+            self.assertEqual(dashboard_metrics()["tracks"]["POCSO"]["completions"], 1)
+
+    def test_runs_write_the_watermark_before_reading_it(self):
+        from .models import RollupWatermark
+        from .rollups import update_rollups
+
+        for _ in range(2):  # a new and an existing watermark
+            with CaptureQueriesContext(connection) as ctx:
+                update_rollups()
+            watermark_queries = [
+                q["sql"] for q in ctx.captured_queries if RollupWatermark._meta.db_table in q["sql"]
+            ]
+            self.assertTrue(watermark_queries[0].startswith("INSERT"), watermark_queries[0])
+
+    def test_dashboard_only_reads_the_rollups(self):
+        from .models import RollupWatermark
+        from .rollups import update_rollups
+
+        self.client.force_login(self.root)
+        self.assertContains(self.client.get(reverse("superuser_dashboard")), "has not run yet")
+        self.assertFalse(RollupWatermark.objects.exists())
+        update_rollups()
+        self.assertNotContains(self.client.get(reverse("superuser_dashboard")), "has not run yet")
+
+
+@override_settings(CACHES=IN_MEMORY_CACHES)
+class CompletionRateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = User.objects.create_superuser(username="root", password="x", email="root@x.test")
+        owner = User.objects.create_user(username="owner", password="x")
+        both = SubscriptionPlan.objects.create(
+            name="Both", type="BOTH", price=200, duration_days=365, description=""
+        )
+        posh = SubscriptionPlan.objects.create(
+            name="POSH", type="POSH", price=100, duration_days=365, description=""
+        )
+        corp = Organization.objects.create(name="Acme", owner=owner, organization_type="CORPORATE")
+        school = Organization.objects.create(name="School", owner=owner, organization_type="SCHOOL")
+        lapsed = Organization.objects.create(name="Lapsed", owner=owner, organization_type="CORPORATE")
+        Subscription.objects.create(organization=corp, plan=posh, status="ACTIVE")
+        Subscription.objects.create(organization=school, plan=both, status="ACTIVE")
+        end = timezone.now() - timedelta(days=1)
+        Subscription.objects.create(
+            organization=lapsed, plan=posh, status="ACTIVE", start_date=end - timedelta(days=30), end_date=end
+        )
+        cls.people = {}
+        for org, names in ((corp, "abcd"), (school, "ef"), (lapsed, "g")):
+            for name in names:
+                user = User.objects.create_user(username=name, password="x")
+                OrganizationMember.objects.create(organization=org, user=user)
+                cls.people[name] = user
+        solo = User.objects.create_user(username="solo", password="x")
+        Subscription.objects.create(user=solo, plan=posh, status="ACTIVE")
+        cls.people["solo"] = solo
+
+    def setUp(self):
+        caches["shared"].clear()
+
+    def _complete(self, name, track="POSH"):
+        TrainingProgressSummary.objects.update_or_create(
+            user=self.people[name], module_type=track,
+            defaults={"completed_count": 2, "total_modules": 2, "percent": 100},
+        )
+
+    def test_rates_by_track_and_org_type(self):
+        from .analytics import compute_completion_rates
+
+        for name in ("a", "e", "g", "solo"):
+            self._complete(name)
+        TrainingProgressSummary.objects.create(
+            user=self.people["b"], module_type="POSH", completed_count=1, total_modules=2, percent=50
+        )
+        with self.assertNumQueries(4):
+            rates = compute_completion_rates()
+        posh = rates["POSH"]
+        self.assertEqual(posh["CORPORATE"], {"entitled": 4, "completed": 1, "percent": 25})
+        self.assertEqual(posh["SCHOOL"], {"entitled": 2, "completed": 1, "percent": 50})
+        self.assertEqual(posh["INDIVIDUAL"], {"entitled": 1, "completed": 1, "percent": 100})
+        self.assertEqual(posh["ALL"], {"entitled": 7, "completed": 3, "percent": 42})
+        self.assertEqual(rates["POCSO"]["SCHOOL"], {"entitled": 2, "completed": 0, "percent": 0})
+        self.assertEqual(rates["POCSO"]["CORPORATE"]["entitled"], 0)
+
+    def test_endpoint_is_cached_and_invalidated_by_progress(self):
+        self.client.force_login(self.root)
+        url = reverse("superuser_completion_rates")
+        self.assertEqual(self.client.get(url).json()["POSH"]["ALL"]["completed"], 0)
+        with self.assertNumQueries(2):  # session + user only
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._complete("c")
+        self.assertEqual(self.client.get(url).json()["POSH"]["ALL"]["completed"], 1)
+
+        self.client.force_login(self.people["a"])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Runs the main views against a seeded dataset and fails if any of their
+    queries makes SQLite scan a whole table (EXPLAIN QUERY PLAN "SCAN <table>"
+    without an index). Tables listed in SMALL_TABLES hold a handful of
+    catalogue rows and may be scanned. The data is ANALYZEd first, as
+    production databases should be (ANALYZE or PRAGMA optimize), so the planner has the
+    statistics it needs to choose between indexes.
+    """
+
+    SMALL_TABLES = {"home_subscriptionplan", "home_trainingmodule", "django_content_type"}
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.hashers import make_password
+
+        password = make_password("x")
+        posh = SubscriptionPlan.objects.create(
+            name="POSH", type="POSH", price=100, duration_days=365, description=""
+        )
+        both = SubscriptionPlan.objects.create(
+            name="Both", type="BOTH", price=200, duration_days=365, description=""
+        )
+        modules = [
+            TrainingModule.objects.create(
+                title=f"M{i}", description="", video_file="v.mp4", module_type=track, order=i
+            )
+            for track in ("POSH", "POCSO") for i in range(1, 4)
+        ]
+        cls.root = User.objects.create(username="root", password=password, is_superuser=True, is_staff=True)
+        today = timezone.now().date()
+        users = User.objects.bulk_create(
+            User(username=f"u{i}", email=f"u{i}@x.test", password=password, account_type="EMPLOYEE")
+            for i in range(300)
+        )
+        admins = User.objects.bulk_create(
+            User(username=f"admin{i}", password=password, account_type="COMPANY_ADMIN") for i in range(60)
+        )
+        orgs = Organization.objects.bulk_create(
+            Organization(name=f"Org{i}", owner=admin, organization_type="SCHOOL" if i % 2 else "CORPORATE")
+            for i, admin in enumerate(admins)
+        )
+        OrganizationMember.objects.bulk_create(
+            [OrganizationMember(organization=org, user=admin, role="ADMIN") for org, admin in zip(orgs, admins)]
+            + [OrganizationMember(organization=orgs[i % 60], user=user) for i, user in enumerate(users[:250])]
+        )
+        end = timezone.now() + timedelta(days=100)
+        start = end - timedelta(days=365)
+        Subscription.objects.bulk_create(
+            # a third of the organisations have let their subscription lapse
+            [Subscription(organization=org, plan=both if i % 2 else posh, status="EXPIRED" if i % 3 == 0 else "ACTIVE",
+                          start_date=start, end_date=end) for i, org in enumerate(orgs)]
+            + [Subscription(user=user, plan=posh, status="ACTIVE", start_date=start, end_date=end) for user in users[250:]]
+            + [Subscription(user=user, plan=posh, status="EXPIRED", start_date=start - timedelta(days=400),
+                            end_date=start - timedelta(days=35)) for user in users[:50]]
+        )
+        ModuleProgress.objects.bulk_create(
+            ModuleProgress(user=user, module=module, is_completed=(i + j) % 3 != 0)
+            for i, user in enumerate(users) for j, module in enumerate(modules[:3])
+        )
+        DailyActivity.objects.bulk_create(
+            DailyActivity(user=user, date=today - timedelta(days=d), minutes_watched=d + 1)
+            for user in users for d in range(0, 10, 2)
+        )
+        from .progress import rebuild_progress_summaries
+
+        rebuild_progress_summaries()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        # (organisation 1 is subscribed; users[1] is one of its members)
+        cls.admin, cls.employee, cls.individual = admins[1], users[1], users[260]
+        cls.module = modules[0]
+
+    def setUp(self):
+        caches["shared"].clear()
+
+    def _full_scans(self, run):
+        from django.db.backends.sqlite3.base import SQLiteCursorWrapper
+
+        scans = []
+
+        def explain(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith("SELECT"):
+                # A plain sqlite cursor (with Django's %s -> ? translation) skips this wrapper
+                cursor = context["connection"].connection.cursor(factory=SQLiteCursorWrapper)
+                try:
+                    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                    plan = [row[3] for row in cursor.fetchall()]
+                finally:
+                    cursor.close()
+                for step in plan:
+                    words = step.split()
+                    if words[0] == "SCAN" and " USING " not in step and words[1] not in self.SMALL_TABLES:
+                        scans.append((step, sql))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(explain):
+            run()
+        return scans
+
+    def _assert_no_full_scans(self, user, url, method="get", **kwargs):
+        self.client.force_login(user)
+        scans = self._full_scans(lambda: getattr(self.client, method)(url, **kwargs))
+        self.assertEqual(scans, [], f"full table scans while serving {url}")
+
+    def test_views_use_indexes(self):
+        from .rollups import update_rollups
+
+        update_rollups()
+        pages = [
+            (self.admin, reverse("company_dashboard")),
+            (self.admin, reverse("company_employees_api")),
+            (self.admin, reverse("company_employees_api") + "?sort=-completion&q=u1"),
+            (self.admin, reverse("company_employees_api") + "?sort=last_activity"),
+            (self.admin, reverse("company_employee_detail", args=[OrganizationMember.objects.filter(user=self.employee).get().pk])),
+            (self.employee, reverse("custom_login_redirect")),
+            (self.employee, reverse("posh_act_page")),
+            (self.individual, reverse("posh_act_page")),
+            (self.root, reverse("superuser_dashboard")),
+            (self.root, reverse("superuser_completion_rates")),
+        ]
+        for user, url in pages:
+            with self.subTest(url=url):
+                self._assert_no_full_scans(user, url)
+
+    def test_ajax_endpoints_use_indexes(self):
+        self._assert_no_full_scans(self.employee, reverse("mod_complete", args=[self.module.pk]), "post")
+        self._assert_no_full_scans(
+            self.employee, reverse("progress_beacon"), "post",
+            data=json.dumps({"updates": [{"module": self.module.pk, "position": 5, "intervals": [[0, 5]]}]}),
+            content_type="application/json",
+        )
+
+
+class ShippedDatabaseMigrationTests(SimpleTestCase):
+    def test_migrate_applies_to_the_checked_in_database(self):
+        # db.sqlite3 records migrations that 0006 replaces; migrate a copy of it
+        with tempfile.TemporaryDirectory() as tmp:
+            copy = os.path.join(tmp, "db.sqlite3")
+            shutil.copy(settings.BASE_DIR / "db.sqlite3", copy)
+            env = {k: v for k, v in os.environ.items() if k != "DJANGO_REPLICA_DB_PATH"}
+            env.update(DJANGO_DB_PATH=copy, DJANGO_DB_PROFILE="development")
+            result = subprocess.run(
+                [sys.executable, "manage.py", "migrate", "--noinput"],
+                env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            plan = subprocess.run(
+                [sys.executable, "manage.py", "migrate", "--plan"],
+                env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+            )
+        self.assertIn("No planned migration operations.", plan.stdout)
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_production_profile_sets_pragmas_per_connection(self):
+        from OHS.db_profiles import sqlite_database
+
+        db = sqlite_database("/tmp/x.sqlite3", "production")
+        self.assertIn("PRAGMA journal_mode=WAL", db["OPTIONS"]["init_command"].split(";"))
+        self.assertIn("PRAGMA busy_timeout=20000", db["OPTIONS"]["init_command"].split(";"))
+        self.assertEqual(db["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(db["CONN_MAX_AGE"], 600)
+        self.assertTrue(db["CONN_HEALTH_CHECKS"])
+
+    def test_production_pragmas_are_applied_on_connect(self):
+        from django.db.utils import ConnectionHandler
+
+        from OHS.db_profiles import sqlite_database
+
+        with tempfile.TemporaryDirectory() as tmp:
+            handler = ConnectionHandler({"default": sqlite_database(os.path.join(tmp, "db.sqlite3"), "production")})
+            wrapper = handler["default"]
+            # What the backend opens for a request (the test case blocks cursor())
+            conn = wrapper.get_new_connection(wrapper.get_connection_params())
+            try:
+                values = {
+                    pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+                    for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "temp_store")
+                }
+            finally:
+                conn.close()
+        # synchronous NORMAL is 1, temp_store MEMORY is 2
+        self.assertEqual(
+            values,
+            {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 20000,
+             "mmap_size": 256 * 1024 * 1024, "temp_store": 2},
+        )
+
+    def test_development_profile_is_django_default(self):
+        from OHS.db_profiles import sqlite_database
+
+        db = sqlite_database("/tmp/x.sqlite3", "development")
+        self.assertEqual(db["OPTIONS"], {})
+        self.assertEqual(db["CONN_MAX_AGE"], 0)
+
+    def test_unknown_profile(self):
+        from OHS.db_profiles import sqlite_database
+
+        with self.assertRaises(ValueError):
+            sqlite_database("/tmp/x.sqlite3", "staging")
+
+
+@override_settings(REPLICA_DATABASE_ALIAS="replica")
+class ReplicaRoutingTests(TestCase):
+    """The test run's in-memory "replica" database stands in for the copy of db.sqlite3."""
+
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="admin", password="x", account_type="COMPANY_ADMIN")
+        org = Organization.objects.create(name="Acme", owner=cls.admin, max_users=10)
+        OrganizationMember.objects.create(organization=org, user=cls.admin, role="ADMIN")
+        cls.module = TrainingModule.objects.create(
+            title="Module 1", description="", video_file="v.mp4", module_type="POSH", order=1
+        )
+
+    def test_reads_use_replica_until_the_view_writes(self):
+        from .db_routing import use_replica
+
+        User.objects.using("replica").create(username="replica-only")
+
+        @use_replica
+        def view(request):
+            before = set(User.objects.values_list("username", flat=True))
+            User.objects.create(username="new")
+            after = set(User.objects.values_list("username", flat=True))
+            return before, after
+
+        before, after = view(RequestFactory().get("/"))
+        self.assertEqual(before, {"replica-only"})
+        self.assertEqual(after, {"admin", "new"})
+        self.assertFalse(User.objects.filter(username="replica-only").exists())
+
+    def test_dashboard_reads_primary_after_the_browser_writes(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(reverse("company_dashboard"))
+        # The replica has no organisations yet
+        self.assertRedirects(response, reverse("tutorial"), fetch_redirect_response=False)
+        self.assertGreater(len(replica), 0)
+
+        response = self.client.post(reverse("mod_complete", args=[self.module.pk]))
+        self.assertIn("db_pin_primary", response.cookies)
+
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(reverse("company_dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(replica), 0)
+
+    def test_replica_is_never_migrated(self):
+        from django.db import router
+
+        self.assertFalse(router.allow_migrate("replica", "home"))
+        self.assertTrue(router.allow_migrate("default", "home"))
+
+    async def test_write_on_a_sync_thread_is_seen_by_the_request(self):
+        from asgiref.sync import sync_to_async
+
+        from .db_routing import ReplicaRouter, _flag, _state
+
+        try:
+            # ASGI runs the ORM on sync_to_async threads
+            await sync_to_async(ReplicaRouter().db_for_write)(User)
+            self.assertTrue(_flag("wrote"))
+        finally:
+            _state.wrote = False
+
+    @override_settings(REPLICA_DATABASE_ALIAS=None)
+    def test_no_replica_configured(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(reverse("company_dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(replica), 0)
+        response = self.client.post(reverse("mod_complete", args=[self.module.pk]))
+        self.assertNotIn("db_pin_primary", response.cookies)
+
+
+class SharedConversationStoreTests(TestCase):
+    def test_pop_is_answered_once(self):
+        from .chatbot_state import CacheConversationStore
+
+        first, second = CacheConversationStore(alias="shared"), CacheConversationStore(alias="shared")
+        first.set("conv", [("What is POSH?", "An act.")])
+        self.assertEqual(second.get("conv"), [("What is POSH?", "An act.")])
+        self.assertEqual(first.pop("conv"), [("What is POSH?", "An act.")])
+        self.assertEqual(second.pop("conv"), [])
+
+    def test_pop_loses_to_a_concurrent_pop(self):
+        from .chatbot_state import CacheConversationStore
+
+        store = CacheConversationStore(alias="shared")
+        store.set("conv", [("q", "a")])
+        real_get = store.cache.get
+
+        def get_then_race(key):
+            value = real_get(key)
+            store.cache.delete(key)  # another worker consumed it in between
+            return value
+
+        with mock.patch.object(store.cache, "get", get_then_race):
+            self.assertEqual(store.pop("conv"), [])
+
+
+class ChatStreamAsyncTests(SimpleTestCase):
+    suggestions = {"answer": None, "message": "Did you mean:", "suggestions": ["What is POSH?", "Who is on the IC?"]}
+
+    async def _post(self):
+        return await self.async_client.post(
+            reverse("chatbot_stream_async"),
+            {"message": "posh", "conversation_id": "t1"},
+            content_type="application/json",
+        )
+
+    async def test_streams_from_an_async_iterator(self):
+        with mock.patch("home.views.predict", return_value=self.suggestions):
+            response = await self._post()
+            self.assertTrue(response.is_async)
+            events = [chunk.decode() async for chunk in response.streaming_content]
+        self.assertEqual(
+            [event.split("\n")[0] for event in events],
+            ["event: answer", "event: suggestion", "event: suggestion", "event: done"],
+        )
+        self.assertIn('"text": "Who is on the IC?"', events[2])
+
+    async def test_busy_before_streaming(self):
+        from .chatbot_async import ExecutorBusy, get_inference_executor
+
+        with mock.patch.object(get_inference_executor(), "submit", side_effect=ExecutorBusy):
+            response = await self._post()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from home import views
@@ -29,15 +30,29 @@ urlpatterns = [
     # --- SECURE TRAINING PAGES (Accessed after login/subscription) ---
     path("tutorial/posh-act/", views.posh_act_page, name="posh_act_page"),
     path("tutorial/pocso-act/", views.pocso_act_page, name="pocso_act_page"),
+    path("tutorial/<str:track>-act/", views.training_track_page, name="training_track_page"),
     # Note: You had a duplicate path for pocso earlier in your code,
     # ensuring backward compatibility with 'pocso_act' name if used elsewhere:
     path("tutorial/pocso-act-legacy/", views.pocso_act_page, name="pocso_act"),
     # --- CHATBOT ---
-    path("chat/", views.chatbot_response, name="chatbot_response"),
+    path(
+        "chat/",
+        views.chatbot_response_async if settings.CHATBOT_ASYNC else views.chatbot_response,
+        name="chatbot_response",
+    ),
+    path("chat/async/", views.chatbot_response_async, name="chatbot_response_async"),
+    path(
+        "chat/stream/",
+        views.chatbot_stream_async if settings.CHATBOT_ASYNC else views.chatbot_stream,
+        name="chatbot_stream",
+    ),
+    path("chat/stream/async/", views.chatbot_stream_async, name="chatbot_stream_async"),
+    path("chat/ready/", views.chatbot_ready, name="chatbot_ready"),
     
     # --- AJAX API for Training ---
     path("ajax/update-watch-time/", views.update_watch_time, name="update_watch_time"),
     path("ajax/mod-complete/<int:module_id>/", views.mod_complete, name="mod_complete"),
+    path("ajax/progress-beacon/", views.progress_beacon, name="progress_beacon"),
 
     # --- SUBSCRIPTION FLOWS ---
     path(
@@ -52,6 +67,16 @@ urlpatterns = [
     ),
     # --- COMPANY DASHBOARD & MANAGEMENT ---
     path("dashboard/company/", views.company_dashboard, name="company_dashboard"),
+    path(
+        "dashboard/company/employees/",
+        views.company_employees_api,
+        name="company_employees_api",
+    ),
+    path(
+        "dashboard/company/employees/<int:member_id>/",
+        views.company_employee_detail,
+        name="company_employee_detail",
+    ),
     path("dashboard/add-employee/", views.add_employee, name="add_employee"),
     path(
         "download-template/",
@@ -59,6 +84,16 @@ urlpatterns = [
         name="download_employee_template",
     ),
     path("upload-bulk/", views.upload_employee_bulk, name="upload_employee_bulk"),
+    path(
+        "upload-bulk/<int:job_id>/",
+        views.import_job_status,
+        name="import_job_status",
+    ),
+    path(
+        "upload-bulk/<int:job_id>/errors/",
+        views.download_import_errors,
+        name="download_import_errors",
+    ),
     # --- AUTHENTICATION & SUPERUSER ---
     path(
         "login/", auth_views.LoginView.as_view(template_name="login.html"), name="login"
@@ -66,4 +101,9 @@ urlpatterns = [
     path("accounts/profile/", views.custom_login_redirect, name="login_redirect"),
     path("login-redirect/", views.custom_login_redirect, name="custom_login_redirect"),
     path("superuser/dashboard/", views.superuser_dashboard, name="superuser_dashboard"),
+    path(
+        "superuser/completion-rates/",
+        views.superuser_completion_rates,
+        name="superuser_completion_rates",
+    ),
 ]
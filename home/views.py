@@ -1,17 +1,21 @@
+import asyncio
+import base64
 import csv
-import io
 import json
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.decorators import user_passes_test
-from datetime import timedelta
+from datetime import date
 
 # Models
 # Ensure your User model has 'phone' and 'department' fields if you want to save them to the DB.
@@ -24,11 +28,33 @@ from .models import (
     OrganizationMember,
     TrainingModule,
     ModuleProgress,
-    DailyActivity,
+    ImportJob,
 )
 
+from .progress import (
+    activity_matrix,
+    annotate_member_progress,
+    completed_module_sets,
+    last_7_days,
+    refresh_progress_summary,
+    subscription_track,
+    track_page_context,
+)
+from .employee_import import error_report_csv
+from .entitlements import has_track
+from .import_jobs import enqueue_import, ensure_worker
+from .analytics import completion_rates
+from .db_routing import use_replica
+from .rollups import dashboard_metrics, rollups_exist
+from .playback import apply_progress_updates, parse_progress_beacon
+from .watch_time import record_watch_time
+
 # Ensure this file exists in your app or adjust import accordingly
-from .chatbot_logic import predict_answer
+# (importing it is cheap: the model itself loads on the first chat message)
+from .chatbot_logic import predict, predict_answer, is_ready as chatbot_is_ready, cache_stats
+from .chatbot_cache import normalize_query
+from .chatbot_state import get_conversation_store
+from .chatbot_async import ExecutorBusy, get_inference_executor
 
 
 # --- 1. LOGIN REDIRECT LOGIC ---
@@ -46,22 +72,10 @@ def custom_login_redirect(request):
 
     # 2. USER (Employee/Individual) -> Direct to Training Page
     elif user.account_type in ["EMPLOYEE", "INDIVIDUAL"]:
-        has_posh = Subscription.objects.filter(
-            Q(user=user) | Q(organization__organizationmember__user=user),
-            status="ACTIVE",
-            plan__type__in=["POSH", "BOTH"],
-        ).exists()
-
-        if has_posh:
+        if has_track(request, "POSH"):
             return redirect("posh_act_page")
 
-        has_pocso = Subscription.objects.filter(
-            Q(user=user) | Q(organization__organizationmember__user=user),
-            status="ACTIVE",
-            plan__type__in=["POCSO", "BOTH"],
-        ).exists()
-
-        if has_pocso:
+        if has_track(request, "POCSO"):
             return redirect("pocso_act_page")
 
         return redirect("tutorial")
@@ -169,98 +183,238 @@ def add_employee(request):
 
 
 # --- 4. COMPANY DASHBOARD ---
+def _admin_organization(user):
+    membership = (
+        OrganizationMember.objects.filter(user=user, role="ADMIN")
+        .select_related("organization")
+        .first()
+    )
+    return membership.organization if membership else None
+
+
+def _organization_track(org):
+    """``(active subscription, module type tracked, number of modules in it)``"""
+    active_sub = (
+        Subscription.objects.filter(organization=org, status="ACTIVE", end_date__gt=timezone.now())
+        .select_related("plan")
+        .first()
+    )
+    training_type = subscription_track(active_sub)
+    total_modules = TrainingModule.objects.filter(module_type=training_type).count()
+    return active_sub, training_type, total_modules
+
+
 @login_required(login_url="login")
+@use_replica
 def company_dashboard(request):
-    user = request.user
-    membership = OrganizationMember.objects.filter(user=user, role="ADMIN").first()
-
-    if not membership:
+    # Only the summary counters are rendered here; the employee list and each
+    # member's progress are fetched page by page from the JSON endpoints below.
+    org = _admin_organization(request.user)
+    if not org:
         messages.error(request, "Access Denied. Admin only.")
         return redirect("tutorial")
 
-    org = membership.organization
-    active_sub = Subscription.objects.filter(organization=org, status="ACTIVE").first()
-    members = OrganizationMember.objects.filter(organization=org).select_related("user")
+    active_sub, training_type, total_modules_count = _organization_track(org)
+    members = OrganizationMember.objects.filter(organization=org)
 
-    # --- DATA CALCULATION FOR HTML ---
     total_employees = members.count()
     seats_remaining = org.max_users - total_employees
-    
-    # Identify Training Type based on Plan
-    training_type = "POSH" # Default
-    if active_sub and active_sub.plan.type in ["POCSO", "BOTH"]:
-        # If plan is POCSO, track POCSO. If BOTH, ideally we track both, but for dashboard simplicity 
-        # let's prioritize POSH or handle as per requirement. 
-        # For now, let's assume if it is NOT POSH-only, we check POCSO or just stick to POSH if it's the default.
-        # Let's check the plan type explicitly.
-        if active_sub.plan.type == "POCSO":
-           training_type = "POCSO"
-
-    # Fetch total modules for calculation
-    all_modules = TrainingModule.objects.filter(module_type=training_type).order_by("order")
-    total_modules_count = all_modules.count()
 
     training_completed_count = 0
-    
-    # Annotate members with progress
-    for mem in members:
-        user_obj = mem.user
-        
-        # Get progress for this user
-        # We need check if they finished ALL modules
-        completed_modules = ModuleProgress.objects.filter(user=user_obj, module__module_type=training_type, is_completed=True).count()
-        
-        mem.percent_complete = int((completed_modules / total_modules_count) * 100) if total_modules_count > 0 else 0
-        mem.completed_modules_count = completed_modules
-        mem.is_training_completed = (completed_modules == total_modules_count) and (total_modules_count > 0)
-        
-        if mem.is_training_completed:
-            training_completed_count += 1
-            
-        # Get Last 7 Days Activity for Chart
-        today = timezone.now().date()
-        last_7_days = [(today - timedelta(days=i)) for i in range(6, -1, -1)]
-        # For the chart in the modal
-        mem_chart_data = []
-        for d in last_7_days:
-             act = DailyActivity.objects.filter(user=user_obj, date=d).first()
-             mem_chart_data.append(act.minutes_watched if act else 0)
-        mem.chart_data = json.dumps(mem_chart_data)
-        
-        # Module Status List for Modal
-        # We need to know which are completed to show badges
-        # Let's create a list of dicts: {title, is_completed}
-        mem_modules_status = []
-        # Optimization: We already queried progress, but getting a list for display might need a fresh query or map
-        # Let's do a map for O(1) lookup
-        user_progress_map = set(ModuleProgress.objects.filter(user=user_obj, module__module_type=training_type, is_completed=True).values_list('module_id', flat=True))
-        
-        for mod in all_modules:
-            is_done = mod.id in user_progress_map
-            mem_modules_status.append({
-                "title": mod.title,
-                "is_completed": is_done,
-                "duration": mod.duration_seconds # if needed
-            })
-        mem.modules_status = mem_modules_status
-
-
+    if total_modules_count:
+        training_completed_count = (
+            annotate_member_progress(members, training_type)
+            .filter(completed_modules__gte=total_modules_count)
+            .count()
+        )
     training_pending = total_employees - training_completed_count
 
+    departments = (
+        members.exclude(user__department="")
+        .order_by("user__department")
+        .values_list("user__department", flat=True)
+        .distinct()
+    )
+
     context = {
         "organization": org,
         "active_plan": active_sub,
-        "members": members,
         "seats_used": total_employees,
         "seats_remaining": seats_remaining,
         "total_employees": total_employees,
         "training_completed": training_completed_count,
         "training_pending": training_pending,
         "total_modules_count": total_modules_count, # Added for template
+        "departments": list(departments),
+        "latest_import": org.import_jobs.order_by("-created_at").first(),
     }
     return render(request, "company_dashboard.html", context)
 
 
+# Sort keys accepted by company_employees_api ("-" prefix for descending)
+EMPLOYEE_SORTS = {
+    "name": "name_key",
+    "completion": "completed_modules",
+    "last_activity": "last_activity_key",
+}
+EMPLOYEE_PAGE_SIZE = 25
+EMPLOYEE_MAX_PAGE_SIZE = 100
+NO_ACTIVITY = date(1970, 1, 1)  # sorts members who never watched last
+
+
+def _encode_cursor(value, pk):
+    if isinstance(value, date):
+        value = value.isoformat()
+    raw = json.dumps([value, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor, sort_key):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    value, pk = json.loads(raw)
+    if sort_key == "last_activity":
+        value = date.fromisoformat(value)
+    return value, int(pk)
+
+
+@login_required(login_url="login")
+@use_replica
+def company_employees_api(request):
+    """
+    One page of the organisation's employees as JSON, keyset-paginated.
+
+    Query params: ``sort`` (name, completion or last_activity, "-" for
+    descending), ``department``, ``status`` (completed, in_progress or
+    not_started), ``q`` (name/email search), ``limit`` and ``cursor`` (the
+    ``next_cursor`` of the previous page).
+    """
+    org = _admin_organization(request.user)
+    if not org:
+        return JsonResponse({"status": "error", "message": "Admin only."}, status=403)
+
+    _, training_type, total_modules = _organization_track(org)
+
+    sort = request.GET.get("sort", "name")
+    descending = sort.startswith("-")
+    sort_key = sort.lstrip("-")
+    if sort_key not in EMPLOYEE_SORTS:
+        return JsonResponse({"status": "error", "message": f"Unknown sort: {sort}"}, status=400)
+    field = EMPLOYEE_SORTS[sort_key]
+
+    try:
+        limit = int(request.GET.get("limit", EMPLOYEE_PAGE_SIZE))
+    except ValueError:
+        limit = EMPLOYEE_PAGE_SIZE
+    limit = max(1, min(limit, EMPLOYEE_MAX_PAGE_SIZE))
+
+    members = annotate_member_progress(
+        OrganizationMember.objects.filter(organization=org).select_related("user"),
+        training_type,
+    ).annotate(
+        name_key=F("user__first_name"),
+        last_activity_key=Coalesce("last_activity", Value(NO_ACTIVITY)),
+    )
+
+    department = request.GET.get("department")
+    if department:
+        members = members.filter(user__department=department)
+
+    status = request.GET.get("status")
+    if status == "completed":
+        members = members.filter(completed_modules__gte=total_modules) if total_modules else members.none()
+    elif status == "in_progress":
+        members = members.filter(completed_modules__gt=0, completed_modules__lt=total_modules)
+    elif status == "not_started":
+        members = members.filter(completed_modules=0)
+
+    search = request.GET.get("q", "").strip()
+    if search:
+        members = members.filter(
+            Q(user__first_name__icontains=search)
+            | Q(user__last_name__icontains=search)
+            | Q(user__email__icontains=search)
+        )
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        try:
+            value, pk = _decode_cursor(cursor, sort_key)
+        except (ValueError, TypeError):
+            return JsonResponse({"status": "error", "message": "Invalid cursor."}, status=400)
+        op = "lt" if descending else "gt"
+        members = members.filter(
+            Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"id__{op}": pk})
+        )
+
+    if descending:
+        members = members.order_by(f"-{field}", "-id")
+    else:
+        members = members.order_by(field, "id")
+
+    page = list(members[: limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    results = []
+    for mem in page:
+        completed = mem.completed_modules
+        results.append({
+            "id": mem.id,
+            "name": mem.user.get_full_name() or mem.user.first_name or mem.user.username,
+            "email": mem.user.email,
+            "role": mem.role,
+            "department": mem.user.department,
+            "completed_modules": completed,
+            "total_modules": total_modules,
+            "percent_complete": int((completed / total_modules) * 100) if total_modules > 0 else 0,
+            "last_activity": mem.last_activity.isoformat() if mem.last_activity else None,
+        })
+
+    next_cursor = None
+    if has_more:
+        last = page[-1]
+        next_cursor = _encode_cursor(getattr(last, field), last.id)
+
+    return JsonResponse({"results": results, "next_cursor": next_cursor, "has_more": has_more})
+
+
+@login_required(login_url="login")
+@use_replica
+def company_employee_detail(request, member_id):
+    """7-day watch chart and module badges for one member (loaded when their modal opens)."""
+    org = _admin_organization(request.user)
+    if not org:
+        return JsonResponse({"status": "error", "message": "Admin only."}, status=403)
+
+    member = get_object_or_404(
+        OrganizationMember.objects.select_related("user"), id=member_id, organization=org
+    )
+    _, training_type, _ = _organization_track(org)
+    modules = list(TrainingModule.objects.filter(module_type=training_type).order_by("order"))
+    completed = completed_module_sets([member.user_id], training_type).get(member.user_id, set())
+
+    days = last_7_days()
+    chart_data = activity_matrix([member.user_id], days).get(member.user_id, [0] * len(days))
+    total_modules = len(modules)
+    completed_count = sum(1 for mod in modules if mod.id in completed)
+
+    return JsonResponse({
+        "id": member.id,
+        "name": member.user.get_full_name() or member.user.first_name or member.user.username,
+        "email": member.user.email,
+        "department": member.user.department,
+        "completed_modules": completed_count,
+        "total_modules": total_modules,
+        "percent_complete": int((completed_count / total_modules) * 100) if total_modules > 0 else 0,
+        "chart_labels": [d.strftime("%a") for d in days],
+        "chart_data": chart_data,
+        "modules": [
+            {"title": mod.title, "is_completed": mod.id in completed, "duration": mod.duration_seconds}
+            for mod in modules
+        ],
+    })
+
+
 # --- 5. INDIVIDUAL SUBSCRIPTION ---
 def individual_subscription(request, plan_type):
     db_type = "POSH" if "POSH" in plan_type else "POCSO"
@@ -302,75 +456,41 @@ def individual_subscription(request, plan_type):
 
 
 # --- 6. SECURE TRAINING PAGES ---
-@login_required(login_url="login")
-def posh_act_page(request):
-    user = request.user
-    has_access = Subscription.objects.filter(
-        Q(user=user) | Q(organization__organizationmember__user=user),
-        status="ACTIVE",
-        plan__type__in=["POSH", "BOTH"],
-    ).exists()
+# One template per module track; a new act only needs a template and an entry here.
+TRACK_TEMPLATES = {
+    "POSH": "posh_act_page.html",
+    "POCSO": "pocso_act_page.html",
+}
+
 
-    if not has_access:
+def _render_track_page(request, module_type):
+    if not has_track(request, module_type):
         messages.error(request, "Access Denied: Subscription Required.")
         return redirect("tutorial")
 
-    # 1. Fetch Modules
-    modules = TrainingModule.objects.filter(module_type="POSH").order_by("order")
-
-    # 2. Fetch User Progress
-    progress_map = {}
-    completed_count = 0
-    
-    # Initialize progress for all modules if not exists
-    for mod in modules:
-        prog, created = ModuleProgress.objects.get_or_create(user=user, module=mod)
-        progress_map[mod.id] = prog.is_completed
-        if prog.is_completed:
-            completed_count += 1
-
-    # 3. Calculate Overall Status
-    total_modules = modules.count()
-    percent_complete = int((completed_count / total_modules) * 100) if total_modules > 0 else 0
-
-    # 4. Determine Locked Status (Sequential Unlocking)
-    # Rule: Module is locked if previous module is not completed. First module always unlocked.
-    module_list = []
-    previous_completed = True # First one is always allowed
-    
-    for mod in modules:
-        is_completed = progress_map.get(mod.id, False)
-        is_locked = not previous_completed
-        
-        module_list.append({
-            "obj": mod,
-            "is_completed": is_completed,
-            "is_locked": is_locked
-        })
-        
-        # Update for next iteration
-        previous_completed = is_completed
-
-    # 5. Daily Activity Stats for Chart (Last 7 days)
-    today = timezone.now().date()
-    last_7_days = [(today - timedelta(days=i)) for i in range(6, -1, -1)]
-    chart_labels = [d.strftime("%a") for d in last_7_days]
-    chart_data = []
-    
-    for d in last_7_days:
-        activity = DailyActivity.objects.filter(user=user, date=d).first()
-        chart_data.append(activity.minutes_watched if activity else 0)
+    context = track_page_context(request.user, module_type)
+    return render(request, TRACK_TEMPLATES[module_type], context)
 
-    context = {
-        "modules": module_list,
-        "percent_complete": percent_complete,
-        "completed_count": completed_count,
-        "total_modules": total_modules,
-        "chart_labels": json.dumps(chart_labels),
-        "chart_data": json.dumps(chart_data),
-    }
 
-    return render(request, "posh_act_page.html", context)
+@login_required(login_url="login")
+@use_replica
+def posh_act_page(request):
+    return _render_track_page(request, "POSH")
+
+
+@login_required(login_url="login")
+@use_replica
+def pocso_act_page(request):
+    return _render_track_page(request, "POCSO")
+
+
+@login_required(login_url="login")
+@use_replica
+def training_track_page(request, track):
+    module_type = track.upper()
+    if module_type not in TRACK_TEMPLATES:
+        raise Http404("Unknown training track")
+    return _render_track_page(request, module_type)
 
 
 @csrf_exempt
@@ -378,20 +498,36 @@ def posh_act_page(request):
 def update_watch_time(request):
     """
     API called by frontend every Minute (or 30s) to record watch time.
+    The minute is buffered and written in bulk (see home/watch_time.py).
     """
     if request.method == "POST":
         try:
             today = timezone.now().date()
             # increments by 1 minute (frontend should call this every 60s) or however we define generic 'ping'
-            activity, created = DailyActivity.objects.get_or_create(user=request.user, date=today)
-            activity.minutes_watched += 1
-            activity.save()
-            return JsonResponse({"status": "success", "total_minutes": activity.minutes_watched})
+            buffered = record_watch_time(request.user.pk, today)
+            return JsonResponse({"status": "success", "buffered": buffered})
         except Exception as e:
             return JsonResponse({"status": "error", "message": str(e)}, status=500)
     return JsonResponse({"status": "error"}, status=400)
 
 
+@csrf_exempt
+@login_required
+def progress_beacon(request):
+    """
+    Batched playback progress sent with navigator.sendBeacon (every ~15s and
+    on pause/unload). Merging is idempotent, so a resent beacon is harmless.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error"}, status=400)
+    try:
+        updates = parse_progress_beacon(request.body)
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    saved = apply_progress_updates(request.user, updates)
+    return JsonResponse({"status": "success", "modules": saved})
+
+
 @csrf_exempt
 @login_required
 def mod_complete(request, module_id):
@@ -401,9 +537,11 @@ def mod_complete(request, module_id):
     if request.method == "POST":
         try:
             module = TrainingModule.objects.get(id=module_id)
-            prog, created = ModuleProgress.objects.get_or_create(user=request.user, module=module)
-            prog.is_completed = True
-            prog.save()
+            with transaction.atomic():
+                prog, created = ModuleProgress.objects.get_or_create(user=request.user, module=module)
+                prog.is_completed = True
+                prog.save()
+                refresh_progress_summary(request.user, module.module_type)
             return JsonResponse({"status": "success", "module_id": module_id})
         except TrainingModule.DoesNotExist:
              return JsonResponse({"status": "error", "message": "Module not found"}, status=404)
@@ -412,74 +550,6 @@ def mod_complete(request, module_id):
     return JsonResponse({"status": "error"}, status=400)
 
 
-@login_required(login_url="login")
-def pocso_act_page(request):
-    user = request.user
-    has_access = Subscription.objects.filter(
-        Q(user=user) | Q(organization__organizationmember__user=user),
-        status="ACTIVE",
-        plan__type__in=["POCSO", "BOTH"],
-    ).exists()
-
-    if not has_access:
-        messages.error(request, "Access Denied: Subscription Required.")
-        return redirect("tutorial")
-
-    # 1. Fetch Modules
-    modules = TrainingModule.objects.filter(module_type="POCSO").order_by("order")
-
-    # 2. Fetch User Progress
-    progress_map = {}
-    completed_count = 0
-    
-    for mod in modules:
-        prog, created = ModuleProgress.objects.get_or_create(user=user, module=mod)
-        progress_map[mod.id] = prog.is_completed
-        if prog.is_completed:
-            completed_count += 1
-
-    # 3. Calculate Overall Status
-    total_modules = modules.count()
-    percent_complete = int((completed_count / total_modules) * 100) if total_modules > 0 else 0
-
-    # 4. Determine Locked Status
-    module_list = []
-    previous_completed = True 
-    
-    for mod in modules:
-        is_completed = progress_map.get(mod.id, False)
-        is_locked = not previous_completed
-        
-        module_list.append({
-            "obj": mod,
-            "is_completed": is_completed,
-            "is_locked": is_locked
-        })
-        previous_completed = is_completed
-
-    # 5. Daily Activity
-    today = timezone.now().date()
-    last_7_days = [(today - timedelta(days=i)) for i in range(6, -1, -1)]
-    chart_labels = [d.strftime("%a") for d in last_7_days]
-    chart_data = []
-    
-    for d in last_7_days:
-        activity = DailyActivity.objects.filter(user=user, date=d).first()
-        chart_data.append(activity.minutes_watched if activity else 0)
-
-    context = {
-        "modules": module_list,
-        "percent_complete": percent_complete,
-        "completed_count": completed_count,
-        "total_modules": total_modules,
-        "chart_labels": json.dumps(chart_labels),
-        "chart_data": json.dumps(chart_data),
-        # Pass a flag to template to disable/enable final assessment
-        "is_assessment_unlocked": percent_complete == 100
-    }
-    return render(request, "pocso_act_page.html", context)
-
-
 # --- 7. STATIC, CHATBOT & INTERMEDIATE PAGES ---
 def index(request):
     return render(request, "index.html")
@@ -561,27 +631,206 @@ def posh_c(request):
     return render(request, "posh_c.html")
 
 
+def _client_conversation_id(data):
+    conversation_id = str(data.get("conversation_id") or "").strip()[:64]
+    return f"c:{conversation_id}" if conversation_id else None
+
+
+def _chat_conversation_id(request, data):
+    """
+    Key for the visitor's chatbot state: an explicit ``conversation_id`` from the
+    client if sent, otherwise the session key (creating the session if needed).
+    """
+    conversation_id = _client_conversation_id(data)
+    if conversation_id:
+        return conversation_id
+    if not request.session.session_key:
+        request.session.save()
+    return f"s:{request.session.session_key}"
+
+
+def _chat_reply(msg, conversation_id):
+    """
+    JSON payload for one (already normalised) chat message. Shared by the sync
+    and async endpoints so both keep the same ``response``/``reset`` contract.
+    """
+    if msg in ["bye", "clear"]:
+        get_conversation_store().clear(conversation_id)
+        return {"response": "Goodbye!", "reset": True}
+    if "hello" in msg:
+        return {"response": "Hi! Ask me about OHS."}
+
+    return {"response": predict_answer(msg, conversation_id=conversation_id)}
+
+
 @csrf_exempt
 def chatbot_response(request):
     if request.method == "POST":
         try:
             data = json.loads(request.body)
-            msg = data.get("message", "").strip().lower()
+            msg = normalize_query(data.get("message", ""))
             if not msg:
                 return JsonResponse({"error": "Empty"}, status=400)
 
-            if msg in ["bye", "clear"]:
-                return JsonResponse({"response": "Goodbye!", "reset": True})
-            if "hello" in msg:
-                return JsonResponse({"response": "Hi! Ask me about OHS."})
-
-            ml_resp = predict_answer(msg)
-            return JsonResponse({"response": ml_resp})
+            conversation_id = _chat_conversation_id(request, data)
+            return JsonResponse(_chat_reply(msg, conversation_id))
         except:
             return JsonResponse({"error": "Error"}, status=500)
     return JsonResponse({"error": "Post only"}, status=405)
 
 
+async def _achat_conversation_id(request, data):
+    """_chat_conversation_id for async views."""
+    conversation_id = _client_conversation_id(data)
+    if conversation_id:
+        return conversation_id
+    if not request.session.session_key:
+        await request.session.asave()
+    return f"s:{request.session.session_key}"
+
+
+def _busy_response():
+    return JsonResponse(
+        {"error": "Busy", "response": "I'm getting a lot of questions right now. Please try again in a moment."},
+        status=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+@csrf_exempt
+async def chatbot_response_async(request):
+    """
+    Async /chat/ for ASGI deployments. Inference runs on a bounded thread pool:
+    503 when its queue is full, 504 after CHATBOT_REQUEST_TIMEOUT seconds.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Post only"}, status=405)
+    try:
+        data = json.loads(request.body)
+        msg = normalize_query(data.get("message", ""))
+        if not msg:
+            return JsonResponse({"error": "Empty"}, status=400)
+
+        conversation_id = await _achat_conversation_id(request, data)
+        payload = await get_inference_executor().run(
+            _chat_reply,
+            msg,
+            conversation_id,
+            timeout=getattr(settings, "CHATBOT_REQUEST_TIMEOUT", 10),
+        )
+        return JsonResponse(payload)
+    except ExecutorBusy:
+        return _busy_response()
+    except asyncio.TimeoutError:
+        return JsonResponse({"error": "Timeout"}, status=504)
+    except Exception:
+        return JsonResponse({"error": "Error"}, status=500)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _chat_stream_events(msg, conversation_id):
+    """
+    Server-Sent Events for one chat message: ``answer`` (the reply text, sent as
+    soon as the best match is known), one ``suggestion`` per "did you mean"
+    option, then ``done``. Nothing is buffered, so each event flushes on its own.
+    """
+    try:
+        if msg in ["bye", "clear"] or "hello" in msg:
+            payload = _chat_reply(msg, conversation_id)
+            yield _sse("answer", {"text": payload["response"]})
+            yield _sse("done", {"reset": payload.get("reset", False)})
+            return
+
+        result = predict(msg, conversation_id=conversation_id)
+        if result["answer"] is not None:
+            yield _sse("answer", {"text": result["answer"]})
+        else:
+            yield _sse("answer", {"text": result["message"]})
+            for number, question in enumerate(result["suggestions"], start=1):
+                yield _sse("suggestion", {"index": number, "text": question})
+        yield _sse("done", {"reset": False})
+    except Exception:
+        yield _sse("error", {"error": "Error"})
+
+
+@csrf_exempt
+def chatbot_stream(request):
+    """
+    Streaming variant of /chat/ (same POST body). The non-streaming endpoint
+    stays available and is what the widget falls back to.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Post only"}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Error"}, status=400)
+    msg = normalize_query(data.get("message", ""))
+    if not msg:
+        return JsonResponse({"error": "Empty"}, status=400)
+
+    return _event_stream_response(_chat_stream_events(msg, _chat_conversation_id(request, data)))
+
+
+def _event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # stop nginx from buffering the stream
+    return response
+
+
+async def _events_on_executor(events, first, timeout):
+    """``first``, then the rest of the ``events`` generator, each step run on the inference pool."""
+    event = first
+    while event is not None:
+        yield event
+        try:
+            event = await get_inference_executor().run(next, events, None, timeout=timeout)
+        except (ExecutorBusy, asyncio.TimeoutError):
+            yield _sse("error", {"error": "Error"})
+            return
+
+
+@csrf_exempt
+async def chatbot_stream_async(request):
+    """
+    chatbot_stream for ASGI. Django buffers a sync iterator there in full, so
+    the events come from an async iterator instead; the inference (the first
+    event) runs on the bounded pool, with the same 503/504 as /chat/async/.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Post only"}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Error"}, status=400)
+    msg = normalize_query(data.get("message", ""))
+    if not msg:
+        return JsonResponse({"error": "Empty"}, status=400)
+
+    events = _chat_stream_events(msg, await _achat_conversation_id(request, data))
+    timeout = getattr(settings, "CHATBOT_REQUEST_TIMEOUT", 10)
+    try:
+        first = await get_inference_executor().run(next, events, None, timeout=timeout)
+    except ExecutorBusy:
+        return _busy_response()
+    except asyncio.TimeoutError:
+        return JsonResponse({"error": "Timeout"}, status=504)
+    return _event_stream_response(_events_on_executor(events, first, timeout))
+
+
+def chatbot_ready(request):
+    """
+    Readiness probe: 200 once the chatbot model is loaded in this worker, 503 before.
+    """
+    if chatbot_is_ready():
+        return JsonResponse({"status": "ready", "caches": cache_stats()})
+    return JsonResponse({"status": "loading"}, status=503)
+
+
 # --- 8. BULK IMPORT FEATURES (UPDATED) ---
 
 
@@ -610,7 +859,8 @@ def download_employee_template(request):
 @login_required
 def upload_employee_bulk(request):
     """
-    Processes the uploaded CSV/Excel file to create employees.
+    Queues the uploaded CSV file as a background import (see home/import_jobs.py);
+    the dashboard then polls import_job_status.
     """
     if request.method == "POST" and request.FILES.get("employee_file"):
         current_user = request.user
@@ -618,7 +868,7 @@ def upload_employee_bulk(request):
         # Verify Admin
         membership = OrganizationMember.objects.filter(
             user=current_user, role="ADMIN"
-        ).first()
+        ).select_related("organization").first()
         if not membership:
             messages.error(request, "Unauthorized.")
             return redirect("company_dashboard")
@@ -631,133 +881,57 @@ def upload_employee_bulk(request):
             messages.error(request, "Please upload a CSV file.")
             return redirect("company_dashboard")
 
-        try:
-            # Decode file using utf-8-sig to handle Excel BOM automatically
-            file_data = csv_file.read().decode("utf-8-sig")
-            csv_data = io.StringIO(file_data)
-            reader = csv.DictReader(csv_data)
-
-            # Normalize headers (strip whitespace from CSV headers just in case)
-            if reader.fieldnames:
-                reader.fieldnames = [name.strip() for name in reader.fieldnames]
-
-            added_count = 0
-
-            for row in reader:
-                # 1. Check Limits (Re-check every iteration)
-                current_count = OrganizationMember.objects.filter(
-                    organization=org
-                ).count()
-                if current_count >= org.max_users:
-                    messages.warning(
-                        request,
-                        f"Limit reached. Stopped after adding {added_count} users.",
-                    )
-                    break
-
-                # 2. Extract Data based on your specific headers
-                first_name = row.get("Name", "").strip()
-                last_name = row.get("Last name", "").strip()
-                department = row.get("Department", "").strip()
-                email = row.get("Email", "").strip()
-                phone = row.get("Phone no", "").strip()
-                password = row.get("Default password", "").strip()
-
-                if not email or not password:
-                    continue  # Skip invalid rows
-
-                # 3. Create User (Skip if exists)
-                if User.objects.filter(email=email).exists():
-                    continue
-
-                try:
-                    # Create the base user
-                    user = User.objects.create_user(
-                        username=email, email=email, password=password
-                    )
-                    user.first_name = first_name
-                    user.last_name = last_name
-                    user.account_type = "EMPLOYEE"
-
-                    # 4. Handle Custom Fields (Department / Phone)
-                    # We check if your User model has these fields to prevent errors
-                    if hasattr(user, "department"):
-                        user.department = department
-                    if hasattr(user, "phone"):
-                        user.phone = phone
-
-                    user.save()
-
-                    # Create Organization Member Link
-                    OrganizationMember.objects.create(
-                        organization=org, user=user, role="MEMBER"
-                    )
-                    added_count += 1
-                except Exception as e:
-                    # Log error internally if needed, skipping row
-                    continue
-
-            if added_count > 0:
-                messages.success(
-                    request, f"Successfully imported {added_count} employees."
-                )
-            else:
-                messages.warning(
-                    request, "No new employees were added (check emails or duplicates)."
-                )
-
-        except Exception as e:
-            messages.error(request, f"Error processing file: {str(e)}")
+        enqueue_import(org, current_user, csv_file)
+        messages.success(request, "Upload received. Employees are being imported in the background.")
 
     return redirect("company_dashboard")
 
 
+def _import_job_for_admin(user, job_id):
+    org = _admin_organization(user)
+    if not org:
+        raise Http404
+    return get_object_or_404(ImportJob, id=job_id, organization=org)
+
+
+@login_required
+def import_job_status(request, job_id):
+    """Progress of a bulk import, polled by the company dashboard."""
+    job = _import_job_for_admin(request.user, job_id)
+    ensure_worker(job)
+    return JsonResponse({
+        "id": job.id,
+        "status": job.status,
+        "total_rows": job.total_rows,
+        "processed_rows": max(job.processed_rows - 1, 0),  # line 1 is the header
+        "added": job.added_count,
+        "errors": len(job.errors),
+        "message": job.message,
+        "error_report_url": reverse("download_import_errors", args=[job.id]) if job.errors else None,
+    })
+
+
+@login_required
+def download_import_errors(request, job_id):
+    """The rows rejected by a bulk import, as CSV."""
+    job = _import_job_for_admin(request.user, job_id)
+    response = HttpResponse(error_report_csv(job.errors), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="employee_import_{job.id}_errors.csv"'
+    return response
+
+
 # --- 9. SUPERUSER DASHBOARD ---
 @login_required
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
+@use_replica
 def superuser_dashboard(request):
     """
-    Dashboard providing a global overview for the platform owner.
+    Dashboard providing a global overview for the platform owner. The figures
+    come from the rollup tables (home/rollups.py, refreshed by
+    `manage.py update_rollups` from cron), so the page costs the same at any
+    scale. It only reads them: until the first run it shows zeros and a note.
     """
-    from django.db.models import Count, Q
-    from django.db.models.functions import TruncMonth
-    from django.utils import timezone
-    import datetime
-
-    # Helper function to get monthly counts for last 6 months
-    def get_monthly_counts(queryset):
-        today = timezone.now().date()
-        six_months_ago = today - datetime.timedelta(days=180)
-        
-        monthly_data = queryset.filter(created_at__gte=six_months_ago)\
-            .annotate(month=TruncMonth('created_at'))\
-            .values('month')\
-            .annotate(count=Count('id'))\
-            .order_by('month')
-            
-        # Initialize dictionary for last 6 months
-        months_map = {}
-        labels = []
-        current = six_months_ago.replace(day=1)
-        for i in range(6):
-            # Move to next month safely
-            next_month = (current.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
-            label = current.strftime("%b")
-            labels.append(label)
-            months_map[current.strftime("%Y-%m")] = 0
-            current = next_month
-
-        # Fill with actual data
-        for entry in monthly_data:
-            month_str = entry['month'].strftime("%Y-%m")
-            if month_str in months_map:
-                months_map[month_str] = entry['count']
-        
-        # Convert to list of counts
-        data_points = list(months_map.values())
-        return labels, data_points
-
     # Helper to generate SVG polyline points (0-100 x, 0-50 y inverted)
     def generate_svg_points(data_points):
         if not data_points:
@@ -773,162 +947,59 @@ def superuser_dashboard(request):
             points.append(f"{x},{y}")
         return " ".join(points)
 
-    # 1. Base Counts
-    all_users_count = User.objects.count()
-    all_orgs = Organization.objects.all()
-    
-    total_companies = all_orgs.filter(organization_type="CORPORATE").count()
-    total_schools = all_orgs.filter(organization_type="SCHOOL").count()
-    
-    # 2. Training Completion (Global)
-    # Count of distinct users who have ANY module progress marked as completed
-    # (Refined logic: Users who have completed ALL modules in their respective track)
-    # For global stats, let's just count users who have completed at least one module for now OR
-    # use the completion logic we built. Let's stick to "Users with 100% video progress" as per plan.
-    # This is expensive to calc for EVERY user on the fly. 
-    # Proximate: Count ModuleProgress where is_completed=True, divided by total modules?
-    # Better: Let's count how many have finished 'POSH' or 'POCSO' completely.
-    # For now, simplistic metric: Total unique users with at least one completed module
-    users_started_training = ModuleProgress.objects.filter(is_completed=True).values('user').distinct().count()
-    
-    
-    # 3. POSH Data
-    # Individuals
-    posh_subs = Subscription.objects.filter(plan__type__in=["POSH", "BOTH"], status="ACTIVE")
-    posh_individuals = posh_subs.filter(user__isnull=False).count()
-    # Organizations (Both Corp and School could have POSH)
-    posh_orgs_subs = posh_subs.filter(organization__isnull=False)
-    posh_companies = posh_orgs_subs.filter(organization__organization_type="CORPORATE").count()
-    posh_schools = posh_orgs_subs.filter(organization__organization_type="SCHOOL").count()
-    
-    posh_total = posh_individuals + posh_companies + posh_schools
-
-    # 4. POCSO Data
-    pocso_subs = Subscription.objects.filter(plan__type__in=["POCSO", "BOTH"], status="ACTIVE")
-    pocso_individuals = pocso_subs.filter(user__isnull=False).count()
-    pocso_orgs_subs = pocso_subs.filter(organization__isnull=False)
-    pocso_companies = pocso_orgs_subs.filter(organization__organization_type="CORPORATE").count()
-    pocso_schools = pocso_orgs_subs.filter(organization__organization_type="SCHOOL").count()
-    
-    pocso_total = pocso_individuals + pocso_companies + pocso_schools
-    
-    # 5. Lists for Tables
-    # Recent POSH Organizations
-    recent_posh_orgs = Organization.objects.filter(
-        subscriptions__plan__type__in=["POSH", "BOTH"],
-        subscriptions__status="ACTIVE"
-    ).distinct().order_by("-created_at")[:10]
-    
-    # Recent POCSO Organizations
-    recent_pocso_orgs = Organization.objects.filter(
-        subscriptions__plan__type__in=["POCSO", "BOTH"],
-        subscriptions__status="ACTIVE"
-    ).distinct().order_by("-created_at")[:10]
-
-    # Growth Logic (Simple Mockup or Month-over-Month if needed)
-    # Placeholder for growth
-    posh_growth = 12 # Dynamic calc requires historical data snapshot
-    pocso_growth = 8
-
-    # --- USER COMPLETION LISTS ---
-    # Find users who have completed ALL modules of a certain type
-    total_posh_modules = TrainingModule.objects.filter(module_type="POSH").count()
-    total_pocso_modules = TrainingModule.objects.filter(module_type="POCSO").count()
-    
-    # 1. POSH Completed Users
-    # Filter users who have N completed ModuleProgress entries for POSH modules
-    # Ideally should join with checks, but simplified:
-    if total_posh_modules > 0:
-        posh_completers = User.objects.annotate(
-            completed_count=Count('module_progress', filter=Q(module_progress__is_completed=True, module_progress__module__module_type="POSH"))
-        ).filter(completed_count=total_posh_modules)[:5] # Top 5
-    else:
-        posh_completers = []
-        
-    # 2. POCSO Completed Users
-    if total_pocso_modules > 0:
-        pocso_completers = User.objects.annotate(
-            completed_count=Count('module_progress', filter=Q(module_progress__is_completed=True, module_progress__module__module_type="POCSO"))
-        ).filter(completed_count=total_pocso_modules)[:5]
-    else:
-        pocso_completers = []
-
-    # --- CHART DATA CALCULATION ---
-    
-    # POSH Registrations (Companies)
-    posh_orgs_qs = Organization.objects.filter(
-        organization_type="CORPORATE",
-        subscriptions__plan__type__in=["POSH", "BOTH"],
-        subscriptions__status="ACTIVE"
-    ).distinct()
-    posh_labels, posh_data = get_monthly_counts(posh_orgs_qs)
-    posh_svg_points = generate_svg_points(posh_data)
-    posh_svg_area = f"0,50 {posh_svg_points} 100,50" # Close the area loop
-
-    # POSH Completion Pie
-    # Simplistic: % of Total POSH Orgs that have >0 completed training
-    # Better: Aggregate ModuleProgress for users in these orgs
-    # Mocking real calculation to save DB query load for now:
-    # Let's say 75% complete for demo if real data is 0
-    posh_complete_percent = 75 
-    # To make it dynamic based on data seeds:
-    if posh_total > 0:
-        posh_complete_percent = int((users_started_training / (posh_total if posh_total > 0 else 1)) * 100)
-        posh_complete_percent = min(posh_complete_percent, 100)
-    
-    # POCSO Registrations (Schools)
-    pocso_orgs_qs = Organization.objects.filter(
-        organization_type="SCHOOL",
-        subscriptions__plan__type__in=["POCSO", "BOTH"],
-        subscriptions__status="ACTIVE"
-    ).distinct()
-    pocso_labels, pocso_data = get_monthly_counts(pocso_orgs_qs)
-    pocso_svg_points = generate_svg_points(pocso_data)
-    pocso_svg_area = f"0,50 {pocso_svg_points} 100,50"
-
-    # POCSO Completion Pie
-    pocso_complete_percent = 60
-    if pocso_total > 0:
-         # Just a placeholder logic re-using global stats for demo if specific query is too complex
-         # Ideally: Filter users belonging to School orgs...
-         pocso_complete_percent = int((users_started_training / (pocso_total if pocso_total > 0 else 1)) * 100)
-         pocso_complete_percent = min(pocso_complete_percent, 100)
+    metrics = dashboard_metrics()
+    rates = completion_rates()
+
+    def track_counts(track):
+        counts = metrics["tracks"][track]
+        svg_points = generate_svg_points(counts["monthly"])
+        # Completion pie: entitled people who finished every module of the track
+        complete_percent = rates[track]["ALL"]["percent"]
+        return {
+            "total": counts["total"],
+            "individuals": counts["individuals"],
+            "companies": counts["companies"],
+            "schools": counts["schools"],
+            "growth": counts["growth"],
+            "chart_labels": metrics["month_labels"],
+            "chart_points": svg_points,
+            "chart_area": f"0,50 {svg_points} 100,50", # Close the area loop
+            "complete_percent": complete_percent,
+            "pending_percent": 100 - complete_percent,
+            # (read from the materialized progress summary: one indexed row per user)
+            "completers": User.objects.filter(
+                progress_summaries__module_type=track, progress_summaries__percent__gte=100
+            )[:5], # Top 5
+        }
+
+    # Lists for Tables: the ten newest organisations with an active subscription per track
+    now = timezone.now()
+
+    def recent_orgs(track):
+        return Organization.objects.filter(
+            subscriptions__plan__type__in=[track, "BOTH"],
+            subscriptions__status="ACTIVE",
+            subscriptions__end_date__gt=now,
+        ).distinct().order_by("-created_at")[:10]
 
     context = {
-        "total_users": all_users_count,
-        "total_companies": total_companies,
-        "total_schools": total_schools,
-        "training_completed_count": users_started_training, # Label: "Users Started/Completed"
-        
-        "posh_counts": {
-            "total": posh_total,
-            "individuals": posh_individuals,
-            "companies": posh_companies,
-            "schools": posh_schools,
-            "growth": posh_growth,
-            "chart_labels": posh_labels,
-            "chart_points": posh_svg_points,
-            "chart_area": posh_svg_area,
-            "complete_percent": posh_complete_percent,
-            "pending_percent": 100 - posh_complete_percent,
-            "completers": posh_completers, # NEW
-        },
-        
-        "pocso_counts": {
-            "total": pocso_total,
-            "individuals": pocso_individuals,
-            "companies": pocso_companies,
-            "schools": pocso_schools,
-            "growth": pocso_growth,
-            "chart_labels": pocso_labels,
-            "chart_points": pocso_svg_points,
-            "chart_area": pocso_svg_area,
-            "complete_percent": pocso_complete_percent,
-            "pending_percent": 100 - pocso_complete_percent,
-            "completers": pocso_completers, # NEW
-        },
-        
-        "recent_posh_orgs": recent_posh_orgs,
-        "recent_pocso_orgs": recent_pocso_orgs,
+        "total_users": metrics["total_users"],
+        "total_companies": metrics["total_companies"],
+        "total_schools": metrics["total_schools"],
+        "training_completed_count": metrics["completions"],
+        "training_completed_growth": metrics["completions_growth"],
+        "posh_counts": track_counts("POSH"),
+        "pocso_counts": track_counts("POCSO"),
+        "recent_posh_orgs": recent_orgs("POSH"),
+        "recent_pocso_orgs": recent_orgs("POCSO"),
+        "rollups_pending": not rollups_exist(),
     }
     return render(request, "superuser_dashboard.html", context)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+@use_replica
+def superuser_completion_rates(request):
+    """Per-track completion rates by organisation type (see home/analytics.py)."""
+    return JsonResponse(completion_rates())
@@ -0,0 +1,201 @@
+# Write-coalescing buffer for watch-time heartbeats
+#
+# Every playing video pings update_watch_time once a minute. Instead of one
+# write transaction per ping, pings are counted in memory per (user, date) and
+# a background thread flushes the totals every WATCH_TIME_FLUSH_INTERVAL
+# seconds: one INSERT for the rows that don't exist yet and one
+# ``minutes_watched = minutes_watched + n`` UPDATE per (date, n) group.
+#
+# Each worker process keeps its own buffer. Increments are additive, so
+# workers never need to coordinate: they all add their own counts to the same
+# rows. At interpreter exit (graceful shutdown) the flusher thread is stopped,
+# after the flush it may be in the middle of, and the rest is written. Flushes
+# run one at a time, and a failed flush puts its counts back to be retried.
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from .models import DailyActivity
+
+logger = logging.getLogger(__name__)
+
+
+def record_direct(user_id, day, minutes=1):
+    """Unbuffered write: the row is incremented in SQL so concurrent pings are not lost."""
+    DailyActivity.objects.get_or_create(user_id=user_id, date=day)
+    DailyActivity.objects.filter(user_id=user_id, date=day).update(
+        minutes_watched=F("minutes_watched") + minutes
+    )
+
+
+def flush_counts(counts):
+    """Add ``{(user_id, date): minutes}`` to DailyActivity in a few set-based statements."""
+    if not counts:
+        return
+    by_date = defaultdict(dict)
+    for (user_id, day), minutes in counts.items():
+        by_date[day][user_id] = minutes
+
+    with transaction.atomic():
+        # Rows that don't exist yet start at 0; ignore_conflicts covers rows
+        # another worker created in the meantime
+        DailyActivity.objects.bulk_create(
+            [DailyActivity(user_id=user_id, date=day) for (user_id, day) in counts],
+            ignore_conflicts=True,
+            batch_size=500,
+        )
+        for day, users in by_date.items():
+            by_minutes = defaultdict(list)
+            for user_id, minutes in users.items():
+                by_minutes[minutes].append(user_id)
+            for minutes, user_ids in by_minutes.items():
+                for start in range(0, len(user_ids), 500):
+                    DailyActivity.objects.filter(
+                        date=day, user_id__in=user_ids[start:start + 500]
+                    ).update(minutes_watched=F("minutes_watched") + minutes)
+
+
+class WatchTimeBuffer:
+    def __init__(self, flush_interval=30, max_pending=10000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # held from taking the counts to writing them
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stopped = False
+        self.flushes = 0
+        self.flushed_minutes = 0
+
+    def _ensure_thread(self):
+        # The flusher thread doesn't survive fork, so each process starts its own.
+        # With no flush_interval, flushing is left to the caller.
+        if not self.flush_interval or self._stopped:
+            return
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(
+                        target=self._run, name="watch-time-flush", daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped:
+                return  # stop() writes what is left
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Watch-time flush failed; counts kept for the next attempt")
+            finally:
+                close_old_connections()
+
+    def record(self, user_id, day, minutes=1):
+        self._ensure_thread()
+        with self._lock:
+            self._counts[(user_id, day)] += minutes
+            pending = len(self._counts)
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return sum(self._counts.values())
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of minutes written."""
+        # Counts taken out of the buffer are written before another flush
+        # starts, so a flush that finds the buffer empty knows they are saved
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, defaultdict(int)
+            if not counts:
+                return 0
+            try:
+                flush_counts(counts)
+            except Exception:
+                # Put the counts back so the next flush retries them
+                with self._lock:
+                    for key, minutes in counts.items():
+                        self._counts[key] += minutes
+                raise
+            written = sum(counts.values())
+            self.flushes += 1
+            self.flushed_minutes += written
+            return written
+
+    def stop(self, timeout=None):
+        """Stop the flusher thread, waiting for its flush in progress, then write what is left."""
+        self._stopped = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        return self.flush()
+
+    def after_fork(self):
+        # The child must not flush the parent's counts a second time
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._wakeup = threading.Event()
+        self._thread = None
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_watch_time_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WatchTimeBuffer(
+                    flush_interval=getattr(settings, "WATCH_TIME_FLUSH_INTERVAL", 30),
+                    max_pending=getattr(settings, "WATCH_TIME_MAX_PENDING", 10000),
+                )
+    return _buffer
+
+
+def record_watch_time(user_id, day, minutes=1):
+    """Count ``minutes`` of watching for ``user_id`` on ``day`` (buffered unless disabled)."""
+    if getattr(settings, "WATCH_TIME_BUFFERED", True):
+        get_watch_time_buffer().record(user_id, day, minutes)
+        return True
+    record_direct(user_id, day, minutes)
+    return False
+
+
+def flush_watch_time():
+    if _buffer is not None:
+        return _buffer.flush()
+    return 0
+
+
+def stop_watch_time():
+    if _buffer is not None:
+        return _buffer.stop()
+    return 0
+
+
+def _after_fork_in_child():
+    if _buffer is not None:
+        _buffer.after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(stop_watch_time)
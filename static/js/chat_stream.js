@@ -0,0 +1,59 @@
+/**
+ * Minimal Server-Sent Events reader for the chatbot's /chat/stream/ endpoint.
+ *
+ * EventSource can only GET, so the message is POSTed with fetch and the
+ * response body is read as a stream. Each complete event is handed to
+ * onEvent(eventName, data) as soon as it arrives.
+ *
+ * The returned promise rejects if the stream cannot be used; error.started
+ * tells the caller whether any event was already rendered (if not, it is safe
+ * to fall back to the non-streaming /chat/ POST).
+ */
+const CHAT_STREAM_SUPPORTED = typeof window.ReadableStream !== 'undefined'
+    && typeof window.TextDecoder !== 'undefined';
+
+function parseSSEEvent(rawEvent) {
+    let eventName = 'message';
+    const dataLines = [];
+    rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+    });
+    if (dataLines.length === 0) return null;
+    return { event: eventName, data: JSON.parse(dataLines.join('\n')) };
+}
+
+async function streamChat(url, message, headers, onEvent) {
+    let started = false;
+    try {
+        const response = await fetch(url, {
+            method: "POST",
+            headers: Object.assign({ 'Content-Type': 'application/json', 'Accept': 'text/event-stream' }, headers || {}),
+            body: JSON.stringify({ message: message })
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true }).replace(/\r/g, '');
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const parsed = parseSSEEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (!parsed) continue;
+                if (parsed.event === 'error') throw new Error(parsed.data.error || 'Stream error');
+                started = true;
+                onEvent(parsed.event, parsed.data);
+            }
+        }
+    } catch (error) {
+        error.started = started;
+        throw error;
+    }
+}
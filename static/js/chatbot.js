@@ -59,7 +59,28 @@ function sendSelectionMessage(selectionText) {
     fetchBotResponse(selectionText);
 }
 
+// Stream the reply over SSE (needs static/js/chat_stream.js loaded first) when the
+// browser supports it; fall back to the plain JSON endpoint if streaming is
+// unavailable or fails before any output.
 function fetchBotResponse(message) {
+    if (typeof streamChat === 'undefined' || !CHAT_STREAM_SUPPORTED) {
+        fetchBotResponseJSON(message);
+        return;
+    }
+    const reply = createStreamingReply();
+    streamChat("/chat/stream/", message, {}, reply.handle)
+        .then(() => reply.finish())
+        .catch((error) => {
+            console.error("Stream Error:", error);
+            if (error.started) {
+                reply.finish();
+            } else {
+                fetchBotResponseJSON(message);
+            }
+        });
+}
+
+function fetchBotResponseJSON(message) {
     fetch("/chat/", {
         method: "POST",
         headers: {
@@ -85,6 +106,98 @@ function fetchBotResponse(message) {
     });
 }
 
+/**
+ * Renders one streamed reply: the answer text as soon as it arrives, then
+ * each "did you mean" option as its own event (paginated like the JSON path).
+ */
+function createStreamingReply() {
+    let bubble = null;
+    let textWrapper = null;
+    let suggestionsContainer = null;
+    let currentPage = 1;
+    let shouldReset = false;
+    const suggestions = [];
+
+    const renderSuggestionsPage = (page) => {
+        currentPage = page;
+        suggestionsContainer.innerHTML = '';
+        const list = document.createElement('div');
+        list.className = 'suggestions-list';
+        list.style.cssText = 'display: flex; flex-direction: column; gap: 6px;';
+        const startIndex = (page - 1) * ITEMS_PER_PAGE;
+        suggestions.slice(startIndex, startIndex + ITEMS_PER_PAGE).forEach(suggestion => {
+            const suggestionItem = document.createElement("div");
+            suggestionItem.className = "suggestion-item";
+            suggestionItem.style.cssText = `
+                display: flex; align-items: flex-start; padding: 10px; border: 1px solid #d1d5db;
+                border-radius: 4px; background: white; cursor: pointer; transition: background-color 0.2s;
+                font-size: 13px; min-height: 40px; word-break: break-word; animation: slideIn 0.3s ease-out;
+            `;
+            suggestionItem.innerHTML = `
+                <div class="suggestion-icon" style="width: 20px; height: 20px; border-radius: 50%; background: #f3f4f6; display: flex; align-items: center; justify-content: center; font-size: 10px; font-weight: bold; margin-right: 8px; flex-shrink: 0; margin-top: 2px; color: #374151;">${suggestion.index}</div>
+                <div class="suggestion-text" style="flex: 1; line-height: 1.4; word-wrap: break-word; white-space: normal; overflow-wrap: break-word; min-width: 0; color: #1f2937;">${suggestion.text}</div>
+                <div class="suggestion-arrow" style="color: #6b7280; font-size: 12px; flex-shrink: 0; margin-left: 4px;">›</div>
+            `;
+            suggestionItem.addEventListener("mouseenter", () => { suggestionItem.style.backgroundColor = '#f9fafb'; });
+            suggestionItem.addEventListener("mouseleave", () => { suggestionItem.style.backgroundColor = 'white'; });
+            suggestionItem.addEventListener("click", () => sendSelectionMessage(suggestion.text));
+            list.appendChild(suggestionItem);
+        });
+        suggestionsContainer.appendChild(list);
+
+        const totalPages = Math.ceil(suggestions.length / ITEMS_PER_PAGE);
+        if (totalPages > 1) {
+            createPaginationControls(suggestionsContainer, page, totalPages, renderSuggestionsPage);
+        }
+        chatBody.scrollTop = chatBody.scrollHeight;
+    };
+
+    return {
+        handle(event, data) {
+            if (event === 'answer') {
+                hideTypingIndicator();
+                const botMsgDiv = document.createElement("div");
+                botMsgDiv.className = "bot-message";
+                botMsgDiv.innerHTML = botAvatarHTML;
+                bubble = document.createElement('div');
+                bubble.className = 'message-bubble';
+                botMsgDiv.appendChild(bubble);
+                chatBody.appendChild(botMsgDiv);
+
+                textWrapper = document.createElement('div');
+                bubble.appendChild(textWrapper);
+                typeContent(textWrapper, data.text);
+            } else if (event === 'suggestion' && bubble) {
+                if (!suggestionsContainer) {
+                    textWrapper.style.marginBottom = '15px';
+                    suggestionsContainer = document.createElement('div');
+                    bubble.appendChild(suggestionsContainer);
+                }
+                suggestions.push(data);
+                renderSuggestionsPage(currentPage);
+            } else if (event === 'done') {
+                shouldReset = data.reset || false;
+            }
+        },
+        finish() {
+            hideTypingIndicator();
+            if (!bubble) {
+                showErrorMessage();
+                return;
+            }
+            if (shouldReset) {
+                setTimeout(() => {
+                    chatBody.innerHTML = '';
+                    createInitialMessage();
+                    expandHeader();
+                }, 2000);
+            }
+            chatBody.scrollTop = chatBody.scrollHeight;
+            sendBtn.disabled = false;
+        }
+    };
+}
+
 function appendUserMessage(message) {
     const userMsgDiv = document.createElement("div");
     userMsgDiv.className = "user-message";
@@ -0,0 +1,82 @@
+/**
+ * Second-granularity playback tracking for the training videos.
+ *
+ * Watched ranges are collected per module from timeupdate events and sent in
+ * one batched navigator.sendBeacon every FLUSH_MS, and straight away on
+ * pause, end, tab hide and page unload. Each beacon carries every range
+ * watched since the page loaded, so the server merge (a bitmap OR) is
+ * idempotent and a lost beacon is covered by the next one.
+ *
+ * Videos with data-resume="<seconds>" start from that position.
+ */
+function trackWatchProgress(url, videos, options) {
+    const FLUSH_MS = (options && options.flushMs) || 15000;
+    const MAX_STEP = 2; // a bigger jump between timeupdates is a seek, not watching
+    const modules = {};
+    let dirty = false;
+
+    function state(video) {
+        const id = video.dataset.id;
+        if (!modules[id]) modules[id] = { intervals: [], position: 0, last: null };
+        return modules[id];
+    }
+
+    function addInterval(intervals, start, end) {
+        intervals.push([start, end]);
+        intervals.sort((a, b) => a[0] - b[0]);
+        const merged = [intervals[0]];
+        for (let i = 1; i < intervals.length; i++) {
+            const top = merged[merged.length - 1];
+            if (intervals[i][0] <= top[1]) top[1] = Math.max(top[1], intervals[i][1]);
+            else merged.push(intervals[i]);
+        }
+        intervals.length = 0;
+        merged.forEach(r => intervals.push(r));
+    }
+
+    function flush() {
+        if (!dirty) return;
+        const updates = Object.keys(modules).map(id => ({
+            module: Number(id),
+            position: Math.floor(modules[id].position),
+            intervals: modules[id].intervals.map(r => [Math.floor(r[0]), Math.ceil(r[1])])
+        }));
+        const body = new Blob([JSON.stringify({ updates: updates })], { type: 'application/json' });
+        const queued = navigator.sendBeacon && navigator.sendBeacon(url, body);
+        if (!queued) {
+            fetch(url, { method: 'POST', body: body, keepalive: true, credentials: 'same-origin' })
+                .catch(error => console.error('Progress beacon failed:', error));
+        }
+        dirty = false;
+    }
+
+    videos.forEach(video => {
+        const resume = parseFloat(video.dataset.resume || '0');
+        if (resume > 0) {
+            video.addEventListener('loadedmetadata', () => {
+                if (resume < video.duration - 1) video.currentTime = resume;
+            }, { once: true });
+        }
+
+        video.addEventListener('timeupdate', () => {
+            const s = state(video);
+            const now = video.currentTime;
+            if (!video.paused && s.last !== null && now > s.last && now - s.last <= MAX_STEP) {
+                addInterval(s.intervals, s.last, now);
+                dirty = true;
+            }
+            s.last = now;
+            if (s.position !== now) { s.position = now; dirty = true; }
+        });
+        video.addEventListener('seeking', () => { state(video).last = null; });
+        video.addEventListener('pause', flush);
+        video.addEventListener('ended', flush);
+    });
+
+    setInterval(flush, FLUSH_MS);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') flush();
+    });
+    window.addEventListener('pagehide', flush);
+    return { flush: flush };
+}